@@ -0,0 +1,38 @@
+"""
+Bars per second of the event loop on synthetic bars.
+
+    python benchmarks/bar_loop.py --bars 1000000
+"""
+from ml_backtest import Backtest
+from ml_backtest.strategies import Hammer
+from ml_backtest.interfaces import Strategy
+from ml_backtest.data import Data
+import argparse
+import time
+
+
+class LegacyHammer(Hammer):
+    # same trading logic, but driven through the slicing on_data() compatibility adapter
+    on_bar = Strategy.on_bar
+
+    def on_data(self, index, lows, highs, closes, opens, dates):
+        Hammer.on_bar(self, index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    data = Data.synthetic(args.bars)
+    for name, strategy, kwargs in [('on_data adapter', LegacyHammer, {}),
+                                   ('on_bar', Hammer, {}),
+                                   ('vectorized', Hammer, {'vectorized': True})]:
+        start = time.perf_counter()
+        trades = len(Backtest(data, strategy(), **kwargs).get_trades())
+        elapsed = time.perf_counter() - start
+        print(f"{name:>16}: {args.bars / elapsed:>12,.0f} bars/s  ({elapsed:.2f}s, {trades} trades)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Benchmark suite on seeded synthetic bars from `Data.synthetic`.
+
+Every case runs in a fresh process, so its peak RSS is its own. Results are written
+as JSON and a later run can be compared against a saved baseline:
+
+    python benchmarks/suite.py run --scales 10k 1m 10m --output baseline.json
+    python benchmarks/suite.py run --scales 10k 1m 10m --output current.json
+    python benchmarks/suite.py compare baseline.json current.json --threshold 0.1
+
+`compare` exits with status 1 when a case got slower or used more memory than the
+threshold allows.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import multiprocessing
+import platform
+import argparse
+import resource
+import json
+import time
+import sys
+
+STRATEGIES = ['BullishEngulfing', 'BullishHarami', 'DragonFlyDoji', 'Hammer', 'InvertedHammer', 'MorningStar',
+              'MorningStarDoji', 'PiercingPattern']
+ML_STRATEGY = 'InvertedHammer'
+ML_ROWS = 10
+ML_COLUMNS = ['EMA_Diff', 'SMA_Diff', 'MACD_hist']
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def _ml_trades(data):
+    from ml_backtest import Backtest
+    from ml_backtest import strategies
+    return Backtest(data, getattr(strategies, ML_STRATEGY)(), vectorized=True).get_trades()
+
+
+def _ml_setup(data):
+    from ml_backtest import MachineLearning
+    from ml_backtest.models import RandomForestRegressorTrainer
+    return MachineLearning(ml_class=RandomForestRegressorTrainer, df=data, results=_ml_trades(data),
+                           rows=ML_ROWS, columns=ML_COLUMNS)
+
+
+def _measure(case: str, bars: int, seed: int) -> dict:
+    # runs in its own process: build the inputs untimed, then time only the case itself
+    from ml_backtest import Backtest
+    from ml_backtest import strategies
+    from ml_backtest.data import Data
+    from ml_backtest.machine_learning import DataProcessing, CandleStickDataProcessing
+    from ml_backtest.models import RandomForestRegressorTrainer
+
+    data = Data.synthetic(bars, seed=seed)
+    kind, _, name = case.partition('.')
+
+    if kind == 'backtest':
+        strategy_name, _, mode = name.partition('.')
+        strategy = getattr(strategies, strategy_name)()
+
+        def run():
+            try:
+                Backtest(data, strategy, vectorized=mode == 'vectorized')
+            except ZeroDivisionError:
+                pass  # no wins or no losses on these bars, the run itself is complete
+    elif kind == 'data_processing':
+        trainer = RandomForestRegressorTrainer(data=data, rows=ML_ROWS, columns=ML_COLUMNS)
+        trainer.feature_engineer()
+        dp = DataProcessing(df=trainer.data, results=_ml_trades(data), rows=ML_ROWS, columns=ML_COLUMNS)
+        run = dp.get_before
+    elif kind == 'machine_learning':
+        ml = _ml_setup(data)
+
+        def run():
+            ml.run(dp_pattern=CandleStickDataProcessing.calculate_inverted_hammer_features)
+    else:  # ml_backtest
+        ml = _ml_setup(data)
+        ml.run(dp_pattern=CandleStickDataProcessing.calculate_inverted_hammer_features)
+        model, columns, rows = ml.get_util()
+        ml_data = ml.get_data()
+        strategy = getattr(strategies, ML_STRATEGY)()
+
+        def run():
+            Backtest(ml_data, strategy, model=model, columns=columns, rows=rows, cs_pattern=True,
+                     batch_predict=True)
+
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    return {'name': case, 'bars': bars, 'seconds': seconds, 'bars per second': bars / seconds,
+            'peak rss mb': _peak_rss_mb()}
+
+
+def cases() -> list:
+    names = []
+    for strategy in STRATEGIES:
+        names += [f'backtest.{strategy}', f'backtest.{strategy}.vectorized']
+    return names + ['data_processing.get_before', 'machine_learning.run', 'ml_backtest.batch_predict']
+
+
+def parse_scale(scale: str) -> int:
+    units = {'k': 10 ** 3, 'm': 10 ** 6}
+    scale = scale.lower()
+    if scale[-1] in units:
+        return int(float(scale[:-1]) * units[scale[-1]])
+    return int(scale)
+
+
+def run(scales: list, output: str, seed: int = 0, only: str = None):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for bars in map(parse_scale, scales):
+        for case in cases():
+            if only is not None and only not in case:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(_measure, case, bars, seed).result()
+            results.append(result)
+            print(f"{case:>40} {bars:>10,} bars: {result['bars per second']:>14,.0f} bars/s "
+                  f"{result['peak rss mb']:>8,.0f} MB")
+
+    report = {'created': datetime.now(timezone.utc).isoformat(),
+              'python': platform.python_version(),
+              'machine': platform.machine(),
+              'seed': seed,
+              'results': results}
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\033[91mResults saved to {output}\033[0m")
+
+
+def compare(baseline: str, current: str, threshold: float = 0.1) -> int:
+    with open(baseline) as f:
+        before = {(r['name'], r['bars']): r for r in json.load(f)['results']}
+    with open(current) as f:
+        after = {(r['name'], r['bars']): r for r in json.load(f)['results']}
+
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        speed = after[key]['bars per second'] / before[key]['bars per second']
+        memory = after[key]['peak rss mb'] / before[key]['peak rss mb']
+        slower, larger = speed < 1 - threshold, memory > 1 + threshold
+        line = f"{key[0]:>40} {key[1]:>10,} bars: speed x{speed:.2f}, peak rss x{memory:.2f}"
+        if slower or larger:
+            regressions += 1
+            line = f"\033[91m{line} REGRESSION\033[0m"
+        print(line)
+
+    for key in sorted(before.keys() - after.keys()):
+        print(f"{key[0]:>40} {key[1]:>10,} bars: missing from {current}")
+    print(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks and write the results as JSON')
+    run_parser.add_argument('--scales', nargs='+', default=['10k', '1m'], help='number of bars, e.g. 10k 1m 10m')
+    run_parser.add_argument('--output', default='benchmark.json')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--only', default=None, help='only run the cases whose name contains this text')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions against a saved baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='allowed relative slowdown or memory growth')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args.scales, args.output, seed=args.seed, only=args.only)
+    else:
+        sys.exit(compare(args.baseline, args.current, threshold=args.threshold))
+
+
+if __name__ == '__main__':
+    main()
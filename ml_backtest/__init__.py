@@ -1,2 +1,6 @@
 from .backtest.backtest import Backtest
 from .machine_learning.wrapper import MachineLearning
+from .backtest.sweep import ParameterSweep
+from .backtest.portfolio import PortfolioBacktest
+from .profiler import Profiler
+from .backtest.montecarlo import MonteCarlo
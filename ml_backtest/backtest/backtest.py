@@ -1,16 +1,53 @@
 from ml_backtest.interfaces import Strategy
+from ml_backtest.backtest.ledger import TradeLedger
+from ml_backtest.data import ColumnStore, BarClock, BarPyramid
+from ml_backtest.profiler import Profiler
+from ml_backtest.machine_learning import ModelRegistry, TradeTargets
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from sklearn.base import BaseEstimator
-from typing import Optional, List
+from typing import Optional, List, Union, Callable
+import time
 
 
 class Backtest:
-    def __init__(self, data: pd.DataFrame, strategy: Strategy,
-                 initial_cash=100000, model: Optional[BaseEstimator] = None,
+    # bars between progress updates
+    PROGRESS_BLOCK = 65536
+
+    def __init__(self, data: Union[pd.DataFrame, ColumnStore, BarPyramid], strategy: Strategy,
+                 initial_cash=100000, model: Union[BaseEstimator, str, None] = None,
                  columns: Optional[List[str]] = None, rows: Optional[int] = None,
-                 cs_pattern: bool = False):
+                 cs_pattern: bool = False, vectorized: bool = False, signals: Optional[dict] = None,
+                 batch_predict: bool = False, profile: Union[bool, Profiler] = False,
+                 progress: Union[bool, Callable[[int, int], None]] = False,
+                 registry: Optional[ModelRegistry] = None, resolution: Optional[int] = None):
+        """
+        :param model: Trained model, or the key of a model in a `ModelRegistry`. The columns, rows and
+            cs_pattern registered with the model are used unless they are passed.
+        :param profile: True or a `Profiler` to time the phases of the run, see `get_profile()`.
+        :param progress: True shows a progress bar, a callable is called with (bars done, total bars).
+            Either is updated once per block of bars, not on every bar.
+        :param registry: Registry to load a model key from, defaults to ~/.cache/ml_backtest/models.
+        :param resolution: Seconds per bar to run at when `data` is a `BarPyramid`, defaults to its
+            coarsest level. Bars reaching both the stop loss and take profit of a trade are
+            resolved on the pyramid's finer bars.
+        """
+        if isinstance(model, str):
+            entry = (registry if registry is not None else ModelRegistry()).load(model)
+            model = entry['model']
+            columns = columns if columns is not None else entry['columns']
+            rows = rows if rows is not None else entry['rows']
+            cs_pattern = cs_pattern or entry['cs_pattern']
+        if isinstance(data, ColumnStore):
+            # columns stay memory mapped, bars are only read when the backtest touches them
+            data = data.to_frame()
+        self.__pyramid = None
+        self.__resolution = None
+        if isinstance(data, BarPyramid):
+            self.__pyramid = data
+            self.__resolution = resolution if resolution is not None else data.intervals[-1]
+            data = data.frame(self.__resolution)
         self.__data = data
         self.__strategy = strategy
         self.__cash = initial_cash
@@ -18,7 +55,8 @@ class Backtest:
         self.__equity_peak = initial_cash
         self.__max_drawdown = 0
         self.__open_positions = []
-        self.__completed_trades = []
+        self.__ledger = TradeLedger(time_dtype=np.int64)
+        self.__clock = None
         self.__trade_counter = 0
         self.__long_wins = 0
         self.__short_wins = 0
@@ -34,61 +72,248 @@ class Backtest:
         self.__columns = columns
         self.__rows = rows
         self.__cs_pattern = cs_pattern
+        self.__batch_predict = batch_predict
         self.__backtest = None
+        self.__profiler = Profiler() if profile is True else (profile or None)
+        self.__progress = progress
 
-        self.__run()
+        # precomputed entry arrays (see Strategy.entries) always take the vectorized path
+        if vectorized or signals is not None:
+            self.__run_vectorized(signals)
+        else:
+            self.__run()
         self.__results()
 
-    def __run(self):
-        dates = self.__data['date'].values
+        if self.__profiler is not None:
+            self.__profiler.count('bars', len(self.__clock))
+            self.__profiler.count('trades closed', self.__trade_counter)
+            self.__profiler.flush()
+
+    def __setup(self):
+        # dates are parsed once, strategies and trades see them as int64 Unix timestamps
+        self.__clock = BarClock(self.__data['date'].values)
+        dates = self.__clock.epochs
         lows = self.__data['low'].values
         highs = self.__data['high'].values
         close = self.__data['close'].values
         open = self.__data['open'].values
 
-        self.__start_time = dates[0]
-        self.__end_time = dates[-1]
+        self.__start_time = self.__data['date'].values[0]
+        self.__end_time = self.__data['date'].values[-1]
 
+        self.__strategy.set_data(lows, highs, close, open, dates)
         self.__strategy.init()
+        self.__strategy.set_clock(self.__clock)
 
         # pass the model into the strategy interface if a model is init with backtest
         if self.__columns is not None and self.__rows is not None and self.__model is not None:
             self.__strategy.set_ml(model=self.__model, columns=self.__columns, rows=self.__rows,
-                                   df=self.__data, cs_pattern=self.__cs_pattern)
-
-        for index in tqdm(range(len(dates)), total=len(dates)):
-            # Assuming strategy.on_data can be adapted or is simplified for demonstration
-            self.__strategy.on_data(index, lows[:index + 1], highs[:index + 1],
-                                    close[:index + 1], open[:index + 1], dates[:index + 1])
-
-            for position in list(self.__strategy.positions):  # Iterate over a shallow copy if positions are modified
-                exit_price = None
-
-                if 'highest high' not in position or highs[index] > position['highest high']:
-                    position['highest high'] = highs[index]
-
-                    # Calculate the difference between 'Open' at entry and the new 'highest high'
-                    # Assumes 'open at entry' is stored in the position when the position is created
-                    position['target'] = position['highest high'] - position['entry price']
-
-                if position['type'] == 'long':
-                    if lows[index] <= position['stop loss']:
-                        exit_price = position['stop loss']
-                    elif highs[index] >= position['take profit']:
-                        exit_price = position['take profit']
-                elif position['type'] == 'short':
-                    if highs[index] >= position['stop loss']:
-                        exit_price = position['stop loss']
-                    elif lows[index] <= position['take profit']:
-                        exit_price = position['take profit']
-
-                if exit_price is not None:
+                                   df=self.__data, cs_pattern=self.__cs_pattern, profiler=self.__profiler)
+        return dates, lows, highs, close, open
+
+    def __run(self):
+        dates, lows, highs, close, open = self.__setup()
+
+        # collect every candidate entry up front so the model predicts them in batches,
+        # on_data then gets its predictions from the strategy's lookup
+        if self.__batch_predict and self.__columns is not None and self.__rows is not None \
+                and self.__model is not None:
+            self.__timed('strategy.signals', self.__strategy.signals)(lows, highs, close, open, dates)
+
+        # nothing is allocated per bar: the strategy reads the bars by index, its position book
+        # only hands back the positions a bar closes and progress is reported once per block
+        strategy = self.__strategy
+        pyramid = self.__pyramid
+        book = strategy.positions
+        opened_before = len(book)
+        on_bar = self.__timed('strategy.on_bar', strategy.on_bar)
+        length = len(dates)
+        progress, close_progress = self.__progress_callback(length)
+        # a shared profiler carries the time of earlier runs, only this run's on_bar time is subtracted
+        on_bar_before = self.__on_bar_seconds()
+        loop_start = time.perf_counter()
+
+        for block_start in range(0, length, self.PROGRESS_BLOCK):
+            block_stop = min(length, block_start + self.PROGRESS_BLOCK)
+            for index in range(block_start, block_stop):
+                on_bar(index)
+                if not book:
+                    continue
+
+                # file new positions under the bar they were opened on, they can exit on it too
+                book.open_new(index)
+                exits = book.exits(lows[index], highs[index])
+                if not exits:
+                    continue
+
+                for position, exit_price in exits:
+                    if pyramid is not None:
+                        exit_price = self.__drill_down(position['type'] == 'long', index, position['stop loss'],
+                                                       position['take profit'], exit_price)
                     position['exit price'] = exit_price
                     position['exit time'] = dates[index]
-                    self.__close_position(position, exit_price)
+                    position['exit index'] = index
+                    self.__record_trade(position, exit_price)
                     self.__trade_counter += 1
+                strategy.in_position = bool(book)
+            if progress is not None:
+                progress(block_stop, length)
+        close_progress()
+        # labels over the trades' bars are computed once for every trade, not tracked per bar
+        self.__timed('backtest.targets', self.__add_targets)(highs)
+
+        for position in book:
+            # positions left open carry their highest high up to the last bar
+            position['highest high'] = highs[position['entry index']:].max()
+            position['target'] = position['highest high'] - position['entry price']
+
+        if self.__profiler is not None:
+            # the loop minus the strategy's time is the backtest's own exit checks and bookkeeping
+            loop_seconds = time.perf_counter() - loop_start
+            on_bar_seconds = self.__on_bar_seconds() - on_bar_before
+            self.__profiler.add_time('backtest.exits', loop_seconds - on_bar_seconds)
+            self.__profiler.count('trades opened', self.__trade_counter + len(book) - opened_before)
+
+    def __on_bar_seconds(self):
+        if self.__profiler is None:
+            return 0
+        return self.__profiler.to_dict()['timings'].get('strategy.on_bar', {}).get('seconds', 0)
+
+    def __timed(self, phase, function):
+        return function if self.__profiler is None else self.__profiler.timed(phase, function)
+
+    def __progress_callback(self, length):
+        # returns the callable called once per block of bars (or None) and a function closing it
+        if self.__progress is True:
+            bar = tqdm(total=length)
+            return lambda done, total: bar.update(done - bar.n), bar.close
+        if callable(self.__progress):
+            return self.__progress, lambda: None
+        return None, lambda: None
+
+    def __run_vectorized(self, signals):
+        if not self.__strategy.holds_one_position():
+            raise ValueError("The vectorized backtest holds one position at a time, run strategies with other "
+                             "position limits without vectorized=True or signals")
+        dates, lows, highs, close, open = self.__setup()
+
+        if signals is None:
+            signals = self.__timed('strategy.signals', self.__strategy.signals)(lows, highs, close, open, dates)
+        exits_start = time.perf_counter()
+
+        entry_index = signals['index']
+        order = np.argsort(entry_index, kind='stable')
+        entry_index = entry_index[order]
+        sides = signals['side'][order]
+        entry_prices = signals['entry price'][order]
+        take_profits = signals['take profit'][order]
+        stop_losses = signals['stop loss'][order]
+        metadata = {key: np.asarray(values)[order] for key, values in signals.get('metadata', {}).items()}
+
+        # Only one position is open at a time, so the next trade is the first candidate after
+        # the bar the previous one exited on. Each exit is found with array operations.
+        taken, exit_index, exit_prices = [], [], []
+        k = 0
+        while k < len(entry_index):
+            index = entry_index[k]
+            exit_bar, exit_price = self.__find_exit(lows, highs, index, sides[k], stop_losses[k], take_profits[k])
+            if exit_bar >= 0 and self.__pyramid is not None:
+                exit_price = self.__drill_down(sides[k] == 1, exit_bar, stop_losses[k], take_profits[k], exit_price)
+
+            if exit_bar < 0:
+                # never exits, leave it open with the strategy like the event loop does
+                position = {
+                    'type': 'long' if sides[k] == 1 else 'short',
+                    'entry price': entry_prices[k],
+                    'take profit': take_profits[k],
+                    'stop loss': stop_losses[k],
+                    'entry time': dates[index]
+                }
+                if 'metadata' in signals:
+                    position['metadata'] = {key: values[k] for key, values in metadata.items()}
+                position['highest high'] = highs[index:].max()
+                position['target'] = position['highest high'] - position['entry price']
+                position['entry index'] = index
+                self.__strategy.positions.append(position)
+                self.__strategy.in_position = True
+                break
+
+            taken.append(k)
+            exit_index.append(exit_bar)
+            exit_prices.append(exit_price)
+
+            k = np.searchsorted(entry_index, exit_bar, side='right')
+
+        if self.__profiler is not None:
+            self.__profiler.add_time('backtest.exits', time.perf_counter() - exits_start)
+            # candidates only exist on this path, the trades taken from them compare with the event loop
+            self.__profiler.count('signals', len(entry_index))
+            self.__profiler.count('trades opened', len(taken) + (k < len(entry_index)))
 
-    def __close_position(self, position, current_price):
+        taken = np.array(taken, dtype=np.int64)
+        exit_index = np.array(exit_index, dtype=np.int64)
+        highest_highs = TradeTargets.span_max(highs, entry_index[taken], exit_index)
+        self.__timed('backtest.accounting', self.__record_trades)({
+            'type': (sides[taken] != 1).astype(np.int8),
+            'entry price': entry_prices[taken],
+            'take profit': take_profits[taken],
+            'stop loss': stop_losses[taken],
+            'entry time': dates[entry_index[taken]],
+            'highest high': highest_highs,
+            'target': highest_highs - entry_prices[taken],
+            'exit price': np.array(exit_prices, dtype=np.float64),
+            'exit time': dates[exit_index],
+            'size': np.ones(len(taken), dtype=np.int64),
+            'entry index': entry_index[taken],
+            'exit index': exit_index
+        }, {key: values[taken] for key, values in metadata.items()})
+
+    def __add_targets(self, highs):
+        ledger = self.__ledger
+        highest_highs = TradeTargets.span_max(highs, ledger.column('entry index'), ledger.column('exit index'))
+        ledger.update('highest high', highest_highs)
+        ledger.update('target', highest_highs - ledger.column('entry price'))
+
+    def __drill_down(self, long, index, stop_loss, take_profit, exit_price):
+        # a bar reaching both levels exits at the stop loss, unless its finer bars reach the take profit first
+        if exit_price != stop_loss or take_profit is None:
+            return exit_price
+        low, high = self.__data['low'].values[index], self.__data['high'].values[index]
+        if (high < take_profit) if long else (low > take_profit):
+            return exit_price
+        if self.__profiler is not None:
+            self.__profiler.count('intrabar drill downs')
+        return self.__pyramid.resolve_exit(self.__resolution, index, 'long' if long else 'short',
+                                           stop_loss, take_profit)
+
+    @staticmethod
+    def __find_exit(lows, highs, index, side, stop_loss, take_profit):
+        # scan forward in growing chunks so short trades only touch a few bars
+        length = len(lows)
+        start = index
+        chunk = 64
+        while start < length:
+            end = min(length, start + chunk)
+            if side == 1:
+                stop_hits = lows[start:end] <= stop_loss
+                target_hits = highs[start:end] >= take_profit
+            else:
+                stop_hits = highs[start:end] >= stop_loss
+                target_hits = lows[start:end] <= take_profit
+
+            hits = stop_hits | target_hits
+            if hits.any():
+                offset = hits.argmax()
+                # the stop loss wins when both are touched in the same bar
+                exit_price = stop_loss if stop_hits[offset] else take_profit
+                return start + offset, exit_price
+
+            start = end
+            chunk *= 2
+
+        return -1, None
+
+    def __record_trade(self, position, current_price):
         # Calculate profit or loss
         # print(position, " ", current_price)
         if position['type'] == 'long':
@@ -123,26 +348,58 @@ class Backtest:
             # Update max drawdown if this drawdown is larger
             self.__max_drawdown = max(self.__max_drawdown, drawdown)
 
-        # Move position from open to completed trades
-        self.__strategy.positions.remove(position)
-
         # Add any statistics to the completed trades
         position['exit price'] = current_price
         position['size'] = 1
         position['pnl'] = profit_loss
-        self.__completed_trades.append(position)
-        self.__strategy.in_position = False
+        self.__ledger.append(position)
+
+    def __record_trades(self, columns, metadata):
+        # Same accounting as __record_trade for many trades in exit order, with array operations
+        if len(columns['entry price']) == 0:
+            return
+
+        long = columns['type'] == 0
+        entry_prices, exit_prices = columns['entry price'], columns['exit price']
+        pnl = np.where(long, exit_prices - entry_prices, entry_prices - exit_prices)
+
+        self.__long_wins += int(np.count_nonzero(long & (pnl > 0)))
+        self.__long_loses += int(np.count_nonzero(long & (pnl < 0)))
+        self.__long_evens += int(np.count_nonzero(long & (pnl == 0)))
+        self.__short_wins += int(np.count_nonzero(~long & (pnl > 0)))
+        self.__short_loses += int(np.count_nonzero(~long & (pnl < 0)))
+        self.__short_evens += int(np.count_nonzero(~long & (pnl == 0)))
+
+        # cumulative sums add in trade order, so the totals match adding one trade at a time
+        profits, losses = pnl[pnl > 0], pnl[pnl < 0]
+        if len(profits):
+            self.__gross_profit += np.cumsum(profits)[-1]
+        if len(losses):
+            self.__gross_loss += np.cumsum(losses)[-1]
+
+        cash = np.cumsum(np.concatenate([[self.__cash], pnl]))[1:]
+        peaks = np.maximum.accumulate(np.concatenate([[self.__equity_peak], cash]))[1:]
+        self.__max_drawdown = max(self.__max_drawdown, (peaks - cash).max())
+        self.__cash = cash[-1]
+        self.__equity_peak = peaks[-1]
+        self.__trade_counter += len(pnl)
+
+        self.__ledger.extend(dict(columns, pnl=pnl), metadata)
 
     def __results(self) -> pd.DataFrame:
 
         wins = self.__short_wins + self.__long_wins
         loses = self.__short_loses + self.__long_loses
+        # without closed or losing trades these are NaN or inf instead of a ZeroDivisionError
+        with np.errstate(divide='ignore', invalid='ignore'):
+            win_rate = np.float64(wins) / (wins + loses) * 100
+            profit_factor = np.float64(self.__gross_profit) / abs(self.__gross_loss)
         self.__backtest_result = [{'start time': self.__start_time,
                                    'end time': self.__end_time,
                                    '# of trades': self.__trade_counter,
                                    '# of wins': wins,
                                    '# of loses': loses,
-                                   'win rate': f'{np.around((wins / (wins + loses)) * 100, decimals=2)}%',
+                                   'win rate': f'{np.around(win_rate, decimals=2)}%',
                                    '# of long wins': self.__long_wins,
                                    '# of long loses': self.__long_loses,
                                    '# of long evens': self.__long_evens,
@@ -153,15 +410,71 @@ class Backtest:
                                    'max drawdown': f'-{np.around(self.__max_drawdown, decimals=2)}',
                                    'gross profit': np.around(self.__gross_profit, decimals=2),
                                    'gross loss': np.around(self.__gross_loss, decimals=2),
-                                   'profit factor': np.around(self.__gross_profit / abs(self.__gross_loss),
-                                                              decimals=2)}]
+                                   'profit factor': np.around(profit_factor, decimals=2)}]
 
         self.__backtest_df = pd.DataFrame(self.__backtest_result)
         self.__backtest_df = self.__backtest_df.T
 
-    def get_trades(self) -> pd.DataFrame:
-        completed_trades_df = pd.DataFrame(self.__completed_trades)
-        return completed_trades_df
+    def get_trades(self, copy: bool = True) -> pd.DataFrame:
+        """
+        :param copy: Return a writable copy, False wraps the ledger's arrays in a read-only frame
+            without copying them.
+        :return: One row per closed trade.
+        """
+        return self.__ledger.to_frame(copy=copy)
 
     def get_results(self) -> pd.DataFrame:
         return self.__backtest_df
+
+    def get_profile(self) -> Optional[pd.DataFrame]:
+        """
+        :return: Timings and counters of the run when it was created with `profile`, otherwise None.
+        """
+        return self.__profiler.to_frame() if self.__profiler is not None else None
+
+    def get_equity_curve(self) -> pd.DataFrame:
+        """
+        Per bar equity marked to market at the close, built from the trade ledger with
+        array operations. A trade adds its pnl to 'cash' on its exit bar and is valued at
+        the close on the bars it is open before that, positions that never closed stay
+        open up to the last bar.
+
+        :return: DataFrame with one row per bar of 'date', 'cash', 'open pnl', 'equity' and 'drawdown'.
+        """
+        close = np.asarray(self.__data['close'].values, dtype=np.float64)
+        length = len(close)
+
+        side = np.where(self.__ledger.column('type') == 0, 1.0, -1.0) * self.__ledger.column('size')
+        entry_index = self.__ledger.column('entry index')
+        exit_index = self.__ledger.column('exit index')
+        entry_prices = self.__ledger.column('entry price')
+        pnl = self.__ledger.column('pnl')
+
+        # positions still open with the strategy are open up to the last bar
+        open_positions = [p for p in self.__strategy.positions if p.get('entry index') is not None]
+        if open_positions:
+            side = np.concatenate([side, [1.0 if p['type'] == 'long' else -1.0 for p in open_positions]])
+            entry_index = np.concatenate([entry_index, [p['entry index'] for p in open_positions]])
+            exit_index = np.concatenate([exit_index, np.full(len(open_positions), length)])
+            entry_prices = np.concatenate([entry_prices, [p['entry price'] for p in open_positions]])
+
+        # realised pnl lands on the exit bar
+        cash = self.__initial_cash + np.cumsum(np.bincount(exit_index[:len(pnl)], weights=pnl, minlength=length))
+
+        # between entry and exit the open pnl is sum(side * close) - sum(side * entry price),
+        # both sums are running totals of +/- steps on the entry and exit bars
+        units = np.zeros(length + 1)
+        cost = np.zeros(length + 1)
+        np.add.at(units, entry_index, side)
+        np.add.at(units, exit_index, -side)
+        np.add.at(cost, entry_index, side * entry_prices)
+        np.add.at(cost, exit_index, -side * entry_prices)
+        open_pnl = np.cumsum(units[:length]) * close - np.cumsum(cost[:length])
+
+        equity = cash + open_pnl
+        drawdown = np.maximum.accumulate(equity) - equity
+        return pd.DataFrame({'date': self.__clock.epochs,
+                             'cash': cash,
+                             'open pnl': open_pnl,
+                             'equity': equity,
+                             'drawdown': drawdown})
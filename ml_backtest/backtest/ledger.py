@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+
+class TradeLedger:
+    """
+    Completed trades stored column by column in typed NumPy arrays. The arrays grow
+    by doubling, so appending is amortised O(1), and `to_frame(copy=False)` wraps
+    read-only views of them without copying. Trade metadata is kept as float64 columns
+    named 'metadata.<key>'.
+    """
+
+    SIDES = ['long', 'short']
+    # column name -> dtype, 'time' is replaced by the dtype of the data's dates
+    COLUMNS = {
+        'type': np.int8,
+        'entry price': np.float64,
+        'take profit': np.float64,
+        'stop loss': np.float64,
+        'entry time': 'time',
+        'highest high': np.float64,
+        'target': np.float64,
+        'exit price': np.float64,
+        'exit time': 'time',
+        'size': np.int64,
+        'pnl': np.float64,
+        'entry index': np.int64,
+        'exit index': np.int64
+    }
+    METADATA_PREFIX = 'metadata.'
+
+    def __init__(self, time_dtype=object, capacity: int = 1024):
+        self.__size = 0
+        self.__capacity = capacity
+        self.__columns = {name: np.empty(capacity, dtype=time_dtype if dtype == 'time' else dtype)
+                          for name, dtype in self.COLUMNS.items()}
+        self.__metadata = {}
+
+    def __len__(self):
+        return self.__size
+
+    def __reserve(self, size):
+        if size <= self.__capacity:
+            return
+        capacity = self.__capacity
+        while capacity < size:
+            capacity *= 2
+        for columns in (self.__columns, self.__metadata):
+            for name, values in columns.items():
+                grown = np.empty(capacity, dtype=values.dtype)
+                grown[:self.__size] = values[:self.__size]
+                columns[name] = grown
+        self.__capacity = capacity
+
+    def __metadata_column(self, key):
+        name = self.METADATA_PREFIX + key
+        if name not in self.__metadata:
+            # trades booked before this key showed up have no value for it
+            self.__metadata[name] = np.full(self.__capacity, np.nan)
+        return self.__metadata[name]
+
+    def append(self, position: dict):
+        """
+        Book one closed position dict, as created by `Strategy.buy()`/`sell()` and
+        completed by the backtest.
+        """
+        self.__reserve(self.__size + 1)
+        i = self.__size
+        columns = self.__columns
+
+        columns['type'][i] = self.SIDES.index(position['type'])
+        for name in self.COLUMNS:
+            if name == 'type':
+                continue
+            value = position.get(name)
+            if value is None:
+                # missing numbers are NaN, missing bar indices -1
+                value = {'f': np.nan, 'i': -1}.get(columns[name].dtype.kind)
+            columns[name][i] = value
+
+        for key, value in position.get('metadata', {}).items():
+            self.__metadata_column(key)[i] = value
+        self.__size += 1
+
+    def extend(self, columns: dict, metadata: dict = None):
+        """
+        Book many trades at once.
+
+        :param columns: Column name to an array with one value per trade, 'type' as 0 long / 1 short.
+        :param metadata: Optional metadata key to an array with one value per trade.
+        """
+        count = len(columns['entry price'])
+        self.__reserve(self.__size + count)
+        start, stop = self.__size, self.__size + count
+
+        for name, values in columns.items():
+            self.__columns[name][start:stop] = values
+        for key, values in (metadata or {}).items():
+            self.__metadata_column(key)[start:stop] = values
+        self.__size = stop
+
+    def update(self, name: str, values: np.ndarray):
+        """
+        Overwrite one column of every booked trade, for values computed after the trades closed.
+        """
+        self.__columns[name][:self.__size] = values
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        :return: Read-only view of one column for the booked trades.
+        """
+        values = (self.__columns[name] if name in self.__columns else self.__metadata[name])[:self.__size]
+        values.flags.writeable = False
+        return values
+
+    def to_frame(self, copy: bool = True) -> pd.DataFrame:
+        """
+        :param copy: Return a writable copy of the trades, False wraps read-only views of the
+            ledger's arrays without copying.
+        :return: DataFrame of the booked trades.
+        """
+        column = (lambda name: self.column(name).copy()) if copy else self.column
+        frame = {'type': pd.Categorical.from_codes(column('type'), categories=self.SIDES)}
+        for name in ['entry price', 'take profit', 'stop loss', 'entry time']:
+            frame[name] = column(name)
+        for name in self.__metadata:
+            frame[name] = column(name)
+        for name in ['highest high', 'target', 'exit price', 'exit time', 'size', 'pnl', 'entry index',
+                     'exit index']:
+            frame[name] = column(name)
+        return pd.DataFrame(frame, copy=False)
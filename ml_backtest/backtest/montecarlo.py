@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from typing import Optional, Union
+
+
+class MonteCarlo:
+    # ways the trades are resampled
+    METHODS = ['permutation', 'bootstrap']
+    METRICS = ['net profit', 'max drawdown', 'profit factor']
+
+    def __init__(self, trades: Union[pd.DataFrame, np.ndarray], resamples: int = 10000,
+                 chunk_size: Optional[int] = None, seed: Optional[int] = None):
+        """
+        Robustness of a backtest's results to the luck of its trades. Every resample is a
+        row of a (resamples x trades) array and the metrics of all rows are computed with
+        array operations.
+
+        * 'permutation' shuffles the order of the trades. Net profit and profit factor stay
+          the same, the drawdown shows how deep it could have been in another order.
+        * 'bootstrap' draws the trades with replacement, so every metric varies.
+
+        :param trades: `Backtest.get_trades()`, or the pnl of every trade in the order they closed.
+        :param resamples: Resamples per method.
+        :param chunk_size: Resamples held in memory at once, None computes them all at once. Each
+            chunk takes about chunk_size x trades x 32 bytes.
+        :param seed: Seed of the random generator, for repeatable results.
+        """
+        pnl = trades['pnl'].to_numpy() if isinstance(trades, pd.DataFrame) else trades
+        self.__pnl = np.asarray(pnl, dtype=np.float64)
+        self.__resamples = resamples
+        self.__chunk_size = chunk_size if chunk_size is not None else resamples
+        self.__rng = np.random.default_rng(seed)
+
+        self.__actual = {name: values[0] for name, values in self.metrics(self.__pnl[None, :]).items()}
+        self.__distributions = {method: self.__simulate(method) for method in self.METHODS}
+
+    @staticmethod
+    def metrics(pnl: np.ndarray, overwrite: bool = False) -> dict:
+        """
+        :param pnl: (resamples x trades) array, each row the pnl of trades in the order they close.
+        :param overwrite: Compute the equity in place of `pnl` instead of a copy of it.
+        :return: Metric name to an array with the metric of every row. Like `Backtest` the drawdown
+            is measured from the peak of the equity, which starts at the initial cash.
+        """
+        if not pnl.shape[1]:
+            return {'net profit': np.zeros(len(pnl)), 'max drawdown': np.zeros(len(pnl)),
+                    'profit factor': np.full(len(pnl), np.nan)}
+        gross_profit = np.maximum(pnl, 0).sum(axis=1)
+        equity = np.cumsum(pnl, axis=1, out=pnl if overwrite else None)
+        net_profit = equity[:, -1].copy()
+
+        drawdowns = np.maximum.accumulate(equity, axis=1)
+        np.maximum(drawdowns, 0, out=drawdowns)
+        np.subtract(drawdowns, equity, out=drawdowns)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            profit_factor = gross_profit / np.abs(net_profit - gross_profit)
+        return {'net profit': net_profit, 'max drawdown': drawdowns.max(axis=1), 'profit factor': profit_factor}
+
+    def __simulate(self, method):
+        count = len(self.__pnl)
+        chunks = []
+        for start in range(0, self.__resamples, self.__chunk_size):
+            size = min(self.__chunk_size, self.__resamples - start)
+            if method == 'permutation':
+                resampled = self.__rng.permuted(np.broadcast_to(self.__pnl, (size, count)), axis=1)
+            else:
+                resampled = self.__pnl[self.__rng.integers(0, count, (size, count))]
+            chunks.append(self.metrics(resampled, overwrite=True))
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in self.METRICS}
+
+    def get_distribution(self, method: str = 'bootstrap') -> pd.DataFrame:
+        """
+        :return: The metrics of every resample of one method, one row per resample.
+        """
+        return pd.DataFrame(self.__distributions[method])
+
+    def get_results(self, confidence: float = 0.95) -> pd.DataFrame:
+        """
+        :param confidence: Level of the two sided confidence interval.
+        :return: Per method and metric, the backtest's 'actual' value, the 'mean' and 'median' of
+            the resamples and the 'lower' and 'upper' bound of the confidence interval.
+        """
+        tail = (1 - confidence) / 2 * 100
+        rows = []
+        for method, distribution in self.__distributions.items():
+            for name in self.METRICS:
+                values = distribution[name]
+                # profit factors without losing trades are infinite and are left out of the mean
+                finite = values[np.isfinite(values)]
+                lower, median, upper = np.percentile(values, [tail, 50, 100 - tail]) if len(values) else [np.nan] * 3
+                rows.append({'method': method, 'metric': name, 'actual': self.__actual[name],
+                             'mean': finite.mean() if len(finite) else np.nan,
+                             'median': median, 'lower': lower, 'upper': upper})
+        return pd.DataFrame(rows).set_index(['method', 'metric'])
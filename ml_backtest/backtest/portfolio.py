@@ -0,0 +1,342 @@
+from ml_backtest.interfaces import Strategy
+from ml_backtest.backtest.ledger import TradeLedger
+from ml_backtest.data import BarClock
+from typing import Dict, List, Optional, Union
+import numpy as np
+import pandas as pd
+
+
+class PortfolioBacktest:
+    # most bars of all pending trades looked at in one array operation while searching exits
+    EXIT_SCAN_ELEMENTS = 4_000_000
+
+    def __init__(self, data: Union[Dict[str, pd.DataFrame], dict], strategy: Strategy,
+                 initial_cash=100000, signals: Optional[dict] = None):
+        """
+        Backtest one strategy over many symbols whose bars share the same dates. The bars
+        are held as a symbols x bars panel and the trades of every symbol are resolved
+        together: each round finds the exit of the open trade of every symbol with one set
+        of array operations, then moves each symbol to its first candidate after that exit.
+        Like `Backtest(vectorized=True)` each symbol holds at most one position at a time
+        and the trades of a symbol are the same as backtesting it on its own.
+
+        :param data: Symbol to its OHLC data-frame, or a panel from `PortfolioBacktest.panel()`.
+        :param strategy: Strategy whose `signals()` gives the candidate entries, of every symbol
+            at once from the panel when it has `panel_signals`, else of one symbol at a time.
+        :param initial_cash: Starting cash of the whole portfolio.
+        :param signals: Optional precomputed candidates, built with `Strategy.entries()` plus a
+            'symbol' array with the row of each entry in the panel.
+        """
+        if not strategy.holds_one_position():
+            raise ValueError("PortfolioBacktest holds one position at a time per symbol, "
+                             "the strategy's position limits must allow exactly one")
+        panel = data if 'symbols' in data else self.panel(data)
+        self.__symbols = list(panel['symbols'])
+        self.__clock = BarClock(panel['date'])
+        self.__lows = np.asarray(panel['low'], dtype=np.float64)
+        self.__highs = np.asarray(panel['high'], dtype=np.float64)
+        self.__closes = np.asarray(panel['close'], dtype=np.float64)
+        self.__opens = np.asarray(panel['open'], dtype=np.float64)
+        self.__strategy = strategy
+        self.__initial_cash = initial_cash
+        self.__ledger = TradeLedger(time_dtype=np.int64)
+        self.__trade_symbols = np.empty(0, dtype=np.int64)
+        self.__open_positions = []
+
+        if self.__closes.shape != (len(self.__symbols), len(self.__clock)):
+            raise ValueError("Panel columns must be symbols x bars arrays matching 'symbols' and 'date'")
+
+        self.__run(signals)
+
+    @staticmethod
+    def panel(frames: Dict[str, pd.DataFrame]) -> dict:
+        """
+        Stack per symbol data-frames into a panel: 'symbols', the shared 'date' column and
+        symbols x bars arrays of 'open', 'high', 'low' and 'close'.
+        """
+        symbols = list(frames)
+        dates = frames[symbols[0]]['date'].values
+        for symbol in symbols[1:]:
+            if len(frames[symbol]) != len(dates) or not np.array_equal(frames[symbol]['date'].values, dates):
+                raise ValueError(f"Dates of '{symbol}' are not aligned with '{symbols[0]}'")
+
+        panel = {'symbols': symbols, 'date': dates}
+        for column in ['open', 'high', 'low', 'close']:
+            panel[column] = np.empty((len(symbols), len(dates)), dtype=np.float64)
+            for row, symbol in enumerate(symbols):
+                panel[column][row] = frames[symbol][column].values
+        return panel
+
+    def __signals(self):
+        dates = self.__clock.epochs
+        if self.__strategy.panel_signals:
+            # one signals() call on the symbols x bars panel, its flat indices are split into
+            # the row and bar of every candidate
+            self.__strategy.set_data(self.__lows, self.__highs, self.__closes, self.__opens, dates)
+            self.__strategy.init()
+            self.__strategy.set_clock(self.__clock)
+            signals = self.__strategy.signals(self.__lows, self.__highs, self.__closes, self.__opens, dates)
+            symbols, index = np.divmod(signals['index'], len(dates))
+            return dict(signals, index=index, symbol=symbols)
+
+        # otherwise the strategy gives the candidates of one symbol at a time from its 1-D signals()
+        self.__strategy.set_data(self.__lows[0], self.__highs[0], self.__closes[0], self.__opens[0], dates)
+        self.__strategy.init()
+        self.__strategy.set_clock(self.__clock)
+
+        parts = []
+        for row in range(len(self.__symbols)):
+            self.__strategy.set_data(self.__lows[row], self.__highs[row], self.__closes[row], self.__opens[row],
+                                     dates)
+            signals = self.__strategy.signals(self.__lows[row], self.__highs[row], self.__closes[row],
+                                              self.__opens[row], dates)
+            parts.append(dict(signals, symbol=np.full(len(signals['index']), row, dtype=np.int64)))
+
+        signals = {key: np.concatenate([part[key] for part in parts])
+                   for key in ['index', 'side', 'entry price', 'take profit', 'stop loss', 'symbol']}
+        metadata_keys = parts[0].get('metadata', {}).keys() if parts else []
+        if metadata_keys:
+            signals['metadata'] = {key: np.concatenate([np.asarray(part['metadata'][key]) for part in parts])
+                                   for key in metadata_keys}
+        return signals
+
+    def __find_exits(self, candidates, entry_bars, sides, stop_losses, take_profits, symbols):
+        # exit bar and price of each candidate, -1 when it never exits. Every pending candidate
+        # is scanned over a window of bars at once, the window grows for those not yet out.
+        length = self.__closes.shape[1]
+        exit_bars = np.full(len(candidates), -1, dtype=np.int64)
+        exit_prices = np.full(len(candidates), np.nan)
+        start = entry_bars[candidates].copy()
+        pending = np.arange(len(candidates))
+        window = 64
+
+        while len(pending):
+            window = max(1, min(window, self.EXIT_SCAN_ELEMENTS // len(pending)))
+            bars = start[pending, None] + np.arange(window)
+            valid = bars < length
+            bars = np.minimum(bars, length - 1)
+            rows = symbols[candidates[pending], None]
+            lows, highs = self.__lows[rows, bars], self.__highs[rows, bars]
+
+            k = candidates[pending]
+            long = sides[k, None] == 1
+            stop, target = stop_losses[k, None], take_profits[k, None]
+            stop_hits = np.where(long, lows <= stop, highs >= stop) & valid
+            target_hits = np.where(long, highs >= target, lows <= target) & valid
+            hits = stop_hits | target_hits
+
+            found = hits.any(axis=1)
+            first = hits.argmax(axis=1)
+            done = pending[found]
+            exit_bars[done] = start[done] + first[found]
+            # the stop loss wins when both are touched in the same bar
+            stopped = stop_hits[found, first[found]]
+            exit_prices[done] = np.where(stopped, stop_losses[candidates[done]], take_profits[candidates[done]])
+
+            rest = pending[~found]
+            start[rest] += window
+            pending = rest[start[rest] < length]
+            window *= 2
+
+        return exit_bars, exit_prices
+
+    def __run(self, signals):
+        if signals is None:
+            signals = self.__signals()
+        dates = self.__clock.epochs
+        length = len(dates)
+
+        # candidates ordered by symbol, then bar
+        symbols = np.asarray(signals['symbol'], dtype=np.int64)
+        entry_index = np.asarray(signals['index'], dtype=np.int64)
+        order = np.lexsort((entry_index, symbols))
+        symbols, entry_index = symbols[order], entry_index[order]
+        sides = np.asarray(signals['side'])[order]
+        entry_prices = np.asarray(signals['entry price'], dtype=np.float64)[order]
+        take_profits = np.asarray(signals['take profit'], dtype=np.float64)[order]
+        stop_losses = np.asarray(signals['stop loss'], dtype=np.float64)[order]
+        metadata = {key: np.asarray(values)[order] for key, values in signals.get('metadata', {}).items()}
+        keys = symbols * length + entry_index
+
+        # every symbol starts at its first candidate, each round moves it past the exit
+        _, current = np.unique(symbols, return_index=True)
+        taken, exits, prices = [], [], []
+        while len(current):
+            exit_bars, exit_prices = self.__find_exits(current, entry_index, sides, stop_losses, take_profits,
+                                                       symbols)
+            closed = exit_bars >= 0
+            for k in current[~closed]:
+                self.__open_positions.append(self.__open_position(k, symbols, entry_index, sides, entry_prices,
+                                                                  take_profits, stop_losses, metadata))
+
+            current, exit_bars = current[closed], exit_bars[closed]
+            taken.append(current)
+            exits.append(exit_bars)
+            prices.append(exit_prices[closed])
+
+            following = np.searchsorted(keys, symbols[current] * length + exit_bars, side='right')
+            same_symbol = following < len(keys)
+            same_symbol[same_symbol] = symbols[following[same_symbol]] == symbols[current[same_symbol]]
+            current = following[same_symbol]
+
+        taken = np.concatenate(taken) if taken else np.empty(0, dtype=np.int64)
+        exit_index = np.concatenate(exits) if exits else np.empty(0, dtype=np.int64)
+        exit_prices = np.concatenate(prices) if prices else np.empty(0)
+        order = np.argsort(taken, kind='stable')
+        taken, exit_index, exit_prices = taken[order], exit_index[order], exit_prices[order]
+        self.__record_trades(taken, exit_index, exit_prices, symbols, entry_index, sides, entry_prices,
+                             take_profits, stop_losses, metadata)
+
+    def __open_position(self, k, symbols, entry_index, sides, entry_prices, take_profits, stop_losses, metadata):
+        index = entry_index[k]
+        position = {
+            'symbol': self.__symbols[symbols[k]],
+            'type': 'long' if sides[k] == 1 else 'short',
+            'entry price': entry_prices[k],
+            'take profit': take_profits[k],
+            'stop loss': stop_losses[k],
+            'entry time': self.__clock.epochs[index],
+            'entry index': index
+        }
+        if metadata:
+            position['metadata'] = {key: values[k] for key, values in metadata.items()}
+        position['highest high'] = self.__highs[symbols[k], index:].max()
+        position['target'] = position['highest high'] - position['entry price']
+        return position
+
+    def __record_trades(self, taken, exit_index, exit_prices, symbols, entry_index, sides, entry_prices,
+                        take_profits, stop_losses, metadata):
+        length = self.__closes.shape[1]
+        trade_symbols = symbols[taken]
+        entries = entry_index[taken]
+        long = sides[taken] == 1
+        pnl = np.where(long, exit_prices - entry_prices[taken], entry_prices[taken] - exit_prices)
+
+        # highest high from entry to exit of every trade with one reduceat over the flat panel,
+        # trades of a symbol never overlap so the [entry, exit] spans are ordered and disjoint
+        flat_highs = np.append(self.__highs.ravel(), -np.inf)
+        spans = np.empty(2 * len(taken), dtype=np.int64)
+        spans[0::2] = trade_symbols * length + entries
+        spans[1::2] = trade_symbols * length + exit_index + 1
+        highest_highs = np.maximum.reduceat(flat_highs, spans)[0::2] if len(taken) else np.empty(0)
+
+        dates = self.__clock.epochs
+        self.__ledger.extend({
+            'type': (~long).astype(np.int8),
+            'entry price': entry_prices[taken],
+            'take profit': take_profits[taken],
+            'stop loss': stop_losses[taken],
+            'entry time': dates[entries],
+            'highest high': highest_highs,
+            'target': highest_highs - entry_prices[taken],
+            'exit price': exit_prices,
+            'exit time': dates[exit_index],
+            'size': np.ones(len(taken), dtype=np.int64),
+            'pnl': pnl,
+            'entry index': entries,
+            'exit index': exit_index
+        }, {key: values[taken] for key, values in metadata.items()})
+        self.__trade_symbols = trade_symbols
+
+    def get_trades(self, symbol: Optional[str] = None, copy: bool = True) -> pd.DataFrame:
+        """
+        :param symbol: Only the trades of this symbol.
+        :param copy: Return a writable copy, False wraps the ledger's arrays without copying them.
+        :return: Closed trades ordered by symbol and entry, with a 'symbol' column first.
+        """
+        trades = self.__ledger.to_frame(copy=copy)
+        trades.insert(0, 'symbol', pd.Categorical.from_codes(self.__trade_symbols, categories=self.__symbols))
+        if symbol is not None:
+            trades = trades[trades['symbol'] == symbol].reset_index(drop=True)
+        return trades
+
+    def get_open_positions(self) -> List[dict]:
+        """
+        :return: Positions that never reached their take profit or stop loss, one dict each.
+        """
+        return self.__open_positions
+
+    def __equity(self):
+        # per symbol realised and open pnl of every bar, computed like Backtest.get_equity_curve()
+        count, length = self.__closes.shape
+        side = np.where(self.__ledger.column('type') == 0, 1.0, -1.0) * self.__ledger.column('size')
+        rows = self.__trade_symbols
+        entries = rows * (length + 1) + self.__ledger.column('entry index')
+        exits = rows * (length + 1) + self.__ledger.column('exit index')
+        entry_prices = self.__ledger.column('entry price')
+
+        for position in self.__open_positions:
+            row = self.__symbols.index(position['symbol'])
+            side = np.append(side, 1.0 if position['type'] == 'long' else -1.0)
+            entries = np.append(entries, row * (length + 1) + position['entry index'])
+            exits = np.append(exits, row * (length + 1) + length)
+            entry_prices = np.append(entry_prices, position['entry price'])
+
+        realised = np.bincount(rows * length + self.__ledger.column('exit index'),
+                               weights=self.__ledger.column('pnl'), minlength=count * length)
+        cash = np.cumsum(realised.reshape(count, length), axis=1)
+
+        # one extra bar per symbol takes the steps of positions open up to the last bar
+        units = np.zeros(count * (length + 1))
+        cost = np.zeros(count * (length + 1))
+        np.add.at(units, entries, side)
+        np.add.at(units, exits, -side)
+        np.add.at(cost, entries, side * entry_prices)
+        np.add.at(cost, exits, -side * entry_prices)
+        units = np.cumsum(units.reshape(count, length + 1)[:, :length], axis=1)
+        cost = np.cumsum(cost.reshape(count, length + 1)[:, :length], axis=1)
+        return cash, units * self.__closes - cost
+
+    def get_equity_curve(self, symbol: Optional[str] = None) -> pd.DataFrame:
+        """
+        Per bar equity marked to market at the close. The portfolio curve starts at
+        initial_cash, the curve of a single symbol at 0.
+
+        :param symbol: The curve of this symbol instead of the whole portfolio.
+        :return: DataFrame with one row per bar of 'date', 'cash', 'open pnl', 'equity' and 'drawdown'.
+        """
+        cash, open_pnl = self.__equity()
+        if symbol is not None:
+            row = self.__symbols.index(symbol)
+            cash, open_pnl = cash[row], open_pnl[row]
+        else:
+            cash, open_pnl = self.__initial_cash + cash.sum(axis=0), open_pnl.sum(axis=0)
+
+        equity = cash + open_pnl
+        return pd.DataFrame({'date': self.__clock.epochs,
+                             'cash': cash,
+                             'open pnl': open_pnl,
+                             'equity': equity,
+                             'drawdown': np.maximum.accumulate(equity) - equity})
+
+    def get_results(self) -> pd.DataFrame:
+        """
+        :return: One row per symbol and a last 'portfolio' row with the trade statistics,
+            max drawdown is taken from the mark to market equity curves.
+        """
+        count = len(self.__symbols)
+        rows = self.__trade_symbols
+        pnl = self.__ledger.column('pnl')
+
+        def per_symbol(mask, weights=None):
+            values = np.bincount(rows[mask], weights=None if weights is None else weights[mask], minlength=count)
+            return np.append(values, values.sum())
+
+        wins, loses = per_symbol(pnl > 0), per_symbol(pnl < 0)
+        gross_profit, gross_loss = per_symbol(pnl > 0, pnl), per_symbol(pnl < 0, pnl)
+        cash, open_pnl = self.__equity()
+        equity = np.vstack([cash + open_pnl, (cash + open_pnl).sum(axis=0)])
+        max_drawdown = (np.maximum.accumulate(equity, axis=1) - equity).max(axis=1, initial=0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            results = pd.DataFrame({'# of trades': per_symbol(np.ones(len(pnl), dtype=bool)),
+                                    '# of wins': wins,
+                                    '# of loses': loses,
+                                    'win rate': np.around(wins / (wins + loses) * 100, decimals=2),
+                                    'net profit': np.around(gross_profit + gross_loss, decimals=2),
+                                    'max drawdown': np.around(-max_drawdown, decimals=2),
+                                    'gross profit': np.around(gross_profit, decimals=2),
+                                    'gross loss': np.around(gross_loss, decimals=2),
+                                    'profit factor': np.around(gross_profit / np.abs(gross_loss), decimals=2)},
+                                   index=pd.Index(self.__symbols + ['portfolio'], name='symbol'))
+        return results
@@ -0,0 +1,190 @@
+import heapq
+import math
+from typing import Iterator, List, Tuple
+
+
+class Position(dict):
+    """
+    An open position. Setting its 'stop loss' or 'take profit' re-files it in its book, so
+    the new level is checked from the book's next `exits()` on. A level set in `on_bar()`
+    is already checked on that bar.
+    """
+
+    LEVELS = ('stop loss', 'take profit')
+
+    def __init__(self, position: dict, book: 'PositionBook'):
+        super().__init__(position)
+        self.book = book
+        self.sequence = None
+
+    def __setitem__(self, key, value):
+        if key in self.LEVELS:
+            PositionBook.check_level(key, value)
+        super().__setitem__(key, value)
+        if key in self.LEVELS:
+            self.book.update_levels(self)
+
+    def update(self, *args, **kwargs):
+        values = dict(*args, **kwargs)
+        for key in self.LEVELS:
+            if key in values:
+                PositionBook.check_level(key, values[key])
+        super().update(values)
+        if any(key in values for key in self.LEVELS):
+            self.book.update_levels(self)
+
+    def __reduce__(self):
+        # pickled, e.g. for another process, as a plain dict without its book
+        return dict, (dict(self),)
+
+
+class PositionBook:
+    """
+    The open positions of a strategy, kept in entry order and in four heaps ordered by
+    the level that closes them: long stops (highest first), long targets (lowest first),
+    short stops (lowest first) and short targets (highest first). Checking a bar only
+    pops the positions whose level it reaches, O(triggered * log n) instead of looking at
+    every open position.
+
+    Positions are kept as `Position` dicts, setting their 'stop loss' or 'take profit', e.g.
+    for a trailing stop, re-files them by the new level. A None level never triggers, a NaN
+    level raises a ValueError.
+    """
+
+    def __init__(self):
+        self.__open = {}
+        self.__new = []
+        self.__sequence = 0
+        self.__sides = {'long': 0, 'short': 0}
+        # levels of a position are re-filed under a new version, entries of older versions are stale
+        self.__versions = {}
+        # (key, sequence, version, position, level): a bar triggers every entry whose key is at
+        # most its bound, keys are negated levels in the heaps that trigger highest first
+        self.__long_stops = []
+        self.__long_targets = []
+        self.__short_stops = []
+        self.__short_targets = []
+
+    def __len__(self):
+        return len(self.__open) + len(self.__new)
+
+    def __iter__(self) -> Iterator[dict]:
+        yield from self.__open.values()
+        yield from self.__new
+
+    def __getitem__(self, i) -> dict:
+        return list(self)[i]
+
+    def count(self, side: str) -> int:
+        """
+        :return: Number of open positions on a side, 'long' or 'short'.
+        """
+        return self.__sides[side]
+
+    @staticmethod
+    def check_level(name: str, level):
+        """
+        Reject a NaN stop loss or take profit, no bar would ever reach it. None is allowed and
+        never triggers.
+        """
+        if level is not None and math.isnan(level):
+            raise ValueError(f"The {name} of a position must be a price or None, not NaN")
+
+    def append(self, position: dict):
+        """
+        Add a position opened by the strategy, it is checked for exits from the next `open_new()`.
+        """
+        for name in Position.LEVELS:
+            self.check_level(name, position.get(name))
+        position = position if isinstance(position, Position) and position.book is self else Position(position, self)
+        self.__new.append(position)
+        self.__sides[position['type']] += 1
+
+    def open_new(self, index: int):
+        """
+        Tag the positions added since the last call with the bar they were opened on and
+        file them by their levels.
+        """
+        if not self.__new:
+            return
+        for position in self.__new:
+            if position.get('entry index') is None:
+                dict.__setitem__(position, 'entry index', index)
+            sequence = self.__sequence
+            self.__sequence += 1
+            position.sequence = sequence
+            self.__open[sequence] = position
+            self.__versions[sequence] = 0
+            self.__file(position)
+        self.__new.clear()
+
+    def update_levels(self, position: dict):
+        """
+        File an open position again by its current stop loss and take profit, after they were
+        changed. `Position` dicts call this themselves when a level is set.
+        """
+        sequence = getattr(position, 'sequence', None)
+        if sequence is None or self.__open.get(sequence) is not position:
+            # not filed yet, or already closed
+            return
+        self.__versions[sequence] += 1
+        self.__file(position)
+        self.__compact()
+
+    def __file(self, position):
+        sequence, version = position.sequence, self.__versions[position.sequence]
+        stop_loss, take_profit = position['stop loss'], position['take profit']
+        entry = (sequence, version, position)
+        if position['type'] == 'long':
+            self.__push(self.__long_stops, stop_loss, -1, entry)
+            self.__push(self.__long_targets, take_profit, 1, entry)
+        else:
+            self.__push(self.__short_stops, stop_loss, 1, entry)
+            self.__push(self.__short_targets, take_profit, -1, entry)
+
+    @staticmethod
+    def __push(heap, level, sign, entry):
+        if level is not None:
+            heapq.heappush(heap, (sign * level, *entry, level))
+
+    def exits(self, low: float, high: float) -> List[Tuple[dict, float]]:
+        """
+        Remove and return the positions a bar closes with their exit price, in entry order.
+        The stop loss wins when both levels are reached in the same bar.
+        """
+        long_stops, long_targets = self.__long_stops, self.__long_targets
+        short_stops, short_targets = self.__short_stops, self.__short_targets
+        # nothing triggers on most bars, so check the top of every heap before anything else
+        if not ((long_stops and long_stops[0][0] <= -low) or (short_stops and short_stops[0][0] <= high)
+                or (long_targets and long_targets[0][0] <= high)
+                or (short_targets and short_targets[0][0] <= -low)):
+            return []
+
+        exits = self.__pop(long_stops, -low) + self.__pop(short_stops, high)
+        exits += self.__pop(long_targets, high) + self.__pop(short_targets, -low)
+        exits.sort(key=lambda exit: exit[0])
+        self.__compact()
+        return [(position, price) for _, position, price in exits]
+
+    def __pop(self, heap, bound):
+        exits = []
+        while heap and heap[0][0] <= bound:
+            _, sequence, version, position, level = heapq.heappop(heap)
+            if sequence not in self.__open or self.__versions[sequence] != version:
+                # already closed by its other level, or filed again under new levels
+                continue
+            del self.__open[sequence]
+            del self.__versions[sequence]
+            self.__sides[position['type']] -= 1
+            exits.append((sequence, position, level))
+        return exits
+
+    def __compact(self):
+        # rebuild the heaps once the stale entries outnumber the ones of open positions
+        heaps = (self.__long_stops, self.__long_targets, self.__short_stops, self.__short_targets)
+        if sum(len(heap) for heap in heaps) <= 4 * len(self.__open) + 64:
+            return
+        versions = self.__versions
+        for heap in heaps:
+            heap[:] = [entry for entry in heap if versions.get(entry[1]) == entry[2]]
+            heapq.heapify(heap)
@@ -0,0 +1,108 @@
+from ml_backtest.backtest.backtest import Backtest
+from ml_backtest.interfaces import Strategy
+from ml_backtest.data import BarClock
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from itertools import product
+from typing import Type, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import os
+
+# per worker process state, set once by the pool initializer
+_worker_data = None
+_worker_memory = []
+_worker_settings = None
+
+
+def _attach(columns, strategy_class, backtest_kwargs):
+    global _worker_data, _worker_settings
+
+    arrays = {}
+    for name, (memory_name, dtype, length) in columns.items():
+        # the pool shares the parent's resource tracker, so the parent alone unlinks the blocks
+        memory = SharedMemory(name=memory_name)
+        _worker_memory.append(memory)
+        arrays[name] = np.ndarray((length,), dtype=dtype, buffer=memory.buf)
+
+    _worker_data = pd.DataFrame(arrays, copy=False)
+    _worker_settings = (strategy_class, backtest_kwargs)
+
+
+def _run(params):
+    strategy_class, backtest_kwargs = _worker_settings
+    results = Backtest(_worker_data, strategy_class(**params), **backtest_kwargs).get_results()
+    row = dict(params)
+    row.update(results[0].to_dict())
+    return row
+
+
+class ParameterSweep:
+    def __init__(self, strategy_class: Type[Strategy], grid: Dict[str, List],
+                 data: pd.DataFrame, processes: Optional[int] = None,
+                 vectorized: bool = True, **backtest_kwargs):
+        """
+        Run a `Backtest` for every combination of strategy parameters in `grid` over a
+        process pool. The data columns are placed in shared memory once and every worker
+        maps them instead of receiving a pickled copy of the frame.
+
+        :param strategy_class: Strategy to sweep, created with each parameter set as keyword arguments.
+        :param grid: Parameter name to the list of values to try.
+        :param data: OHLC data with dates, like the data passed to `Backtest`.
+        :param processes: Number of worker processes, defaults to every core.
+        :param vectorized: Run each backtest with the vectorized engine.
+        :param backtest_kwargs: Any other `Backtest` arguments, e.g. initial_cash.
+        """
+        self.__strategy_class = strategy_class
+        self.__grid = grid
+        self.__data = data
+        self.__processes = processes if processes is not None else os.cpu_count()
+        self.__backtest_kwargs = dict(backtest_kwargs, vectorized=vectorized)
+
+    def __parameter_sets(self) -> List[dict]:
+        names = list(self.__grid)
+        return [dict(zip(names, values)) for values in product(*(self.__grid[name] for name in names))]
+
+    def __shared_columns(self):
+        columns = {}
+        for name in self.__data.columns:
+            values = self.__data[name].to_numpy()
+            if name == 'date':
+                # strings cannot live in shared memory, store the Unix timestamps the backtest uses
+                values = BarClock.to_epochs(values)
+            if values.dtype.kind not in 'iufb':
+                continue
+            columns[name] = values
+        return columns
+
+    def run(self) -> pd.DataFrame:
+        """
+        :return: One row per parameter set with the parameters and the `get_results()` metrics. Sets
+            without losing trades have an infinite profit factor, without closed trades a NaN win rate.
+        """
+        parameter_sets = self.__parameter_sets()
+        memories = []
+        try:
+            shared = {}
+            for name, values in self.__shared_columns().items():
+                memory = SharedMemory(create=True, size=max(values.nbytes, 1))
+                memories.append(memory)
+                np.ndarray(values.shape, dtype=values.dtype, buffer=memory.buf)[:] = values
+                shared[name] = (memory.name, values.dtype.str, len(values))
+
+            chunksize = max(1, len(parameter_sets) // (self.__processes * 4))
+            with ProcessPoolExecutor(max_workers=self.__processes, initializer=_attach,
+                                     initargs=(shared, self.__strategy_class, self.__backtest_kwargs)) as pool:
+                rows = list(pool.map(_run, parameter_sets, chunksize=chunksize))
+        finally:
+            for memory in memories:
+                memory.close()
+                memory.unlink()
+
+        sweep = pd.DataFrame(rows)
+        # the results frame keeps these as display strings, make them sortable numbers
+        if 'win rate' in sweep:
+            sweep['win rate'] = pd.to_numeric(sweep['win rate'].astype(str).str.rstrip('%'), errors='coerce')
+        if 'max drawdown' in sweep:
+            sweep['max drawdown'] = pd.to_numeric(sweep['max drawdown'], errors='coerce')
+        return sweep
@@ -1,2 +1,5 @@
-from .data import CandleStickPatterns
-from .data import Data
\ No newline at end of file
+from .data import CandleStickPatterns, VectorizedCandleStickPatterns
+from .data import Data
+from .store import ColumnStore
+from .clock import BarClock
+from .pyramid import BarPyramid
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from datetime import time
+
+
+class BarClock:
+    """
+    Dates of every bar parsed once into int64 Unix timestamps, with the time of day
+    and a session id per bar precomputed, so no date is parsed inside the bar loop.
+    A session is one calendar day, numbered from 0 in order of appearance.
+    """
+
+    DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+    def __init__(self, dates, date_format: str = DATE_FORMAT):
+        self.epochs = self.to_epochs(dates, date_format)
+        self.second_of_day = (self.epochs % 86400).astype(np.int32)
+        self.minute_of_day = (self.second_of_day // 60).astype(np.int16)
+
+        days = self.epochs // 86400
+        new_session = np.empty(len(days), dtype=bool)
+        new_session[:1] = False
+        new_session[1:] = days[1:] != days[:-1]
+        self.session_id = np.cumsum(new_session, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.epochs)
+
+    @staticmethod
+    def to_epochs(dates, date_format: str = DATE_FORMAT) -> np.ndarray:
+        """
+        Convert dates to int64 Unix timestamps. Numbers are taken as timestamps already,
+        datetimes are converted and strings are parsed with `date_format`.
+        """
+        dates = np.asarray(dates)
+        if dates.dtype.kind in 'iu':
+            return dates.astype(np.int64, copy=False)
+        if dates.dtype.kind == 'M':
+            return dates.astype('datetime64[s]').astype(np.int64)
+        return pd.to_datetime(dates, format=date_format).to_numpy().astype('datetime64[s]').astype(np.int64)
+
+    @classmethod
+    def from_columns(cls, epochs: np.ndarray, second_of_day: np.ndarray, minute_of_day: np.ndarray,
+                     session_id: np.ndarray) -> 'BarClock':
+        """
+        A clock of columns computed already, e.g. kept bar by bar by a `LiveRunner`, used as
+        they are without parsing or copying them.
+        """
+        clock = cls.__new__(cls)
+        clock.epochs = epochs
+        clock.second_of_day = second_of_day
+        clock.minute_of_day = minute_of_day
+        clock.session_id = session_id
+        return clock
+
+    @staticmethod
+    def seconds(time_of_day: time) -> float:
+        """
+        :return: Seconds since midnight of a time of day.
+        """
+        return (time_of_day.hour * 3600 + time_of_day.minute * 60 + time_of_day.second +
+                time_of_day.microsecond / 1e6)
+
+    def between(self, open_time: time, close_time: time) -> np.ndarray:
+        """
+        :return: Boolean mask of the bars whose time of day is within open_time and close_time, inclusive.
+        """
+        open_seconds, close_seconds = self.seconds(open_time), self.seconds(close_time)
+        return (open_seconds <= self.second_of_day) & (self.second_of_day <= close_seconds)
@@ -1,3 +1,6 @@
+from ml_backtest.data.store import ColumnStore
+from typing import Optional
+import numpy as np
 import pandas as pd
 import os
 
@@ -76,6 +79,116 @@ class CandleStickPatterns:
                 prev_open > current_close > prev_close + ((prev_open - prev_close) / 2))
 
 
+class VectorizedCandleStickPatterns:
+    """
+    Array versions of the `CandleStickPatterns` detectors. Every method takes the
+    full open, high, low and close columns and returns a boolean mask with one entry
+    per bar, equal to calling the scalar detector on that bar. Multi-bar patterns use
+    shifted views of the columns, so the first bars that have no history are False.
+    Columns may also be 2-D (symbols x bars), the bar axis is always the last one.
+    """
+
+    @staticmethod
+    def __shifted(mask_shape, lookback, condition):
+        mask = np.zeros(mask_shape, dtype=bool)
+        mask[..., lookback:] = condition
+        return mask
+
+    @staticmethod
+    def is_inverted_hammer(opens, highs, lows, closes):
+        body_length = np.abs(opens - closes)
+        upper_shadow = highs - np.maximum(opens, closes)
+        total_length = highs - lows
+        lower_shadow = np.minimum(opens, closes) - lows
+
+        return (((highs - lows) > 3 * body_length) &
+                (upper_shadow / (0.001 + total_length) > 0.6) &
+                (lower_shadow / (0.001 + total_length) < 0.4))
+
+    @staticmethod
+    def is_bullish_engulfing(opens, highs, lows, closes):
+        current_open, current_close = opens[..., 1:], closes[..., 1:]
+        prev_open, prev_close = opens[..., :-1], closes[..., :-1]
+
+        condition = ((current_close >= prev_open) & (prev_open > prev_close) & (prev_close >= current_open) &
+                     (current_close > current_open) &
+                     (current_close - current_open > prev_open - prev_close))
+        return VectorizedCandleStickPatterns.__shifted(np.shape(opens), 1, condition)
+
+    @staticmethod
+    def is_bullish_harami(opens, highs, lows, closes):
+        current_open, current_close = opens[..., 1:], closes[..., 1:]
+        prev_open, prev_close = opens[..., :-1], closes[..., :-1]
+
+        condition = ((prev_open > prev_close) &
+                     (prev_close <= current_open) & (current_open < current_close) & (current_close <= prev_open) &
+                     (current_close - current_open < prev_open - prev_close))
+        return VectorizedCandleStickPatterns.__shifted(np.shape(opens), 1, condition)
+
+    @staticmethod
+    def is_dragonfly_doji(opens, highs, lows, closes):
+        body_range = np.abs(closes - opens)
+        total_range = highs - lows
+        upper_shadow = highs - np.maximum(closes, opens)
+        lower_shadow = np.minimum(closes, opens) - lows
+
+        return ((body_range / (total_range + 0.001) < 0.1) &
+                (lower_shadow > (3 * body_range)) &
+                (upper_shadow < body_range))
+
+    @staticmethod
+    def is_hammer(opens, highs, lows, closes):
+        return (((highs - lows) > 3 * np.abs(opens - closes)) &
+                ((closes - lows) / (0.001 + highs - lows) > 0.6) &
+                ((opens - lows) / (0.001 + highs - lows) > 0.6))
+
+    @staticmethod
+    def is_morning_star(opens, highs, lows, closes):
+        current_open, current_close = opens[..., 2:], closes[..., 2:]
+        prev_open, prev_close = opens[..., 1:-1], closes[..., 1:-1]
+        b_prev_open, b_prev_close = opens[..., :-2], closes[..., :-2]
+        b_prev_top = np.maximum(b_prev_open, b_prev_close)
+
+        condition = ((b_prev_top < prev_close) & (prev_close < prev_open) &
+                     (current_close > current_open) & (current_open > b_prev_top))
+        return VectorizedCandleStickPatterns.__shifted(np.shape(opens), 2, condition)
+
+    @staticmethod
+    def is_morning_star_doji(opens, highs, lows, closes):
+        current_open, current_close = opens[..., 2:], closes[..., 2:]
+        current_high, current_low = highs[..., 2:], lows[..., 2:]
+        prev_open, prev_close = opens[..., 1:-1], closes[..., 1:-1]
+        prev_high, prev_low = highs[..., 1:-1], lows[..., 1:-1]
+        b_prev_open, b_prev_close = opens[..., :-2], closes[..., :-2]
+        b_prev_high, b_prev_low = highs[..., :-2], lows[..., :-2]
+        prev_body = np.abs(prev_close - prev_open)
+
+        condition = ((b_prev_close < b_prev_open) &
+                     (np.abs(b_prev_close - b_prev_open) / (0.001 + b_prev_high - b_prev_low) >= 0.7) &
+                     (prev_body / (0.001 + prev_high - prev_low) < 0.1) &
+                     (current_close > current_open) &
+                     (np.abs(current_close - current_open) / (0.001 + current_high - current_low) >= 0.7) &
+                     (b_prev_close > prev_close) &
+                     (b_prev_close > prev_open) &
+                     (prev_close < current_open) &
+                     (prev_open < current_open) &
+                     (current_close > b_prev_close) &
+                     ((prev_high - np.maximum(prev_close, prev_open)) > (3 * prev_body)) &
+                     ((np.minimum(prev_close, prev_open) - prev_low) > (3 * prev_body)))
+        return VectorizedCandleStickPatterns.__shifted(np.shape(opens), 2, condition)
+
+    @staticmethod
+    def is_piercing_pattern(opens, highs, lows, closes):
+        current_open, current_close = opens[..., 1:], closes[..., 1:]
+        prev_open, prev_close, prev_low = opens[..., :-1], closes[..., :-1], lows[..., :-1]
+
+        condition = ((prev_close < prev_open) &
+                     (current_open < prev_low) &
+                     (prev_open > current_close) &
+                     (current_close > prev_close + ((prev_open - prev_close) / 2)))
+        return VectorizedCandleStickPatterns.__shifted(np.shape(opens), 1, condition)
+
+
 class Data:
     @staticmethod
     def data():
@@ -83,3 +196,44 @@ class Data:
         csv_file_path = os.path.join(dir_path, 'last_4000_rows.csv')
         df = pd.read_csv(csv_file_path)
         return df
+
+    @staticmethod
+    def store(path: Optional[str] = None) -> ColumnStore:
+        """
+        The bundled data as a memory mapped `ColumnStore`. The CSV is converted the
+        first time and the store file is reused afterwards.
+
+        :param path: Where to keep the store, defaults to ~/.cache/ml_backtest.
+        """
+        if path is None:
+            path = os.path.join(os.path.expanduser('~'), '.cache', 'ml_backtest', 'last_4000_rows.mlbt')
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            dir_path = os.path.dirname(os.path.realpath(__file__))
+            ColumnStore.from_csv(os.path.join(dir_path, 'last_4000_rows.csv'), path)
+        return ColumnStore(path)
+
+    @staticmethod
+    def synthetic(bars: int, seed: int = 0, interval: int = 300, tick: float = 0.25) -> pd.DataFrame:
+        """
+        Seeded random walk OHLC bars shaped like the bundled data, for benchmarks and
+        tests at any scale. The same bars and seed always give the same data.
+
+        :param bars: Number of bars.
+        :param seed: Seed of the random generator.
+        :param interval: Seconds between bars, dates are int64 Unix timestamps from 1/1/2020.
+        :param tick: Prices are rounded to multiples of the tick size.
+        :return: DataFrame with 'date', 'open', 'high', 'low' and 'close' columns.
+        """
+        rng = np.random.default_rng(seed)
+        close = 18000 + np.cumsum(rng.normal(0, 4, bars))
+        open = np.empty(bars)
+        open[0] = close[0]
+        # each bar opens near the previous close
+        open[1:] = close[:-1] + rng.normal(0, 1, bars - 1)
+        high = np.maximum(open, close) + np.abs(rng.normal(0, 3, bars))
+        low = np.minimum(open, close) - np.abs(rng.normal(0, 3, bars))
+
+        open, high, low, close = (np.round(values / tick) * tick for values in (open, high, low, close))
+        dates = 1577836800 + interval * np.arange(bars, dtype=np.int64)
+        return pd.DataFrame({'date': dates, 'open': open, 'high': high, 'low': low, 'close': close})
@@ -0,0 +1,118 @@
+from ml_backtest.data.clock import BarClock
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+
+class BarPyramid:
+    """
+    OHLC bars at a base resolution plus resampled views at coarser intervals, e.g.
+    1 minute bars viewed as 5 minute and 1 hour bars. Every level is resampled once
+    from the level below it and keeps the index of its first bar there, so going from a
+    coarse bar to the finer bars inside it is a lookup.
+
+    `Backtest(pyramid, strategy, resolution=3600)` runs on the 1 hour bars and only drills
+    down to the finer bars for the bars that reach both the stop loss and take profit of
+    a trade, to find which one was reached first.
+    """
+
+    COLUMNS = ['open', 'high', 'low', 'close']
+
+    def __init__(self, data: pd.DataFrame, intervals: List[int], base_interval: Optional[int] = None):
+        """
+        :param data: Base resolution bars with 'date' and OHLC columns.
+        :param intervals: Seconds per bar of the coarser levels, each a multiple of the one before.
+        :param base_interval: Seconds per base bar, defaults to the smallest gap between dates.
+        """
+        dates = BarClock.to_epochs(data['date'].values)
+        if base_interval is None:
+            gaps = np.diff(dates)
+            base_interval = int(gaps[gaps > 0].min()) if (gaps > 0).any() else 1
+        self.intervals = [base_interval] + sorted(intervals)
+        for finer, coarser in zip(self.intervals, self.intervals[1:]):
+            if coarser <= finer or coarser % finer:
+                raise ValueError(f"Interval {coarser} is not a multiple of the finer interval {finer}")
+
+        base = {'date': dates}
+        base.update({name: np.asarray(data[name].values, dtype=np.float64) for name in self.COLUMNS})
+        self.__levels = [base]
+        # starts[level][i] is the first bar of the level below inside bar i, with one extra
+        # entry closing the last bar
+        self.__starts = [None]
+        self.__frames = {}
+        for interval in self.intervals[1:]:
+            level, starts = self.__resample(self.__levels[-1], interval)
+            self.__levels.append(level)
+            self.__starts.append(starts)
+
+    @staticmethod
+    def __resample(finer, interval):
+        bucket = finer['date'] // interval
+        first = np.empty(len(bucket), dtype=bool)
+        first[:1] = True
+        first[1:] = bucket[1:] != bucket[:-1]
+        starts = np.flatnonzero(first)
+
+        level = {'date': bucket[starts] * interval,
+                 'open': finer['open'][starts],
+                 'high': np.maximum.reduceat(finer['high'], starts),
+                 'low': np.minimum.reduceat(finer['low'], starts),
+                 'close': finer['close'][np.append(starts[1:], len(bucket)) - 1]}
+        return level, np.append(starts, len(bucket))
+
+    def __level(self, interval) -> int:
+        if interval not in self.intervals:
+            raise ValueError(f"No level with {interval} second bars, the levels are {self.intervals}")
+        return self.intervals.index(interval)
+
+    def frame(self, interval: Optional[int] = None) -> pd.DataFrame:
+        """
+        :param interval: Seconds per bar, defaults to the coarsest level.
+        :return: The bars of a level with 'date' as int64 Unix timestamps of each bar's start.
+        """
+        interval = interval if interval is not None else self.intervals[-1]
+        if interval not in self.__frames:
+            self.__frames[interval] = pd.DataFrame(self.__levels[self.__level(interval)], copy=False)
+        return self.__frames[interval]
+
+    def children(self, interval: int, index: int) -> slice:
+        """
+        :return: Slice of the bars one level finer than `interval` inside its bar at `index`.
+        """
+        starts = self.__starts[self.__level(interval)]
+        return slice(starts[index], starts[index + 1])
+
+    def parent(self, interval: int, fine_index):
+        """
+        :return: Index of the bar at `interval` containing the bar (or array of bars) at
+            `fine_index` one level finer.
+        """
+        return np.searchsorted(self.__starts[self.__level(interval)], fine_index, side='right') - 1
+
+    def resolve_exit(self, interval: int, index: int, side: str, stop_loss: float, take_profit: float) -> float:
+        """
+        Exit price of a trade whose stop loss and take profit are both reached in the bar at
+        `index`. Walks down the levels, each time to the first finer bar reaching either,
+        until one bar reaches only one of them. The stop loss wins if even a base bar
+        reaches both.
+        """
+        level = self.__level(interval)
+        first, last = index, index + 1
+        while level > 0:
+            starts = self.__starts[level]
+            level -= 1
+            first, last = starts[first], starts[last]
+            lows, highs = self.__levels[level]['low'][first:last], self.__levels[level]['high'][first:last]
+            if side == 'long':
+                stop_hits, target_hits = lows <= stop_loss, highs >= take_profit
+            else:
+                stop_hits, target_hits = highs >= stop_loss, lows <= take_profit
+
+            hits = stop_hits | target_hits
+            if not hits.any():
+                break
+            offset = hits.argmax()
+            if not (stop_hits[offset] and target_hits[offset]):
+                return stop_loss if stop_hits[offset] else take_profit
+            first, last = first + offset, first + offset + 1
+        return stop_loss
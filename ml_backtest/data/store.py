@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import tempfile
+import shutil
+import json
+import os
+from typing import Optional, List
+
+
+class ColumnStore:
+    """
+    Binary columnar store for OHLC data. Dates are int64 Unix timestamps and every
+    other column float64. The file is a small JSON header followed by each column
+    as one contiguous, 64 byte aligned block, so opening it only reads the header and
+    columns are memory mapped lazily when first used. Processes opening the same file
+    share the OS page cache.
+
+    Layout: 8 byte magic, uint64 header length, JSON header, then the column blocks.
+    """
+
+    MAGIC = b'MLBTCOL1'
+    ALIGNMENT = 64
+    DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise ValueError(f"{path} is not a ColumnStore file")
+            header_length = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+            self.__header = json.loads(f.read(header_length).decode('utf-8'))
+
+        self.__data_offset = self.__align(len(self.MAGIC) + 8 + header_length)
+        self.__columns = {column['name']: column for column in self.__header['columns']}
+        self.__maps = {}
+
+    def __len__(self):
+        return self.__header['rows']
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.__columns)
+
+    def __getitem__(self, name: str) -> np.memmap:
+        if name not in self.__maps:
+            column = self.__columns[name]
+            self.__maps[name] = np.memmap(self.path, dtype=column['dtype'], mode='r',
+                                          offset=self.__data_offset + column['offset'], shape=(len(self),))
+        return self.__maps[name]
+
+    def to_frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        :return: DataFrame over the memory mapped columns, nothing is read until it is used.
+        """
+        columns = columns if columns is not None else self.columns
+        return pd.DataFrame({name: self[name] for name in columns}, copy=False)
+
+    @classmethod
+    def __align(cls, offset):
+        return -(-offset // cls.ALIGNMENT) * cls.ALIGNMENT
+
+    @classmethod
+    def __prepare(cls, df: pd.DataFrame, date_format: str) -> dict:
+        columns = {}
+        for name in df.columns:
+            values = df[name]
+            if name == 'date':
+                if not pd.api.types.is_numeric_dtype(values):
+                    values = pd.to_datetime(values, format=date_format).astype('int64') // 10 ** 9
+                columns[name] = values.to_numpy(dtype=np.int64)
+            elif pd.api.types.is_numeric_dtype(values):
+                columns[name] = values.to_numpy(dtype=np.float64)
+        return columns
+
+    @classmethod
+    def __write(cls, path: str, rows: int, blocks: dict):
+        # blocks: column name -> (dtype, file with the column's raw bytes)
+        layout, offset = [], 0
+        for name, (dtype, _) in blocks.items():
+            layout.append({'name': name, 'dtype': np.dtype(dtype).str, 'offset': offset})
+            offset = cls.__align(offset + rows * np.dtype(dtype).itemsize)
+        header = json.dumps({'version': 1, 'rows': rows, 'columns': layout}).encode('utf-8')
+        data_offset = cls.__align(len(cls.MAGIC) + 8 + len(header))
+
+        with open(path, 'wb') as f:
+            f.write(cls.MAGIC)
+            f.write(np.array([len(header)], dtype='<u8').tobytes())
+            f.write(header)
+            for column, (_, source) in zip(layout, blocks.values()):
+                f.write(b'\0' * (data_offset + column['offset'] - f.tell()))
+                with open(source, 'rb') as block:
+                    shutil.copyfileobj(block, f, length=16 * 1024 * 1024)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, path: str, date_format: str = DATE_FORMAT) -> 'ColumnStore':
+        """
+        Write a DataFrame to a store. 'date' strings are parsed with `date_format`,
+        other non numeric columns are left out.
+        """
+        return cls.__from_frames([df], path, date_format)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, path: str, date_format: str = DATE_FORMAT,
+                 chunksize: int = 1_000_000) -> 'ColumnStore':
+        """
+        One time conversion of a CSV file to a store. The CSV is read in chunks so
+        files larger than memory can be converted.
+
+        :param csv_path: CSV with a 'date' column and OHLC columns.
+        :param path: Where to write the store.
+        :param date_format: Format of the CSV dates.
+        :param chunksize: Rows parsed at a time.
+        :return: The opened store.
+        """
+        return cls.__from_frames(pd.read_csv(csv_path, chunksize=chunksize), path, date_format)
+
+    @classmethod
+    def __from_frames(cls, frames, path: str, date_format: str) -> 'ColumnStore':
+        # each column is appended to its own scratch file, then the files are laid out one after another
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory:
+            blocks, files, rows = {}, {}, 0
+            try:
+                for frame in frames:
+                    for name, values in cls.__prepare(frame, date_format).items():
+                        if name not in files:
+                            blocks[name] = (values.dtype, os.path.join(directory, f'{len(files)}.bin'))
+                            files[name] = open(blocks[name][1], 'wb')
+                        values.tofile(files[name])
+                    rows += len(frame)
+            finally:
+                for f in files.values():
+                    f.close()
+
+            cls.__write(path, rows, blocks)
+        return cls(path)
@@ -1,10 +1,13 @@
 import pandas as pd
-from ml_backtest.machine_learning import DataProcessing
+from ml_backtest.machine_learning import DataProcessing, IndicatorSet, TradeTargets
+from ml_backtest.data import BarClock
+from ml_backtest.backtest.positions import PositionBook
 from datetime import datetime
 from typing import final
 from sklearn.base import BaseEstimator
 from typing import Optional, List
 import numpy as np
+import time
 
 
 class MachineLearningInterface:
@@ -22,6 +25,8 @@ class MachineLearningInterface:
             self.predictions = None
             self.get_rows = rows if rows is not None else 10
             self.get_columns = columns if columns is not None else ['close']
+            # hyperparameters set by `MachineLearning.search()`, passed on to the model in train()
+            self.params = {}
 
         else:
             print('Data being passed into MachineLearningWorker is not a list of type DataContainer.')
@@ -35,6 +40,31 @@ class MachineLearningInterface:
         """
         raise NotImplementedError("This method must be implemented by a subclass")
 
+    def indicators(self) -> dict:
+        """
+        Declare indicator features as {column name: indicator}, e.g. {'RSI': RSI('close', 14)}.
+        Return new indicators on every call, they carry rolling state. `add_indicators()`
+        computes them over `self.data` and `indicator_stream()` updates them bar by bar.
+
+        :return:
+        """
+        return {}
+
+    @final
+    def add_indicators(self):
+        """
+        Add the columns of every indicator declared in `indicators()` to `self.data`.
+        """
+        IndicatorSet(self.indicators()).add_to(self.data)
+
+    @final
+    def indicator_stream(self) -> IndicatorSet:
+        """
+        Fresh state of the declared indicators. Its `update(bar)` gives the features of the
+        next bar in O(1), the same values `add_indicators()` gives after the warm-up.
+        """
+        return IndicatorSet(self.indicators())
+
     def train(self, x_train, y_train, x_test, y_test):
         """
         Will be called after feature engineer.
@@ -72,6 +102,13 @@ class MachineLearningInterface:
 
 
 class TargetInterface:
+    # label of `TradeTargets` trained on, e.g. 'mfe' or 'r multiple'
+    target = 'target'
+    # optional (lower, upper) bounds the target is clipped to, either can be None
+    clip = None
+    # further labels added to the trades as columns
+    labels = ()
+
     def __init__(self, trades: pd.DataFrame, data: pd.DataFrame):
         self.trades = trades
         self.data = data
@@ -79,20 +116,58 @@ class TargetInterface:
     def target_engineer(self):
         """
         Will be called for defining the target values. If not defined
-        default target calculation (high - entry diff) will take
-        precedent.
+        the declared `target`, `clip` and `labels` are computed by
+        `add_targets()`.
+        """
+        self.add_targets()
+
+    @final
+    def add_targets(self):
+        """
+        Set the trades' 'target' column to the declared label and add the other declared
+        labels, computed with array operations over the bars of every trade.
         """
-        pass
+        targets = TradeTargets(self.trades, self.data)
+        columns = {name: targets.label(name) for name in self.labels}
+        columns['target'] = targets.label(self.target, clip=self.clip)
+        self.trades = self.trades.assign(**columns)
 
 
 class Strategy:
-    def __init__(self):
-        self.positions = []
+    # open positions allowed at once in total and per side, None for no limit on a side
+    max_positions = 1
+    max_long_positions = None
+    max_short_positions = None
+    # whether signals() also takes symbols x bars columns, see candidates()
+    panel_signals = False
+
+    def __init__(self, **params):
+        """
+        Keyword arguments override parameters the strategy declares as class
+        attributes, e.g. `Hammer(take_profit_points=40)` or `Hammer(max_positions=10)`.
+        """
+        for name, value in params.items():
+            if not hasattr(type(self), name):
+                raise TypeError(f"{type(self).__name__} has no parameter '{name}'")
+            setattr(self, name, value)
+
+        self.positions = PositionBook()
         self.in_position = False
         self.model = None
+        self.lows = None
+        self.highs = None
+        self.closes = None
+        self.opens = None
+        self.dates = None
         self.__columns = None
         self.__rows = None
         self.__df = None
+        self.__all_data = None
+        self.__column_indices = None
+        self.__predictions = None
+        self.__clock = None
+        self.__trading_mask = None
+        self.__profiler = None
         self.market_open_time = None
         self.market_close_time = None
         self.cs_patterns = False
@@ -106,9 +181,110 @@ class Strategy:
         """
         raise NotImplementedError("Method 'on_data()' must be defined in the subclass.")
 
+    def on_bar(self, index):
+        """This method will be called for each bar with only its index, the bars are
+        read from `self.lows`, `self.highs`, `self.closes`, `self.opens` and `self.dates`.
+        Override it instead of `on_data()` so the backtest does not slice the columns on
+        every bar. By default it calls `on_data()` with the bars up to `index`.
+        """
+        self.on_data(index, self.lows[:index + 1], self.highs[:index + 1], self.closes[:index + 1],
+                     self.opens[:index + 1], self.dates[:index + 1])
+
+    @final
+    def set_data(self, lows, highs, closes, opens, dates):
+        """
+        Called by the backtest once before `init()` with the full columns. The strategy
+        keeps read-only views of them, so it cannot change the bars it is tested on.
+        """
+        columns = []
+        for values in (lows, highs, closes, opens, dates):
+            values = np.asarray(values).view()
+            values.flags.writeable = False
+            columns.append(values)
+        self.lows, self.highs, self.closes, self.opens, self.dates = columns
+
+    def signals(self, lows, highs, closes, opens, dates) -> dict:
+        """This method will be called once with the full columns when the backtest
+        runs vectorized. Override it to return every candidate entry at once, built
+        with `entries()`. The backtest decides which candidates are actually taken.
+        """
+        raise NotImplementedError("Method 'signals()' must be defined in the subclass to run vectorized.")
+
+    @final
+    def candidates(self, mask: np.ndarray) -> np.ndarray:
+        """
+        Indices of the bars of `mask` within trading hours. A `PortfolioBacktest` gives a
+        strategy with `panel_signals` symbols x bars columns, their indices are then flat,
+        row * bars + bar, into the columns of `flatten()`.
+        """
+        index = np.flatnonzero(mask)
+        return index[self.in_trading_hours(index % np.shape(mask)[-1])]
+
+    @final
+    def flatten(self, lows, highs, closes, opens, dates) -> tuple:
+        """
+        The columns given to `signals()` as 1-D arrays the indices of `candidates()` point
+        into, with the dates repeated for every symbol of a panel.
+        """
+        shape = np.shape(closes)
+        return tuple(np.ravel(np.broadcast_to(values, shape)) for values in (lows, highs, closes, opens, dates))
+
+    @final
+    def entries(self, index, price, take_profit, stop_loss, side='long', metadata=None) -> dict:
+        """
+        Bundle candidate entries for the vectorized backtest.
+
+        :param index: Bar indices of the entries, or a boolean mask over the bars.
+        :param price: Entry price of each entry.
+        :param take_profit: Take profit price of each entry.
+        :param stop_loss: Stop loss price of each entry.
+        :param side: 'long', 'short' or an array of them, one per entry.
+        :param metadata: Optional dict of arrays, one value per entry, stored with each trade.
+        :return: dict of entry arrays.
+        """
+        index = np.asarray(index)
+        if index.dtype == bool:
+            index = np.flatnonzero(index)
+        index = index.astype(np.int64)
+        size = len(index)
+
+        side = np.broadcast_to(np.asarray(side), (size,))
+        if side.dtype.kind in 'US':
+            side = np.where(side == 'short', -1, 1)
+
+        signals = {
+            'index': index,
+            'side': side.astype(np.int8),
+            'entry price': np.broadcast_to(np.asarray(price, dtype=np.float64), (size,)),
+            'take profit': np.broadcast_to(np.asarray(take_profit, dtype=np.float64), (size,)),
+            'stop loss': np.broadcast_to(np.asarray(stop_loss, dtype=np.float64), (size,))
+        }
+        if metadata is not None:
+            signals['metadata'] = metadata
+        return signals
+
+    @final
+    def can_open(self, side: str = 'long') -> bool:
+        """
+        Whether another position on `side` fits within `max_positions` and the limit of the side.
+        """
+        side_limit = self.max_long_positions if side == 'long' else self.max_short_positions
+        if self.max_positions is not None and len(self.positions) >= self.max_positions:
+            return False
+        return side_limit is None or self.positions.count(side) < side_limit
+
+    @final
+    def holds_one_position(self) -> bool:
+        """
+        Whether the limits allow exactly one open position at a time, the only case the
+        vectorized and portfolio backtests resolve.
+        """
+        side_limits = (self.max_long_positions, self.max_short_positions)
+        return self.max_positions == 1 and all(limit is None or limit >= 1 for limit in side_limits)
+
     @final
     def buy(self, price, take_profit=None, stop_loss=None, entry_time=None, metadata=None):
-        if not self.in_position:  # Check if not already in a position
+        if self.can_open('long'):  # Check the position limits
             position = {
                 'type': 'long',
                 'entry price': price,
@@ -123,7 +299,7 @@ class Strategy:
 
     @final
     def sell(self, price, take_profit=None, stop_loss=None, entry_time=None, metadata=None):
-        if not self.in_position:  # Check if not already in a position
+        if self.can_open('short'):  # Check the position limits
             position = {
                 'type': 'short',
                 'entry price': price,
@@ -137,29 +313,81 @@ class Strategy:
             self.in_position = True
 
     @final
-    def set_ml(self, model: Optional[BaseEstimator] = None, columns=None, rows=None, df=None, cs_pattern=False):
+    def set_ml(self, model: Optional[BaseEstimator] = None, columns=None, rows=None, df=None, cs_pattern=False,
+               profiler=None):
         self.model = model
+        self.__profiler = profiler
         self.__columns = columns
         self.__rows = rows
         self.__df = df
         self.cs_patterns = cs_pattern
+        self.__all_data = None
+        self.__column_indices = None
+        self.__predictions = None
+
+    @final
+    def set_clock(self, clock: BarClock, trading_mask: Optional[np.ndarray] = None):
+        """
+        Called by the backtest with the dates of every bar parsed once, see `in_trading_hours()`.
+
+        :param trading_mask: Optional `in_trading_hours()` of every bar computed already, else it is
+            built from the clock when first needed.
+        """
+        self.__clock = clock
+        self.__trading_mask = trading_mask
+        self.__all_data = None
+
+    @final
+    def set_ml_data(self, all_data: np.ndarray):
+        """
+        Give the model's input as an array, 'date' as Unix timestamps followed by the model's
+        columns, instead of converting the data-frame of `set_ml()`. A `LiveRunner` passes a view
+        of its latest bars after every `set_clock()`, so no bar is converted twice.
+        """
+        self.__all_data = all_data
+        if self.__column_indices is None or len(self.__column_indices) != all_data.shape[1] - 1:
+            self.__column_indices = list(range(1, all_data.shape[1]))
+
+    def __ml_data(self):
+        # Convert the frame once per backtest instead of once per prediction,
+        # 'date' as Unix timestamps first and then only the selected columns
+        if self.__all_data is None:
+            if self.__clock is not None:
+                dates = self.__clock.epochs
+            else:
+                dates = BarClock.to_epochs(self.__df['date'].values)
+            self.__all_data = np.column_stack([dates, self.__df[self.__columns].to_numpy(dtype=np.float64)])
+            self.__column_indices = list(range(1, len(self.__columns) + 1))
+        return self.__all_data, self.__column_indices
 
     @final
     def predict(self, current_entry_time: int, cs_features: np.ndarray = None):
         # Ensure that all necessary parameters are set
-        if self.model is None or self.__columns is None or self.__rows is None or self.__df is None:
+        if self.model is None or self.__columns is None or self.__rows is None or \
+                (self.__df is None and self.__all_data is None):
             raise ValueError("Model, columns, rows, or DataFrame not set")
 
+        # Use the batched prediction if this entry was already predicted by `predict_entries()`
+        if self.__predictions is not None and current_entry_time in self.__predictions:
+            return self.__predictions[current_entry_time]
+
+        if self.__profiler is not None:
+            self.__profiler.count('predictions')
+            with self.__profiler.timer('strategy.predict'):
+                return self.__predict(current_entry_time, cs_features)
+        return self.__predict(current_entry_time, cs_features)
+
+    def __predict(self, current_entry_time, cs_features):
         # Prepare the data
-        column_indices = [self.__df.columns.get_loc(c) for c in self.__columns]
-        # Convert the single entry time into an array for compatibility
-        entry_times = np.array([current_entry_time])
+        all_data, column_indices = self.__ml_data()
+        # Convert the single entry time into an array of Unix timestamps for compatibility
+        entry_times = BarClock.to_epochs([current_entry_time])
         # Call the static method from DataProcessing class
         if cs_features is not None:
-            processed_data = DataProcessing.process_entries(self.__df.to_numpy(), entry_times, self.__rows,
+            processed_data = DataProcessing.process_entries(all_data, entry_times, self.__rows,
                                                             column_indices, candlestick_features=cs_features)
         else:
-            processed_data = DataProcessing.process_entries(self.__df.to_numpy(), entry_times, self.__rows,
+            processed_data = DataProcessing.process_entries(all_data, entry_times, self.__rows,
                                                             column_indices)
         # Reshape the processed data if necessary to match the input shape expected by the model
         prediction = self.model.predict(processed_data)
@@ -172,12 +400,49 @@ class Strategy:
         return value_as_float
 
     @final
-    def trading_hours(self, date: str) -> bool:
+    def predict_entries(self, entry_times: np.ndarray, cs_features: np.ndarray = None,
+                        batch_size: int = 4096) -> np.ndarray:
+        """
+        Predict every candidate entry of `signals()` with one model call per batch. The
+        predictions are kept so that `predict()` can look them up by entry time.
+
+        :param entry_times: Entry times of the candidates.
+        :param cs_features: Optional candlestick features, one row per candidate.
+        :param batch_size: Number of candidates whose feature windows are built and predicted at once.
+        :return: One prediction per entry time.
+        """
+        if self.model is None or self.__columns is None or self.__rows is None or \
+                (self.__df is None and self.__all_data is None):
+            raise ValueError("Model, columns, rows, or DataFrame not set")
+
+        start = time.perf_counter()
+        all_data, column_indices = self.__ml_data()
+        entry_times = BarClock.to_epochs(entry_times)
+        predictions = np.empty(len(entry_times), dtype=np.float64)
+
+        for first in range(0, len(entry_times), batch_size):
+            stop = first + batch_size
+            batch_features = cs_features[first:stop] if cs_features is not None else None
+            processed_data = DataProcessing.process_entries(all_data, entry_times[first:stop], self.__rows,
+                                                            column_indices, candlestick_features=batch_features)
+            predictions[first:stop] = self.model.predict(processed_data)
+
+        if self.__profiler is not None:
+            self.__profiler.count('predictions', len(entry_times))
+            self.__profiler.add_time('strategy.predict', time.perf_counter() - start)
+
+        if self.__predictions is None:
+            self.__predictions = {}
+        self.__predictions.update(zip(entry_times, predictions.tolist()))
+        return predictions
 
-        if isinstance(date, np.int64):  # Checking for Unix timestamp (ml backtest)
+    @final
+    def trading_hours(self, date) -> bool:
+
+        if isinstance(date, (int, np.integer)):  # Checking for Unix timestamp
             dt_object = datetime.utcfromtimestamp(date)
             current_time = dt_object.time()
-        elif isinstance(date, str):  # Checking for str object (normal backtest)
+        elif isinstance(date, str):  # Checking for str object
             current_datetime = datetime.strptime(date, "%m/%d/%Y %I:%M:%S %p")
             current_time = current_datetime.time()
         else:  # If date is neither return false
@@ -185,3 +450,26 @@ class Strategy:
 
         # check if the converted time falls between user inputted open and close time
         return self.market_open_time <= current_time <= self.market_close_time
+
+    @final
+    def in_trading_hours(self, index):
+        """
+        Whether the bar at `index` is within market_open_time and market_close_time.
+        The mask of every bar is built once from the backtest's precomputed times of day,
+        so this is a lookup. `index` may also be an array of bar indices.
+        """
+        if self.__clock is None:
+            raise ValueError("Bar dates not set, the backtest sets them with set_clock()")
+        if self.__trading_mask is None:
+            self.__trading_mask = self.__clock.between(self.market_open_time, self.market_close_time)
+        return self.__trading_mask[index]
+
+    @final
+    def trading_hours_mask(self, dates: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `trading_hours()`, returns a boolean mask with one entry per date.
+        """
+        dates = np.asarray(dates)
+        if dates.dtype.kind not in 'iuMOU':
+            return np.zeros(dates.shape, dtype=bool)
+        return BarClock(dates).between(self.market_open_time, self.market_close_time)
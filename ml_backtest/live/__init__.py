@@ -0,0 +1,2 @@
+from .runner import LiveRunner, RingBuffer
+from .feed import ReplayFeed
@@ -0,0 +1,51 @@
+from ml_backtest.data import ColumnStore, BarClock
+from typing import Optional, Union
+import pandas as pd
+import asyncio
+import time
+
+
+class ReplayFeed:
+    def __init__(self, data: Union[pd.DataFrame, ColumnStore], rate: Optional[float] = None, repeat: int = 1):
+        """
+        Async iterator streaming stored bars like a live feed, to run and load test a
+        `LiveRunner` without a broker. Bars are dicts with 'date' as an int64 Unix
+        timestamp and 'open', 'high', 'low' and 'close'.
+
+        :param data: Bars to replay.
+        :param rate: Bars per second, None streams them as fast as they are consumed.
+        :param repeat: Times to replay the data, each pass shifts the dates past the previous one.
+        """
+        if isinstance(data, ColumnStore):
+            data = data.to_frame()
+        self.__dates = BarClock.to_epochs(data['date'].values)
+        self.__columns = {name: data[name].to_numpy() for name in ['open', 'high', 'low', 'close']}
+        self.rate = rate
+        self.repeat = repeat
+
+    def __len__(self):
+        return len(self.__dates) * self.repeat
+
+    async def __aiter__(self):
+        dates, columns = self.__dates, self.__columns
+        length = len(dates)
+        span = int(dates[-1] - dates[0]) + (int(dates[1] - dates[0]) if length > 1 else 1)
+        start = time.perf_counter()
+        sent = 0
+
+        for shift in range(self.repeat):
+            for index in range(length):
+                if self.rate is not None:
+                    # pace against the start so sleeping late does not slow the whole replay
+                    delay = start + sent / self.rate - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                yield {'date': int(dates[index]) + shift * span,
+                       'open': float(columns['open'][index]),
+                       'high': float(columns['high'][index]),
+                       'low': float(columns['low'][index]),
+                       'close': float(columns['close'][index])}
+                sent += 1
+                if self.rate is None and sent % 1024 == 0:
+                    # let the rest of the event loop run during a fast replay
+                    await asyncio.sleep(0)
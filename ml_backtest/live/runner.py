@@ -0,0 +1,244 @@
+from ml_backtest.interfaces import Strategy
+from ml_backtest.data import BarClock
+from ml_backtest.machine_learning import IndicatorSet
+from concurrent.futures import ThreadPoolExecutor, Executor
+from collections import deque
+from sklearn.base import BaseEstimator
+from typing import AsyncIterable, Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import asyncio
+import time
+
+
+class RingBuffer:
+    """
+    The last `capacity` bars of some columns. Every value is written twice, at `i` and
+    `i + capacity`, so the newest bars are always one contiguous slice and reading them
+    never copies. Memory is fixed however many bars are appended.
+    """
+
+    def __init__(self, capacity: int, columns: List[str], dtypes: Optional[Dict[str, type]] = None,
+                 tables: Optional[Dict[str, List[str]]] = None):
+        """
+        :param dtypes: Column to its dtype, float64 by default and int64 for 'date'.
+        :param tables: Name to columns also kept together as one float64 array, a row per bar.
+        """
+        dtypes = dtypes or {}
+        self.capacity = capacity
+        self.__arrays = {name: np.zeros(2 * capacity, dtype=dtypes.get(name, np.int64 if name == 'date'
+                                                                       else np.float64))
+                         for name in columns}
+        self.__tables = {name: (table_columns, np.zeros((2 * capacity, len(table_columns))))
+                         for name, table_columns in (tables or {}).items()}
+        self.__count = 0
+
+    def __len__(self):
+        return min(self.__count, self.capacity)
+
+    def append(self, bar: dict):
+        slot = self.__count % self.capacity
+        for name, values in self.__arrays.items():
+            values[slot] = values[slot + self.capacity] = bar[name]
+        for table_columns, values in self.__tables.values():
+            values[slot] = values[slot + self.capacity] = [bar[name] for name in table_columns]
+        self.__count += 1
+
+    def view(self) -> dict:
+        """
+        :return: Column, or table, to a view of its bars in the buffer, oldest first.
+        """
+        end = (self.__count - 1) % self.capacity + self.capacity + 1
+        start = end - len(self)
+        window = {name: values[start:end] for name, values in self.__arrays.items()}
+        window.update({name: values[start:end] for name, (_, values) in self.__tables.items()})
+        return window
+
+
+class LiveRunner:
+    def __init__(self, strategy: Strategy, history: int = 1024, model: Optional[BaseEstimator] = None,
+                 columns: Optional[List[str]] = None, rows: Optional[int] = None, cs_pattern: bool = False,
+                 indicators: Optional[IndicatorSet] = None, executor: Optional[Executor] = None,
+                 on_trade: Optional[Callable[[dict], None]] = None, queue_size: int = 1024,
+                 latency_window: int = 100000):
+        """
+        Run a strategy forward on bars from an async feed, for paper or live trading. The
+        strategy sees the last `history` bars through the same `on_bar()` it is backtested
+        with, indices are positions in that window. Exits are checked like in the backtest.
+
+        :param history: Bars kept for the strategy and the model, older bars are dropped.
+        :param model: Trained model, used with `columns`, `rows` and `cs_pattern` like in `Backtest`.
+        :param indicators: Optional `indicator_stream()` of the trainer, updated every bar so the
+            model's indicator columns are available.
+        :param executor: Where each bar's decision (the strategy and model inference) runs, off the
+            event loop. Defaults to a single worker thread.
+        :param on_trade: Called with every closed position.
+        :param queue_size: Bars read ahead from the feed while a decision runs.
+        :param latency_window: Latest per bar latencies kept for `get_latency()`.
+        """
+        if model is not None and rows is not None and history <= rows:
+            raise ValueError(f"history ({history}) must be longer than the model's rows ({rows})")
+        self.__strategy = strategy
+        self.__model = model
+        self.__columns = columns
+        self.__rows = rows
+        self.__cs_pattern = cs_pattern
+        self.__indicators = indicators
+        self.__executor = executor
+        self.__on_trade = on_trade
+        self.__queue_size = queue_size
+
+        # the clock's columns are kept with the bars, so no bar's date is parsed twice
+        buffer_columns = ['date', 'open', 'high', 'low', 'close', 'second of day', 'minute of day', 'session id',
+                          'in trading hours']
+        if indicators is not None:
+            buffer_columns += [name for name in indicators.columns if name not in buffer_columns]
+        dtypes = {'second of day': np.int32, 'minute of day': np.int16, 'session id': np.int32,
+                  'in trading hours': bool}
+        # the model's input is kept as the array the strategy predicts from, 'date' first
+        tables = {'model': ['date'] + list(columns)} if model is not None else None
+        self.__buffer = RingBuffer(history, buffer_columns, dtypes=dtypes, tables=tables)
+        self.__trading_seconds = None
+        self.__day = None
+        self.__session = -1
+        self.__latencies = np.zeros(latency_window)
+        self.__trades = deque(maxlen=history)
+        self.__bars = 0
+        self.__trade_counter = 0
+        self.__wins = 0
+        self.__loses = 0
+        self.__net_profit = 0.0
+
+    async def run(self, feed: AsyncIterable[dict]):
+        """
+        Consume the feed until it ends. Bars are read into a bounded queue while the previous
+        bar's decision runs in the executor, decisions run one at a time in bar order. If the
+        feed raises, the bars read before it are decided and its error is raised again.
+
+        :param feed: Async iterable of bar dicts with 'date', 'open', 'high', 'low' and 'close'.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self.__executor if self.__executor is not None else ThreadPoolExecutor(max_workers=1)
+        queue = asyncio.Queue(maxsize=self.__queue_size)
+
+        async def read():
+            try:
+                async for bar in feed:
+                    await queue.put(bar)
+            finally:
+                await queue.put(None)
+
+        strategy = self.__strategy
+        strategy.set_data(*(np.empty(0) for _ in range(4)), np.empty(0, dtype=np.int64))
+        strategy.init()
+        if self.__model is not None:
+            strategy.set_ml(model=self.__model, columns=self.__columns, rows=self.__rows,
+                            cs_pattern=self.__cs_pattern)
+        # trading hours of every bar are decided as it arrives, with the times set by init()
+        if strategy.market_open_time is not None and strategy.market_close_time is not None:
+            self.__trading_seconds = (BarClock.seconds(strategy.market_open_time),
+                                      BarClock.seconds(strategy.market_close_time))
+        reader = loop.create_task(read())
+        try:
+            while True:
+                bar = await queue.get()
+                if bar is None:
+                    break
+                start = time.perf_counter()
+                await loop.run_in_executor(executor, self.__step, bar)
+                self.__latencies[(self.__bars - 1) % len(self.__latencies)] = time.perf_counter() - start
+        finally:
+            reader.cancel()
+            if self.__executor is None:
+                executor.shutdown(wait=False)
+        await asyncio.gather(reader, return_exceptions=True)
+        # the reader ends the queue when the feed fails too, its error must not pass for the end of the feed
+        if not reader.cancelled() and reader.exception() is not None:
+            raise reader.exception()
+
+    def __step(self, bar):
+        if not isinstance(bar['date'], (int, np.integer)):
+            bar = dict(bar, date=int(BarClock.to_epochs([bar['date']])[0]))
+        if self.__indicators is not None:
+            bar = dict(bar, **self.__indicators.update(bar))
+        bar = dict(bar, **self.__time_of_day(bar['date']))
+        self.__buffer.append(bar)
+        window = self.__buffer.view()
+        index = len(self.__buffer) - 1
+        first_bar = self.__bars - index
+
+        strategy = self.__strategy
+        strategy.set_data(window['low'], window['high'], window['close'], window['open'], window['date'])
+        clock = BarClock.from_columns(window['date'], window['second of day'], window['minute of day'],
+                                      window['session id'])
+        strategy.set_clock(clock, window['in trading hours'] if self.__trading_seconds is not None else None)
+        if self.__model is not None:
+            strategy.set_ml_data(window['model'])
+        strategy.on_bar(index)
+
+        # positions are tagged with the bar's number since the start of the run
+        book = strategy.positions
+        if book:
+            book.open_new(self.__bars)
+            for position, exit_price in book.exits(bar['low'], bar['high']):
+                # trades older than the history only see the highs still in it
+                position['highest high'] = window['high'][max(position['entry index'] - first_bar, 0):].max()
+                position['target'] = position['highest high'] - position['entry price']
+                position['exit price'] = exit_price
+                position['exit time'] = bar['date']
+                position['exit index'] = self.__bars
+                self.__record_trade(position, exit_price)
+            strategy.in_position = bool(book)
+        self.__bars += 1
+
+    def __time_of_day(self, date):
+        # BarClock's columns of one bar, sessions are numbered from the start of the run
+        day = date // 86400
+        if day != self.__day:
+            self.__day = day
+            self.__session += 1
+        second = date % 86400
+        in_trading_hours = (self.__trading_seconds is not None and
+                            self.__trading_seconds[0] <= second <= self.__trading_seconds[1])
+        return {'second of day': second, 'minute of day': second // 60, 'session id': self.__session,
+                'in trading hours': in_trading_hours}
+
+    def __record_trade(self, position, exit_price):
+        if position['type'] == 'long':
+            pnl = exit_price - position['entry price']
+        else:
+            pnl = position['entry price'] - exit_price
+        position['pnl'] = pnl
+        self.__trade_counter += 1
+        self.__wins += pnl > 0
+        self.__loses += pnl < 0
+        self.__net_profit += pnl
+        self.__trades.append(position)
+        if self.__on_trade is not None:
+            self.__on_trade(position)
+
+    def get_latency(self) -> dict:
+        """
+        :return: Seconds from the runner taking a bar to its decision being made, including the
+            hand-off to the executor, as 'p50', 'p99' and 'max' over the latest bars with the
+            number of 'bars' they cover. Time bars wait in the queue is not included.
+        """
+        latencies = self.__latencies[:min(self.__bars, len(self.__latencies))]
+        if not len(latencies):
+            return {'bars': 0, 'p50': np.nan, 'p99': np.nan, 'max': np.nan}
+        p50, p99 = np.percentile(latencies, [50, 99])
+        return {'bars': len(latencies), 'p50': p50, 'p99': p99, 'max': latencies.max()}
+
+    def get_results(self) -> dict:
+        return {'bars': self.__bars,
+                '# of trades': self.__trade_counter,
+                '# of wins': self.__wins,
+                '# of loses': self.__loses,
+                'net profit': round(self.__net_profit, 2),
+                'open positions': len(self.__strategy.positions)}
+
+    def get_trades(self) -> pd.DataFrame:
+        """
+        :return: The latest closed trades, at most `history` of them.
+        """
+        return pd.DataFrame(list(self.__trades))
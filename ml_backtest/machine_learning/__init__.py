@@ -1 +1,6 @@
 from .data import CandleStickDataProcessing, DataProcessing
+from .validation import WalkForward, PurgedKFold
+from .cache import FeatureCache
+from .registry import ModelRegistry
+from .indicators import Indicator, IndicatorSet, SMA, EMA, RSI, MACD, Diff
+from .targets import TradeTargets
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+import hashlib
+import inspect
+import tempfile
+import shutil
+import json
+import time
+import os
+from typing import Optional, Dict
+
+
+class FeatureCache:
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 2 * 1024 ** 3):
+        """
+        On-disk cache of engineered feature columns and training matrices. Entries are
+        addressed by a fingerprint of everything they were computed from, stored as `.npy`
+        files and loaded memory mapped. When the cache grows over `max_bytes` the least
+        recently used entries are removed.
+
+        :param directory: Where to keep the entries, defaults to ~/.cache/ml_backtest/features.
+        :param max_bytes: Size cap of the cache.
+        """
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.cache', 'ml_backtest', 'features')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def fingerprint(*parts) -> str:
+        """
+        Hash of data frames, arrays, classes, functions and plain values. Classes and
+        functions are hashed by name and source code, so editing them changes the key.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            if isinstance(part, pd.DataFrame):
+                for name in part.columns:
+                    digest.update(str(name).encode('utf-8'))
+                    FeatureCache.__update_values(digest, part[name])
+            elif isinstance(part, (np.ndarray, pd.Series)):
+                FeatureCache.__update_values(digest, part)
+            elif inspect.isclass(part) or inspect.isfunction(part) or inspect.ismethod(part):
+                digest.update(f'{part.__module__}.{part.__qualname__}'.encode('utf-8'))
+                try:
+                    digest.update(inspect.getsource(part).encode('utf-8'))
+                except (OSError, TypeError):
+                    pass  # no source available, e.g. defined in an interactive session
+            else:
+                digest.update(repr(part).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    @staticmethod
+    def __update_values(digest, values):
+        series = values if isinstance(values, pd.Series) else pd.Series(values)
+        digest.update(str(series.dtype).encode('utf-8'))
+        if series.dtype.kind in 'iufb':
+            digest.update(np.ascontiguousarray(series.to_numpy()).view(np.uint8))
+        else:
+            digest.update(pd.util.hash_pandas_object(series, index=False).to_numpy().view(np.uint8))
+
+    def __path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        :return: The arrays stored under `key` memory mapped copy-on-write, or None on a miss.
+            Changing them never changes the files.
+        """
+        path = self.__path(key)
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        self.__touch(key)
+        return {name: np.load(os.path.join(path, file), mmap_mode='c') for name, file in meta['arrays'].items()}
+
+    def store(self, key: str, arrays: Dict[str, np.ndarray]):
+        """
+        Store arrays under `key`, then evict least recently used entries over the size cap.
+        """
+        scratch = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            files = {}
+            for i, (name, values) in enumerate(arrays.items()):
+                files[name] = f'{i}.npy'
+                np.save(os.path.join(scratch, files[name]), np.asarray(values))
+            with open(os.path.join(scratch, 'meta.json'), 'w') as f:
+                json.dump({'arrays': files}, f)
+            # the entry appears complete or not at all, another process may have stored it first
+            os.rename(scratch, self.__path(key))
+            self.__touch(key)
+        except OSError:
+            if os.path.isdir(self.__path(key)):
+                return
+            raise
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        self.__evict(keep=key)
+
+    def __touch(self, key):
+        # the meta file's modification time is the entry's last use, set explicitly because
+        # the file system's own timestamps are too coarse to order quick successive uses
+        now = time.time_ns()
+        os.utime(os.path.join(self.__path(key), 'meta.json'), ns=(now, now))
+
+    def __entries(self):
+        entries = []
+        for key in os.listdir(self.directory):
+            meta = os.path.join(self.__path(key), 'meta.json')
+            if key.startswith('.') or not os.path.exists(meta):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(self.__path(key)))
+            entries.append((os.path.getmtime(meta), key, size))
+        return sorted(entries)
+
+    def __evict(self, keep):
+        entries = self.__entries()
+        total = sum(size for _, _, size in entries)
+        for _, key, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key != keep:
+                shutil.rmtree(self.__path(key), ignore_errors=True)
+                total -= size
+
+    @property
+    def size(self) -> int:
+        """
+        :return: Bytes used by the cache.
+        """
+        return sum(size for _, _, size in self.__entries())
+
+    def clear(self):
+        for _, key, _ in self.__entries():
+            shutil.rmtree(self.__path(key), ignore_errors=True)
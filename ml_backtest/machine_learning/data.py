@@ -1,12 +1,22 @@
 import numpy as np
 import pandas as pd
+import inspect
+import functools
+from numpy.lib.stride_tricks import sliding_window_view
+from ml_backtest.data.clock import BarClock
 
 
 class DataProcessing:
-    def __init__(self, df, results, rows, columns, target=None):
+    # entries whose windows are gathered at once by process_entries
+    GATHER_BLOCK = 4096
+
+    def __init__(self, df, results, rows, columns, target=None, compact=False):
         """
         Initialize the class with the dataframe, results, and other parameters.
         Data alteration will happen in the `__prep_data` function.
+
+        :param compact: Keep the selected columns and the features as float32, with the
+            dates in their own int64 array, halving the memory of the training matrix.
         """
         self.__df = df
         self.__results = results
@@ -14,112 +24,282 @@ class DataProcessing:
         self.__columns = columns
         self.__candlestick_features = None
         self.__target = target
+        self.__dtype = np.float32 if compact else np.float64
 
         # Initialize placeholders for transformed data
         self.__all_data = None
+        self.__dates = None
         self.__entry_times = None
         self.__columns_indices = None
 
     def __prep_data(self):
         """
         Prepare data by converting dates to Unix timestamps and processing as required.
+        Neither the data frame nor the trades are changed.
         """
-        # Convert 'date' in df and 'entry time' in results to Unix timestamp
-        self.__df['date'] = pd.to_datetime(self.__df['date'], format='%m/%d/%Y %I:%M:%S %p').astype('int64') // 10 ** 9
-        self.__results['entry time'] = pd.to_datetime(self.__results['entry time'],
-                                                      format='%m/%d/%Y %I:%M:%S %p').astype(
-            'int64') // 10 ** 9
+        # Unix timestamps of the bars and of the trade entries, parsed once
+        dates = BarClock.to_epochs(self.__df['date'].values)
+        entry_times_np = BarClock.to_epochs(self.__results['entry time'].values)
 
-        df_np = self.__df.to_numpy()  # Including 'date' as Unix timestamps
+        if self.__dtype == np.float64:
+            # 'date' as the first column, followed by only the selected columns
+            df_np = np.column_stack([dates, self.__df[self.__columns].to_numpy(dtype=np.float64)])
+            column_indices = list(range(1, len(self.__columns) + 1))
+        else:
+            # float32 cannot hold Unix timestamps to the second, the dates stay int64 on their own
+            df_np = self.__df[self.__columns].to_numpy(dtype=self.__dtype)
+            column_indices = list(range(len(self.__columns)))
 
-        # Convert 'entry time' & 'high - entry diff' to numpy array
-        entry_times_np = self.__results['entry time'].values
+        # Convert 'high - entry diff' to numpy array
         high_np = self.__results['target'].values
 
-        # Adjust column indices to include 'date' column
-        # Subtracting 1 to adjust for 0-based indexing in numpy
-        # column_indices = [self.__df.columns.get_loc(c) - 1 for c in self.__columns]
-        column_indices = [self.__df.columns.get_loc(c) for c in self.__columns]
-
         # Store processed data
         self.__target = high_np
         self.__all_data = df_np
+        self.__dates = dates
         self.__entry_times = entry_times_np
         self.__columns_indices = column_indices
 
     @staticmethod
-    def process_entries(all_data, entry_times, rows, columns_indices, candlestick_features=None) -> np.ndarray:
+    def to_unix(dates: pd.Series) -> pd.Series:
+        """
+        Convert '%m/%d/%Y %I:%M:%S %p' dates to Unix timestamps. Dates that are
+        already numbers are taken as Unix timestamps and returned as they are.
+        """
+        if pd.api.types.is_numeric_dtype(dates):
+            return dates
+        return pd.Series(BarClock.to_epochs(dates.values), index=dates.index, name=dates.name)
+
+    @staticmethod
+    def process_entries(all_data, entry_times, rows, columns_indices, candlestick_features=None,
+                        dates=None) -> np.ndarray:
         """
         Static method to process data entries, making it reusable for different data sources.
+        The 'date' column (first column of `all_data`) has to be sorted, the last row at or
+        before each entry time is found with a binary search.
 
-        :param candlestick_features:
+        :param candlestick_features: Optional candlestick features, one row per entry time.
         :param all_data: Numpy array of all data, including 'date' as Unix timestamps.
         :param entry_times: Numpy array of entry times.
         :param rows: Number of rows to include before each entry time.
         :param columns_indices: Indices of the columns to include in the output.
-        :return: Processed data as a numpy array.
+        :param dates: Optional sorted Unix timestamps of the rows, when `all_data` has no 'date' column.
+        :return: Processed data as a numpy array, one row per entry. Entries with fewer than `rows`
+            rows before them, or past the last candlestick features row, get shorter rows, which
+            only fit when every row is as short.
         """
-        output_data = []
-        for i, entry_time in enumerate(entry_times):
-            indices = np.where(all_data[:, 0] <= entry_time)[0]
-            if indices.size > 0:
-                matching_index = indices[-1]
-            else:
-                continue
+        entry_times = np.asarray(entry_times)
+        dates = all_data[:, 0] if dates is None else dates
+        matching_indices = np.searchsorted(dates, entry_times, side='right') - 1
+        # entries before the first timestamp have no data and are skipped
+        kept = np.flatnonzero(matching_indices >= 0)
+        matching_indices = matching_indices[kept]
+
+        # entries with fewer than `rows` bars before them, or without a candlestick features row,
+        # get shorter rows and are built one by one, the rest with strided windows
+        short = matching_indices < rows - 1
+        if candlestick_features is not None:
+            candlestick_features = np.asarray(candlestick_features)
+            short |= kept >= len(candlestick_features)
+        full = np.flatnonzero(~short)
+        output_data = DataProcessing.__strided_rows(all_data, matching_indices[full], rows, columns_indices,
+                                                    None if candlestick_features is None
+                                                    else candlestick_features[kept[full]])
+        if not short.any():
+            return output_data
 
-            start_index = max(0, matching_index - rows + 1)
-            before_data = all_data[start_index:matching_index + 1, columns_indices]
-            single_row = before_data.flatten()
+        short = np.flatnonzero(short)
+        short_rows = []
+        for k in short:
+            matching_index = matching_indices[k]
+            single_row = all_data[max(0, matching_index - rows + 1):matching_index + 1, columns_indices].ravel()
+            if candlestick_features is not None and kept[k] < len(candlestick_features):
+                single_row = np.concatenate([single_row, candlestick_features[kept[k]]])
+            short_rows.append(single_row)
 
-            # Append candlestick features if available
-            if candlestick_features is not None and i < len(candlestick_features):
-                single_row = np.concatenate([single_row, candlestick_features[i]])
+        widths = {len(row) for row in short_rows} | ({output_data.shape[1]} if len(full) else set())
+        if len(widths) == 1:
+            rows_data = np.empty((len(kept), widths.pop()), dtype=np.result_type(output_data, *short_rows))
+            if len(full):
+                rows_data[full] = output_data
+            rows_data[short] = short_rows
+            return rows_data
+        raise ValueError(f"{len(short)} of {len(kept)} entries have fewer than {rows} rows before them or no "
+                         f"candlestick features, their rows are shorter than the others'")
 
-            output_data.append(single_row)
+    @staticmethod
+    def __strided_rows(all_data, matching_indices, rows, columns_indices, candlestick_features):
+        window_width = rows * len(columns_indices)
+        width = window_width
+        dtype = all_data.dtype
+        if candlestick_features is not None:
+            width += candlestick_features.shape[1]
+            dtype = np.result_type(dtype, candlestick_features.dtype)
+
+        output_data = np.empty((len(matching_indices), width), dtype=dtype)
+        if len(matching_indices) == 0:
+            return output_data
+
+        # only the selected columns of the bars that end up in a window are gathered
+        first_index = matching_indices.min() - rows + 1
+        last_index = matching_indices.max() + 1
+        selected = all_data[first_index:last_index, columns_indices]
+
+        windows = sliding_window_view(selected, rows, axis=0).transpose(0, 2, 1)
 
-        return np.array(output_data)
+        # write the windows into their rows of the output a block of entries at a time, gathering
+        # all of them at once would first copy the overlapping windows, rows times the bars
+        output_windows = output_data[:, :window_width].reshape(len(matching_indices), rows, len(columns_indices))
+        starts = matching_indices - rows + 1 - first_index
+        for block in range(0, len(matching_indices), DataProcessing.GATHER_BLOCK):
+            stop = block + DataProcessing.GATHER_BLOCK
+            output_windows[block:stop] = windows[starts[block:stop]]
+
+        # Append candlestick features if available
+        if candlestick_features is not None:
+            output_data[:, window_width:] = candlestick_features
+
+        return output_data
 
     def get_before(self) -> np.ndarray:
         """
         Adapts the original get_before method to use the refactored static method for processing.
         """
         self.__prep_data()
-        return self.process_entries(self.__all_data, self.__entry_times,
-                                    self.__rows, self.__columns_indices, self.__candlestick_features)
+        candlestick_features = self.__candlestick_features
+        if candlestick_features is not None:
+            candlestick_features = np.asarray(candlestick_features, dtype=self.__dtype)
+        return self.process_entries(self.__all_data, self.__entry_times, self.__rows, self.__columns_indices,
+                                    candlestick_features, dates=self.__dates)
+
+    def get_trade_bars(self):
+        """
+        Bar index of the entry and the exit of every trade. Trades without an
+        exit time are taken to exit on their entry bar. Call after `get_before()`.
+
+        :return: Tuple of entry and exit bar index arrays.
+        """
+        dates = self.__dates
+        entry_bars = np.searchsorted(dates, self.__entry_times, side='right') - 1
+        if 'exit time' in self.__results:
+            exit_times = BarClock.to_epochs(self.__results['exit time'].values)
+            exit_bars = np.searchsorted(dates, exit_times, side='right') - 1
+        else:
+            exit_bars = entry_bars
+        return entry_bars, exit_bars
 
     def add_pattern_features(self, dp_pattern):
-        features_list = self.__results['metadata'].apply(
-            lambda metadata: dp_pattern(**metadata)
-        )
+        """
+        Candlestick features of every trade with one call of `dp_pattern` over arrays, from the
+        trades' metadata. Trades without metadata, e.g. from strategies that do not pass any to
+        `buy()`/`sell()`, are read from the bars at their 'entry index'.
+        """
+        if 'metadata' in self.__results:
+            features_list = self.__results['metadata'].apply(
+                lambda metadata: dp_pattern(**metadata)
+            )
+            # Since each item is already a numpy array, we use np.vstack to stack them vertically
+            self.__candlestick_features = np.vstack(features_list.values)
+            return
 
-        # Since each item is already a numpy array, we use np.vstack to stack them vertically
-        self.__candlestick_features = np.vstack(features_list.values)
+        # trades from the backtest ledger keep each metadata key in a 'metadata.<key>' column
+        prefix = 'metadata.'
+        metadata = {c[len(prefix):]: self.__results[c].to_numpy() for c in self.__results.columns
+                    if c.startswith(prefix)}
+        if not metadata and self.__entries_align():
+            index = self.__results['entry index'].to_numpy()
+            self.__candlestick_features = CandleStickDataProcessing.batch_features(
+                dp_pattern, index, self.__df['open'].values, self.__df['high'].values,
+                self.__df['low'].values, self.__df['close'].values)
+            return
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features = np.asarray(dp_pattern(**metadata), dtype=np.float64)
+        self.__candlestick_features = features.T
+
+    def __entries_align(self) -> bool:
+        # the entry indices are only used when they point at the trades' entry bars in this data
+        if 'entry index' not in self.__results or not len(self.__results):
+            return False
+        index = self.__results['entry index'].to_numpy()
+        if index.min() < 0 or index.max() >= len(self.__df):
+            return False
+        bar_times = BarClock.to_epochs(self.__df['date'].values[index])
+        return np.array_equal(bar_times, BarClock.to_epochs(self.__results['entry time'].values))
 
     def get_target(self) -> np.ndarray:
         return self.__target
 
 
 class CandleStickDataProcessing:
+    """
+    Candlestick features of a trade's entry bar. Every `calculate_*_features` function
+    takes scalars of one entry and returns a 1-D array, or arrays of many entries and
+    returns one row per feature. `batch_features()` runs any of them over arrays of
+    entry indices, so training and the backtest compute features the same way.
+    """
+
+    # parameter prefix -> bars before the entry bar
+    BAR_OFFSETS = {'current': 0, 'prev': 1, 'b_prev': 2}
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def __arguments(dp_pattern) -> dict:
+        # parameter name -> (column, bars before the entry), read once per function
+        arguments = {}
+        for name in inspect.signature(dp_pattern).parameters:
+            prefix, _, column = name.rpartition('_')
+            if prefix not in CandleStickDataProcessing.BAR_OFFSETS or column not in ['open', 'high', 'low',
+                                                                                     'close']:
+                raise ValueError(f"Cannot read '{name}' of {dp_pattern.__name__} from the OHLC columns")
+            arguments[name] = (column, CandleStickDataProcessing.BAR_OFFSETS[prefix])
+        return arguments
+
+    @staticmethod
+    def batch_features(dp_pattern, index, opens, highs, lows, closes) -> np.ndarray:
+        """
+        Features of many entries in one call, read from the OHLC columns by the function's
+        parameter names: 'current_open' is the open of the entry bar, 'prev_close' the close
+        of the bar before it and 'b_prev_high' the high of the bar before that.
+
+        :param dp_pattern: A `calculate_*_features` function.
+        :param index: Bar index of every entry.
+        :return: One row of features per entry.
+        """
+        index = np.asarray(index, dtype=np.int64)
+        columns = {'open': opens, 'high': highs, 'low': lows, 'close': closes}
+        arguments = {}
+        for name, (column, offset) in CandleStickDataProcessing.__arguments(dp_pattern).items():
+            bars = index - offset
+            if len(bars) and bars.min() < 0:
+                raise ValueError(f"'{name}' of {dp_pattern.__name__} is before the first bar")
+            arguments[name] = np.asarray(columns[column], dtype=np.float64)[bars]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features = np.asarray(dp_pattern(**arguments), dtype=np.float64)
+        return features.T
+
     @staticmethod
     def calculate_basic_features(current_open, current_close, current_high, current_low):
-        body_length = abs(current_open - current_close)
-        upper_shadow_length = current_high - max(current_open, current_close)
-        lower_shadow_length = min(current_open, current_close) - current_low
+        body_length = np.abs(current_open - current_close)
+        upper_shadow_length = current_high - np.maximum(current_open, current_close)
+        lower_shadow_length = np.minimum(current_open, current_close) - current_low
         candlestick_length = current_high - current_low
         return np.array([body_length, upper_shadow_length, lower_shadow_length, candlestick_length])
 
     @staticmethod
     def calculate_engulfing_features(current_open, current_close, prev_open, prev_close):
-        current_body = abs(current_close - current_open)
-        previous_body = abs(prev_close - prev_open)
-        engulfing_ratio = current_body / previous_body if previous_body else 0
+        current_body = np.abs(current_close - current_open)
+        previous_body = np.abs(prev_close - prev_open)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            engulfing_ratio = np.where(previous_body != 0, current_body / previous_body, 0.0)
 
         return np.array([engulfing_ratio])
 
     @staticmethod
     def calculate_inverted_hammer_features(current_open, current_close, current_high, current_low):
-        body_length = abs(current_open - current_close)
-        upper_shadow_length = current_high - max(current_open, current_close)
+        body_length = np.abs(current_open - current_close)
+        upper_shadow_length = current_high - np.maximum(current_open, current_close)
         total_length = current_high - current_low
         upper_to_body_ratio = upper_shadow_length / (
                 body_length + 0.001)  # Adding a small number to avoid division by zero
@@ -129,15 +309,15 @@ class CandleStickDataProcessing:
 
     @staticmethod
     def calculate_bullish_harami_features(current_open, current_close, prev_open, prev_close):
-        current_body_length = abs(current_close - current_open)
-        previous_body_length = abs(prev_close - prev_open)
+        current_body_length = np.abs(current_close - current_open)
+        previous_body_length = np.abs(prev_close - prev_open)
         body_length_ratio = current_body_length / (previous_body_length + 0.001)
         return np.array([body_length_ratio])
 
     @staticmethod
     def calculate_dragonfly_doji_features(current_open, current_close, current_high, current_low):
-        body_length = abs(current_open - current_close)
-        lower_shadow_length = min(current_open, current_close) - current_low
+        body_length = np.abs(current_open - current_close)
+        lower_shadow_length = np.minimum(current_open, current_close) - current_low
         total_length = current_high - current_low
         lower_to_body_ratio = lower_shadow_length / (body_length + 0.001)
         body_to_total_ratio = body_length / (total_length + 0.001)
@@ -145,8 +325,8 @@ class CandleStickDataProcessing:
 
     @staticmethod
     def calculate_hammer_features(current_open, current_close, current_high, current_low):
-        body_length = abs(current_open - current_close)
-        lower_shadow_length = min(current_open, current_close) - current_low
+        body_length = np.abs(current_open - current_close)
+        lower_shadow_length = np.minimum(current_open, current_close) - current_low
         total_length = current_high - current_low
         lower_to_body_ratio = lower_shadow_length / (body_length + 0.001)
         body_to_total_ratio = body_length / (total_length + 0.001)
@@ -154,9 +334,9 @@ class CandleStickDataProcessing:
 
     @staticmethod
     def calculate_morning_star_features(b_prev_open, b_prev_close, prev_open, prev_close, current_open, current_close):
-        first_candle_body_length = abs(b_prev_close - b_prev_open)
-        third_candle_body_length = abs(current_close - current_open)
-        middle_candle_range = abs(prev_close - prev_open)
+        first_candle_body_length = np.abs(b_prev_close - b_prev_open)
+        third_candle_body_length = np.abs(current_close - current_open)
+        middle_candle_range = np.abs(prev_close - prev_open)
         body_length_ratio = third_candle_body_length / (first_candle_body_length + 0.001)
         middle_range_to_body_ratio = middle_candle_range / (third_candle_body_length + 0.001)
         return np.array([body_length_ratio, middle_range_to_body_ratio])
@@ -165,15 +345,15 @@ class CandleStickDataProcessing:
     def calculate_morning_star_doji_features(b_prev_open, b_prev_close, prev_high,
                                              prev_low, current_open, current_close):
         doji_range = prev_high - prev_low
-        third_candle_body_length = abs(current_close - current_open)
-        first_to_third_body_ratio = abs(b_prev_close - b_prev_open) / (third_candle_body_length + 0.001)
+        third_candle_body_length = np.abs(current_close - current_open)
+        first_to_third_body_ratio = np.abs(b_prev_close - b_prev_open) / (third_candle_body_length + 0.001)
         doji_to_body_ratio = doji_range / (third_candle_body_length + 0.001)
         return np.array([first_to_third_body_ratio, doji_to_body_ratio])
 
     @staticmethod
     def calculate_piercing_pattern_features(prev_open, prev_close, current_open, current_close):
-        previous_body_length = abs(prev_close - prev_open)
-        current_body_length = abs(current_close - current_open)
+        previous_body_length = np.abs(prev_close - prev_open)
+        current_body_length = np.abs(current_close - current_open)
         body_length_ratio = current_body_length / (previous_body_length + 0.001)
         penetration_ratio = (current_close - prev_close) / (prev_open - prev_close + 0.001)
         return np.array([body_length_ratio, penetration_ratio])
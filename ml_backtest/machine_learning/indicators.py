@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+
+class Indicator:
+    """
+    Indicator with rolling state. `update()` takes the next value of its source and
+    returns the indicator at that bar in O(1), `batch()` computes it over a whole column.
+    Both match TA-Lib after the warm-up and are NaN before it.
+    """
+
+    # suffixes of the columns the indicator outputs, after the name it is declared under
+    OUTPUTS = ('',)
+
+    def __init__(self, source: str = 'close'):
+        """
+        :param source: Column, or name of an indicator declared before this one, it is computed on.
+        """
+        self.source = source
+
+    def update(self, value: float):
+        raise NotImplementedError("Method 'update()' must be defined in the subclass.")
+
+    def batch(self, values: np.ndarray):
+        raise NotImplementedError("Method 'batch()' must be defined in the subclass.")
+
+    @staticmethod
+    def _ema(values, period, seed_index, k=None):
+        # TA-Lib's EMA: the SMA of the `period` values up to seed_index, then exponential smoothing
+        k = 2.0 / (period + 1) if k is None else k
+        ema = np.full(len(values), np.nan)
+        if seed_index < len(values):
+            smoothed = values[seed_index:].copy()
+            smoothed[0] = values[seed_index - period + 1:seed_index + 1].mean()
+            ema[seed_index:] = pd.Series(smoothed).ewm(alpha=k, adjust=False).mean().to_numpy()
+        return ema
+
+
+class SMA(Indicator):
+    def __init__(self, source: str = 'close', period: int = 10):
+        super().__init__(source)
+        self.period = period
+        self.__window = [0.0] * period
+        self.__count = 0
+        self.__total = 0.0
+
+    def update(self, value):
+        slot = self.__count % self.period
+        self.__total += value
+        self.__count += 1
+        self.__window[slot] = value
+        if self.__count < self.period:
+            return np.nan
+        mean = self.__total / self.period
+        # the oldest value of the window leaves the sum before the next bar. Once every period the
+        # sum is taken again from the window, so rounding errors do not pile up over long streams.
+        oldest = (slot + 1) % self.period
+        if oldest == 0:
+            self.__total = sum(self.__window[1:])
+        else:
+            self.__total -= self.__window[oldest]
+        return mean
+
+    def batch(self, values):
+        return pd.Series(values).rolling(window=self.period).mean().to_numpy()
+
+
+class EMA(Indicator):
+    def __init__(self, source: str = 'close', period: int = 10):
+        super().__init__(source)
+        self.period = period
+        self.__k = 2.0 / (period + 1)
+        self.__count = 0
+        self.__ema = 0.0
+
+    def update(self, value):
+        self.__count += 1
+        if self.__count < self.period:
+            self.__ema += value
+            return np.nan
+        if self.__count == self.period:
+            self.__ema = (self.__ema + value) / self.period
+        else:
+            self.__ema = (value - self.__ema) * self.__k + self.__ema
+        return self.__ema
+
+    def batch(self, values):
+        return self._ema(np.asarray(values, dtype=np.float64), self.period, self.period - 1)
+
+
+class RSI(Indicator):
+    def __init__(self, source: str = 'close', period: int = 14):
+        super().__init__(source)
+        self.period = period
+        self.__count = 0
+        self.__previous = None
+        self.__gain = 0.0
+        self.__loss = 0.0
+
+    def update(self, value):
+        if self.__previous is None:
+            self.__previous = value
+            return np.nan
+        change = value - self.__previous
+        self.__previous = value
+        self.__count += 1
+
+        # Wilder's smoothing after averaging the first `period` changes
+        if self.__count > self.period:
+            self.__gain *= self.period - 1
+            self.__loss *= self.period - 1
+        if change < 0:
+            self.__loss -= change
+        else:
+            self.__gain += change
+        if self.__count < self.period:
+            return np.nan
+        self.__gain /= self.period
+        self.__loss /= self.period
+        return self.__rsi(self.__gain, self.__loss)
+
+    @staticmethod
+    def __rsi(gain, loss):
+        total = gain + loss
+        return 100 * gain / total if abs(total) >= 1e-14 else 0.0
+
+    def batch(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        rsi = np.full(len(values), np.nan)
+        if len(values) <= self.period:
+            return rsi
+        changes = np.diff(values)
+        # Wilder's smoothing is an EMA with k = 1 / period
+        gains = self._ema(np.maximum(changes, 0), self.period, self.period - 1, k=1.0 / self.period)
+        losses = self._ema(np.maximum(-changes, 0), self.period, self.period - 1, k=1.0 / self.period)
+        total = gains + losses
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi[1:] = np.where(np.abs(total) >= 1e-14, 100 * gains / total, 0.0)
+        rsi[:self.period] = np.nan
+        return rsi
+
+
+class MACD(Indicator):
+    OUTPUTS = ('', '_signal', '_hist')
+
+    def __init__(self, source: str = 'close', fast_period: int = 12, slow_period: int = 26,
+                 signal_period: int = 9):
+        super().__init__(source)
+        self.fast_period = fast_period
+        self.slow_period = slow_period
+        self.signal_period = signal_period
+        # like TA-Lib both averages start on the slow average's first bar, seeded with
+        # the SMA of their own period up to it
+        self.__window = []
+        self.__fast = None
+        self.__slow = None
+        self.__signal = EMA(source, signal_period)
+
+    def update(self, value):
+        if self.__slow is None:
+            self.__window.append(value)
+            if len(self.__window) < self.slow_period:
+                return np.nan, np.nan, np.nan
+            self.__fast = sum(self.__window[-self.fast_period:]) / self.fast_period
+            self.__slow = sum(self.__window) / self.slow_period
+            self.__window = None
+        else:
+            self.__fast = (value - self.__fast) * (2.0 / (self.fast_period + 1)) + self.__fast
+            self.__slow = (value - self.__slow) * (2.0 / (self.slow_period + 1)) + self.__slow
+
+        macd = self.__fast - self.__slow
+        signal = self.__signal.update(macd)
+        if np.isnan(signal):
+            return np.nan, np.nan, np.nan
+        return macd, signal, macd - signal
+
+    def batch(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        seed_index = self.slow_period - 1
+        macd = self._ema(values, self.fast_period, seed_index) - self._ema(values, self.slow_period, seed_index)
+        signal = np.full(len(values), np.nan)
+        signal[seed_index:] = self._ema(macd[seed_index:], self.signal_period, self.signal_period - 1)
+        macd[np.isnan(signal)] = np.nan
+        return macd, signal, macd - signal
+
+
+class Diff(Indicator):
+    def __init__(self, source: str = 'close'):
+        super().__init__(source)
+        self.__previous = np.nan
+
+    def update(self, value):
+        change = value - self.__previous
+        self.__previous = value
+        return change
+
+    def batch(self, values):
+        return pd.Series(values).diff().to_numpy()
+
+
+class IndicatorSet:
+    def __init__(self, indicators: Dict[str, Indicator]):
+        """
+        Indicators declared as {name: indicator}, evaluated in order so an indicator can be
+        computed on one declared before it, e.g. {'SMA': SMA('close', 10), 'SMA_Diff': Diff('SMA')}.
+        Indicators with several outputs add a column per output, e.g. 'MACD', 'MACD_signal'
+        and 'MACD_hist'.
+        """
+        self.__indicators = indicators
+
+    @property
+    def columns(self) -> List[str]:
+        return [name + suffix for name, indicator in self.__indicators.items() for suffix in indicator.OUTPUTS]
+
+    def update(self, bar: dict) -> dict:
+        """
+        Advance every indicator by one bar in O(1), independent of how many bars came before.
+
+        :param bar: The bar's source columns, e.g. {'close': 18000.25}.
+        :return: The bar's value of every declared column.
+        """
+        values = dict(bar)
+        for name, indicator in self.__indicators.items():
+            output = indicator.update(values[indicator.source])
+            if len(indicator.OUTPUTS) == 1:
+                values[name] = output
+            else:
+                values.update(zip((name + suffix for suffix in indicator.OUTPUTS), output))
+        return {column: values[column] for column in self.columns}
+
+    def add_to(self, df: pd.DataFrame):
+        """
+        Compute every declared column over the whole frame at once and add it to `df`.
+        """
+        for name, indicator in self.__indicators.items():
+            output = indicator.batch(df[indicator.source].to_numpy(dtype=np.float64))
+            if len(indicator.OUTPUTS) == 1:
+                df[name] = output
+            else:
+                for suffix, values in zip(indicator.OUTPUTS, output):
+                    df[name + suffix] = values
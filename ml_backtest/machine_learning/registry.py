@@ -0,0 +1,117 @@
+from joblib import dump, load
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, List
+import pandas as pd
+import json
+import os
+
+
+class ModelRegistry:
+    """
+    Trained models stored with what is needed to backtest them: the feature `columns`,
+    `rows`, the `cs_pattern` flag and a fingerprint of the data they were trained on.
+    Every `register()` of a name adds a new version, keys are 'name:version' and a bare
+    name means its latest version.
+
+    Models are loaded with joblib's `mmap_mode`, so the NumPy arrays inside them are
+    memory mapped from the file and shared by every process that loads the same model.
+    The most recently used models are kept loaded in the process.
+    """
+
+    CACHE_SIZE = 4
+    # shared by every registry of the process: model directory -> loaded entry
+    _loaded = OrderedDict()
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        :param directory: Where to keep the models, defaults to ~/.cache/ml_backtest/models.
+        """
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.cache', 'ml_backtest', 'models')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def __versions(self, name) -> List[int]:
+        path = os.path.join(self.directory, name)
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(version) for version in os.listdir(path) if version.isdigit())
+
+    def __resolve(self, key: str) -> str:
+        name, _, version = key.partition(':')
+        if not version:
+            versions = self.__versions(name)
+            if not versions:
+                raise KeyError(f"No model named '{name}' in {self.directory}")
+            version = str(versions[-1])
+        path = os.path.join(self.directory, name, version)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            raise KeyError(f"No model '{key}' in {self.directory}")
+        return path
+
+    def register(self, name: str, model, columns: List[str], rows: int, cs_pattern: bool = False,
+                 fingerprint: Optional[str] = None) -> str:
+        """
+        :param name: Model name, without ':' or path separators.
+        :param model: Trained estimator.
+        :param columns: Feature columns the model was trained with.
+        :param rows: Bars per feature window.
+        :param cs_pattern: Whether the model also takes candlestick features.
+        :param fingerprint: Optional fingerprint of the training data.
+        :return: Key of the new version, 'name:version'.
+        """
+        if not name or ':' in name or os.sep in name or name.startswith('.'):
+            raise ValueError(f"Invalid model name '{name}'")
+
+        versions = self.__versions(name)
+        version = versions[-1] + 1 if versions else 1
+        path = os.path.join(self.directory, name, str(version))
+        os.makedirs(path)
+
+        # uncompressed, so the arrays can be memory mapped when loading
+        dump(model, os.path.join(path, 'model.joblib'))
+        meta = {'key': f'{name}:{version}',
+                'model class': f'{type(model).__module__}.{type(model).__qualname__}',
+                'columns': list(columns),
+                'rows': rows,
+                'cs_pattern': cs_pattern,
+                'fingerprint': fingerprint,
+                'created': datetime.now(timezone.utc).isoformat()}
+        # written last, a version without it is incomplete and not loaded
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        print(f"\033[91mModel saved to {path}\033[0m")
+        return meta['key']
+
+    def load(self, key: str) -> dict:
+        """
+        :param key: 'name:version' or 'name' for the latest version.
+        :return: dict with the 'model' and its metadata ('key', 'columns', 'rows', 'cs_pattern', ...).
+        """
+        path = self.__resolve(key)
+        if path in self._loaded:
+            self._loaded.move_to_end(path)
+            return self._loaded[path]
+
+        with open(os.path.join(path, 'meta.json')) as f:
+            entry = json.load(f)
+        entry['model'] = load(os.path.join(path, 'model.joblib'), mmap_mode='r')
+
+        self._loaded[path] = entry
+        while len(self._loaded) > self.CACHE_SIZE:
+            self._loaded.popitem(last=False)
+        return entry
+
+    def models(self) -> pd.DataFrame:
+        """
+        :return: Metadata of every registered version, one row each.
+        """
+        rows = []
+        for name in sorted(os.listdir(self.directory)):
+            for version in self.__versions(name):
+                meta_path = os.path.join(self.directory, name, str(version), 'meta.json')
+                if os.path.exists(meta_path):
+                    with open(meta_path) as f:
+                        rows.append(json.load(f))
+        return pd.DataFrame(rows)
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+from ml_backtest.data.clock import BarClock
+from typing import Iterable, Optional, Tuple
+
+
+class TradeTargets:
+    """
+    Labels of every trade computed after the backtest from the trade ledger and the bars,
+    with one segment reduction over the bars each trade was open on, its entry bar to its
+    exit bar or the last bar for trades still open. Nothing is tracked per bar while the
+    backtest runs.
+
+    Labels, in points unless stated otherwise:
+
+    * 'highest high' / 'lowest low': extremes of the trade's bars.
+    * 'target': 'highest high' - 'entry price', the backtest's default target.
+    * 'mfe': maximum favourable excursion, how far price went in the trade's favour.
+    * 'mae': maximum adverse excursion, how far price went against the trade (positive).
+    * 'bars': bars from entry to exit.
+    * 'pnl': realised profit or loss.
+    * 'r multiple': pnl in units of the initial risk, |entry price - stop loss|.
+    """
+
+    LABELS = ('highest high', 'lowest low', 'target', 'mfe', 'mae', 'bars', 'pnl', 'r multiple')
+
+    def __init__(self, trades: pd.DataFrame, data: pd.DataFrame):
+        """
+        :param trades: Trades of `Backtest.get_trades()`. Trades without an 'entry index' or
+            'exit index' are placed on the bars by their entry and exit time.
+        :param data: The bars the trades were backtested on.
+        """
+        length = len(data)
+        if 'entry index' in trades and 'exit index' in trades:
+            entries = trades['entry index'].to_numpy(dtype=np.int64)
+            exits = trades['exit index'].to_numpy(dtype=np.int64)
+        else:
+            dates = BarClock.to_epochs(data['date'].values)
+            entries = np.searchsorted(dates, BarClock.to_epochs(trades['entry time'].values))
+            exit_times = trades['exit time']
+            exits = np.full(len(trades), -1, dtype=np.int64)
+            closed = exit_times.notna().to_numpy()
+            exits[closed] = np.searchsorted(dates, BarClock.to_epochs(exit_times.values[closed]))
+        # trades still open run to the last bar
+        exits = np.where(exits < 0, length - 1, exits)
+
+        self.__long = np.asarray(trades['type'].astype(str).to_numpy() == 'long')
+        self.__entries = entries
+        self.__exits = exits
+        self.__entry_prices = trades['entry price'].to_numpy(dtype=np.float64)
+        self.__stop_losses = trades['stop loss'].to_numpy(dtype=np.float64)
+        if 'pnl' in trades:
+            self.__pnl = trades['pnl'].to_numpy(dtype=np.float64)
+        else:
+            exit_prices = trades['exit price'].to_numpy(dtype=np.float64)
+            self.__pnl = np.where(self.__long, exit_prices - self.__entry_prices, self.__entry_prices - exit_prices)
+        self.__highs = data['high'].to_numpy(dtype=np.float64)
+        self.__lows = data['low'].to_numpy(dtype=np.float64)
+        self.__highest_high = None
+        self.__lowest_low = None
+
+    @staticmethod
+    def span_max(values: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+        """
+        Maximum of `values[start:stop + 1]` for every pair with one `np.maximum.reduceat`.
+        Spans may overlap, as trades held at the same time do.
+        """
+        return TradeTargets.__span_reduce(np.maximum, values, starts, stops, -np.inf)
+
+    @staticmethod
+    def span_min(values: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+        """
+        Minimum of `values[start:stop + 1]` for every pair with one `np.minimum.reduceat`.
+        """
+        return TradeTargets.__span_reduce(np.minimum, values, starts, stops, np.inf)
+
+    @staticmethod
+    def __span_reduce(ufunc, values, starts, stops, fill):
+        if not len(starts):
+            return np.empty(0)
+        # the pairs [start, stop + 1] are reduced at the even positions, a sentinel past the
+        # last bar keeps stop + 1 in bounds for spans ending on it
+        padded = np.append(np.asarray(values, dtype=np.float64), fill)
+        bounds = np.empty(2 * len(starts), dtype=np.int64)
+        bounds[0::2] = starts
+        bounds[1::2] = np.asarray(stops) + 1
+        return ufunc.reduceat(padded, bounds)[0::2]
+
+    def highest_high(self) -> np.ndarray:
+        if self.__highest_high is None:
+            self.__highest_high = self.span_max(self.__highs, self.__entries, self.__exits)
+        return self.__highest_high
+
+    def lowest_low(self) -> np.ndarray:
+        if self.__lowest_low is None:
+            self.__lowest_low = self.span_min(self.__lows, self.__entries, self.__exits)
+        return self.__lowest_low
+
+    def label(self, name: str, clip: Optional[Tuple[Optional[float], Optional[float]]] = None) -> np.ndarray:
+        """
+        :param name: One of `LABELS`.
+        :param clip: Optional (lower, upper) bounds, either can be None.
+        :return: The label of every trade.
+        """
+        long, entry_prices = self.__long, self.__entry_prices
+        if name == 'highest high':
+            values = self.highest_high()
+        elif name == 'lowest low':
+            values = self.lowest_low()
+        elif name == 'target':
+            values = self.highest_high() - entry_prices
+        elif name == 'mfe':
+            values = np.where(long, self.highest_high() - entry_prices, entry_prices - self.lowest_low())
+        elif name == 'mae':
+            values = np.where(long, entry_prices - self.lowest_low(), self.highest_high() - entry_prices)
+        elif name == 'bars':
+            values = self.__exits - self.__entries
+        elif name == 'pnl':
+            values = self.__pnl
+        elif name == 'r multiple':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = self.__pnl / np.abs(entry_prices - self.__stop_losses)
+        else:
+            raise ValueError(f"Unknown label '{name}', expected one of {', '.join(self.LABELS)}")
+
+        if clip is not None:
+            lower, upper = clip
+            values = np.clip(values, -np.inf if lower is None else lower, np.inf if upper is None else upper)
+        return values
+
+    def labels(self, names: Iterable[str]) -> pd.DataFrame:
+        """
+        :return: DataFrame with a column per label, one row per trade.
+        """
+        return pd.DataFrame({name: self.label(name) for name in names})
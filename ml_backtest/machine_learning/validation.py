@@ -0,0 +1,125 @@
+import numpy as np
+from sklearn.base import is_regressor
+from sklearn.metrics import mean_squared_error
+from joblib import parallel_config
+from threadpoolctl import threadpool_limits
+from typing import Optional, List
+import time
+
+
+class PurgedSplit:
+    def __init__(self, n_splits: int = 5, purge: int = 0, embargo: int = 0):
+        """
+        Base class of the time series splitters. Folds are made over trades, using the
+        bar each trade entered and exited on. A training trade is purged when its span
+        of bars comes within `purge` bars before the test window or within `embargo`
+        bars after it, so no label of the training set overlaps the test set.
+
+        :param n_splits: Number of folds.
+        :param purge: Bars before each test window that training trades may not reach into.
+        :param embargo: Bars after each test window that training trades may not reach into.
+        """
+        self.n_splits = n_splits
+        self.purge = purge
+        self.embargo = embargo
+
+    def windows(self, n_bars: int) -> List[tuple]:
+        """
+        :return: (train start, test start, test end) bars of every fold.
+        """
+        raise NotImplementedError("This method must be implemented by a subclass")
+
+    def split(self, entry_bars: np.ndarray, exit_bars: np.ndarray, n_bars: int) -> List[dict]:
+        """
+        :param entry_bars: Entry bar of every trade.
+        :param exit_bars: Exit bar of every trade.
+        :param n_bars: Number of bars in the data.
+        :return: One dict per fold with the 'train' and 'test' trade indices and the test window.
+        """
+        folds = []
+        for train_start, test_start, test_end in self.windows(n_bars):
+            in_test = (entry_bars >= test_start) & (entry_bars < test_end)
+            overlaps_test = (exit_bars >= test_start - self.purge) & (entry_bars < test_end + self.embargo)
+            in_train = (entry_bars >= train_start) & ~in_test & ~overlaps_test
+            if self._train_before_test():
+                in_train &= entry_bars < test_start
+
+            train, test = np.flatnonzero(in_train), np.flatnonzero(in_test)
+            if len(train) and len(test):
+                folds.append({'train': train, 'test': test, 'test start': test_start, 'test end': test_end})
+        return folds
+
+    def _train_before_test(self) -> bool:
+        return False
+
+
+class WalkForward(PurgedSplit):
+    def __init__(self, n_splits: int = 5, test_bars: Optional[int] = None, train_bars: Optional[int] = None,
+                 purge: int = 0, embargo: int = 0):
+        """
+        Walk-forward folds, every test window is trained only on the bars before it.
+        The test windows are the last `n_splits` blocks of `test_bars` bars.
+
+        :param test_bars: Bars per test window, defaults to splitting the data in n_splits + 1 blocks.
+        :param train_bars: Bars per rolling training window, None trains on an expanding window.
+        """
+        super().__init__(n_splits=n_splits, purge=purge, embargo=embargo)
+        self.test_bars = test_bars
+        self.train_bars = train_bars
+
+    def windows(self, n_bars: int) -> List[tuple]:
+        test_bars = self.test_bars if self.test_bars is not None else n_bars // (self.n_splits + 1)
+        windows = []
+        for k in range(self.n_splits):
+            test_start = n_bars - (self.n_splits - k) * test_bars
+            train_start = 0 if self.train_bars is None else max(0, test_start - self.purge - self.train_bars)
+            windows.append((train_start, test_start, test_start + test_bars))
+        return windows
+
+    def _train_before_test(self) -> bool:
+        return True
+
+
+class PurgedKFold(PurgedSplit):
+    """
+    K contiguous (unshuffled) folds, each trained on every other fold after purging
+    and embargoing the trades around its test window.
+    """
+
+    def windows(self, n_bars: int) -> List[tuple]:
+        edges = np.linspace(0, n_bars, self.n_splits + 1).astype(int)
+        return [(0, edges[k], edges[k + 1]) for k in range(self.n_splits)]
+
+
+def _fit_fold(ml_class, data, rows, columns, x_path, y_path, fold, params=None, threads=None):
+    # X and y are memory mapped, every worker reads the same pages of the one matrix
+    X = np.load(x_path, mmap_mode='r')
+    y = np.load(y_path, mmap_mode='r')
+    X_train, y_train = X[fold['train']], y[fold['train']]
+    X_test, y_test = X[fold['test']], y[fold['test']]
+
+    ml = ml_class(data=data, rows=rows, columns=columns)
+    if params:
+        ml.params = dict(params)
+        # an estimator's own n_jobs overrides parallel_config, n_jobs=-1 would take every core in
+        # every worker. It is held to the worker's threads, None and negative values included.
+        n_jobs = ml.params.get('n_jobs', 1)
+        if threads is not None and (n_jobs is None or n_jobs < 0 or n_jobs > threads):
+            ml.params['n_jobs'] = threads
+    # joblib and BLAS threads of the estimator share the worker's part of the CPU budget
+    with parallel_config(n_jobs=threads), threadpool_limits(limits=threads):
+        start = time.perf_counter()
+        ml.train(x_train=X_train, y_train=y_train, x_test=X_test, y_test=y_test)
+        fit_seconds = time.perf_counter() - start
+        ml.predict(x_train=X_train, y_train=y_train, x_test=X_test, y_test=y_test)
+        model = ml.get_model()
+
+        metrics = {'test start': fold['test start'],
+                   'test end': fold['test end'],
+                   'train size': len(fold['train']),
+                   'test size': len(fold['test']),
+                   'score': model.score(X_test, y_test),
+                   'fit seconds': fit_seconds}
+        if is_regressor(model):
+            metrics['mse'] = mean_squared_error(y_test, model.predict(X_test))
+    return metrics, model
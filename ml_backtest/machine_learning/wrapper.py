@@ -1,22 +1,48 @@
 import numpy as np
 from joblib import dump
 from ml_backtest.interfaces import MachineLearningInterface, TargetInterface
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, ParameterGrid
 from ml_backtest.machine_learning import DataProcessing
-from typing import Type, List, Optional
+from ml_backtest.machine_learning.validation import PurgedSplit, _fit_fold
+from ml_backtest.machine_learning.cache import FeatureCache
+from ml_backtest.machine_learning.registry import ModelRegistry
+from concurrent.futures import ProcessPoolExecutor
+from ml_backtest.data import ColumnStore
+from ml_backtest.profiler import Profiler
+from typing import Type, List, Optional, Union, Tuple
 import pandas as pd
+import tempfile
 import os
 
 
 class MachineLearning:
 
     def __init__(self, ml_class: Type[MachineLearningInterface],
-                 df: pd.DataFrame, results: pd.DataFrame,
+                 df: Union[pd.DataFrame, ColumnStore], results: pd.DataFrame,
                  target_class: Type[TargetInterface] = None,
                  rows: Optional[int] = None,
-                 columns: Optional[List[str]] = None):
+                 columns: Optional[List[str]] = None,
+                 profile: Union[bool, Profiler] = False,
+                 cache: Optional[FeatureCache] = None,
+                 compact: bool = False):
+        """
+        :param profile: True or a `Profiler` to time the phases of `run()`, see `get_profile()`.
+        :param cache: Optional `FeatureCache`, repeat runs on the same data, trainer, trades,
+            rows, columns and dp_pattern load the features and training matrices from it.
+        :param compact: Build the training matrix in float32 from only the selected columns, see
+            `get_memory()` for the memory it saves.
+        """
+        if isinstance(df, ColumnStore):
+            df = df.to_frame()
         self.__df = df
         self.__results = results
+        self.__ml_class = ml_class
+        self.__fold_models = []
+        self.__profiler = Profiler() if profile is True else (profile or None)
+        self.__cache = cache
+        self.__compact = compact
+        self.__memory = None
+        self.__dp_pattern = None
 
         if target_class is not None:
             self.__target_class = target_class(trades=self.__results, data=self.__df)
@@ -27,35 +53,224 @@ class MachineLearning:
         else:
             self.__ml = ml_class(data=self.__df)
 
-    def run(self, dp_pattern=None) -> None:
-        self.__ml.feature_engineer()
+    def run(self, dp_pattern=None, cv: Optional[PurgedSplit] = None,
+            processes: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """
+        Build the training data and train the model. Without `cv` the trades are split
+        once into a train and test set. With a `WalkForward` or `PurgedKFold` splitter the
+        folds are trained and evaluated in parallel on the one feature matrix.
+
+        :param dp_pattern: Optional `CandleStickDataProcessing` function for candlestick features.
+        :param cv: Optional time series splitter.
+        :param processes: Number of worker processes for the folds, defaults to every core.
+        :return: Per-fold metrics when `cv` is given.
+        """
+        self.__dp_pattern = dp_pattern
+        features_key = self.__engineer_features()
+        training_data = self.__training_data(features_key, dp_pattern)
+        Xr, y = training_data['X'], training_data['y']
+        if self.__profiler is not None:
+            self.__profiler.count('samples', len(Xr))
+
+        try:
+            if cv is not None:
+                entry_bars, exit_bars = training_data['entry bars'], training_data['exit bars']
+                folds = cv.split(entry_bars, exit_bars, n_bars=len(self.__df))
+                return self.__timed('cross_validate', self.__cross_validate)(folds, Xr, y, processes)
+
+            X_train, X_test, y_train, y_test = \
+                train_test_split(Xr, y, test_size=0.2, random_state=42)
+
+            self.__train(X_train=X_train, X_test=X_test, y_train=y_train, y_test=y_test)
+        finally:
+            if self.__profiler is not None:
+                self.__profiler.flush()
+
+    def __timed(self, phase, function):
+        return function if self.__profiler is None else self.__profiler.timed(phase, function)
+
+    def __count(self, name):
+        if self.__profiler is not None:
+            self.__profiler.count(name)
+
+    def __engineer_features(self) -> Optional[str]:
+        # the columns feature_engineer() adds are cached, keyed by the data before it ran
+        if self.__cache is None:
+            self.__timed('feature_engineer', self.__ml.feature_engineer)()
+            return None
+
+        key = FeatureCache.fingerprint('features', self.__df, self.__ml_class,
+                                       self.__ml.get_rows, self.__ml.get_columns)
+        cached = self.__cache.load(key)
+        if cached is not None:
+            self.__count('feature cache hits')
+            for name, values in cached.items():
+                self.__df[name] = values
+            return key
+
+        self.__count('feature cache misses')
+        before = set(self.__df.columns)
+        self.__timed('feature_engineer', self.__ml.feature_engineer)()
+        self.__cache.store(key, {name: self.__df[name].to_numpy() for name in self.__df.columns
+                                 if name not in before})
+        return key
+
+    def __training_data(self, features_key, dp_pattern) -> dict:
+        if self.__cache is not None:
+            # compact matrices are keyed apart, keys of float64 matrices stay as they were
+            key = FeatureCache.fingerprint('matrices', features_key, self.__results, self.__ml.get_rows,
+                                           self.__ml.get_columns, dp_pattern,
+                                           *(['compact'] if self.__compact else []))
+            cached = self.__cache.load(key)
+            if cached is not None:
+                self.__count('matrix cache hits')
+                self.__measure(cached['X'])
+                return cached
+            self.__count('matrix cache misses')
 
         dp = DataProcessing(df=self.__df, results=self.__results,
-                            rows=self.__ml.get_rows, columns=self.__ml.get_columns)
+                            rows=self.__ml.get_rows, columns=self.__ml.get_columns, compact=self.__compact)
 
         if dp_pattern is not None:
-            dp.add_pattern_features(dp_pattern=dp_pattern)
+            self.__timed('data_processing.add_pattern_features', dp.add_pattern_features)(dp_pattern=dp_pattern)
+
+        X = self.__timed('data_processing.get_before', dp.get_before)()
+        entry_bars, exit_bars = dp.get_trade_bars()
+        # rounded in place, the matrix is not copied again
+        np.around(X, decimals=4, out=X)
+        self.__measure(X)
+        training_data = {'X': X, 'y': dp.get_target(),
+                         'entry bars': entry_bars, 'exit bars': exit_bars}
+
+        if self.__cache is not None:
+            self.__cache.store(key, training_data)
+        return training_data
+
+    def __measure(self, X):
+        self.__memory = {'X bytes': X.nbytes, 'float64 X bytes': X.size * 8,
+                         'saved bytes': X.size * 8 - X.nbytes}
+        if self.__profiler is not None:
+            self.__profiler.count('feature matrix bytes', X.nbytes)
+
+    def __cross_validate(self, folds, X, y, processes) -> pd.DataFrame:
+        print(f"\033[91mTraining {len(folds)} folds in progress...\033[0m")
+        tasks = [(self.__ml_class, None, fold) for fold in folds]
+        results = self.__fit_in_pool(tasks, X, y, processes)
 
-        X = dp.get_before()
-        Xr = np.around(X, decimals=4)
-        y = dp.get_target()
+        self.__fold_models = [model for _, model in results]
+        metrics = pd.DataFrame([fold_metrics for fold_metrics, _ in results])
+        metrics.index.name = 'fold'
+        return metrics
 
-        X_train, X_test, y_train, y_test = \
-            train_test_split(Xr, y, test_size=0.2, random_state=42)
+    def __fit_in_pool(self, tasks, X, y, processes, threads=None) -> list:
+        # X and y are written once and memory mapped by every worker, tasks are (ml_class, params, fold)
+        # the trainers only need the data frame's shape, not the bars themselves
+        data = self.__df.iloc[:0]
+        rows, columns = self.__ml.get_rows, self.__ml.get_columns
 
-        self.__train(X_train=X_train, X_test=X_test, y_train=y_train, y_test=y_test)
+        with tempfile.TemporaryDirectory() as directory:
+            x_path = os.path.join(directory, 'X.npy')
+            y_path = os.path.join(directory, 'y.npy')
+            np.save(x_path, X)
+            np.save(y_path, y)
+
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = [pool.submit(_fit_fold, ml_class, data, rows, columns, x_path, y_path, fold,
+                                       params, threads) for ml_class, params, fold in tasks]
+                return [future.result() for future in futures]
+
+    def search(self, candidates: list, dp_pattern=None, cv: Optional[PurgedSplit] = None,
+               cpus: Optional[int] = None) -> Tuple[pd.DataFrame, object]:
+        """
+        Train several trainers and hyperparameters on the one feature matrix. Features are
+        built once with this instance's `ml_class`, then every candidate is trained in a process
+        pool on the train and test split of `run()`, or on every fold of `cv`.
+
+        :param candidates: `MachineLearningInterface` subclasses, or (subclass, grid) pairs where grid
+            maps hyperparameter names to lists of values, e.g. {'n_estimators': [100, 300]}. Every
+            combination is a candidate and is given to the trainer as `self.params`.
+        :param dp_pattern: Optional `CandleStickDataProcessing` function for candlestick features.
+        :param cv: Optional time series splitter.
+        :param cpus: Total cores used, defaults to every core. They are split between the worker
+            processes and the threads each estimator may use, so n_jobs does not oversubscribe them.
+            An 'n_jobs' in a grid is lowered to those threads, -1 and None included.
+        :return: Leaderboard of the candidates ranked by mean test score, and the best model. With
+            `cv` the best model is the one trained on its last fold.
+        """
+        self.__dp_pattern = dp_pattern
+        features_key = self.__engineer_features()
+        training_data = self.__training_data(features_key, dp_pattern)
+        X, y = training_data['X'], training_data['y']
+
+        if cv is not None:
+            folds = cv.split(training_data['entry bars'], training_data['exit bars'], n_bars=len(self.__df))
+        else:
+            train, test = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+            folds = [{'train': train, 'test': test, 'test start': None, 'test end': None}]
+
+        settings = []
+        for candidate in candidates:
+            ml_class, grid = candidate if isinstance(candidate, tuple) else (candidate, {})
+            settings += [(ml_class, params) for params in ParameterGrid(grid)]
+        tasks = [(ml_class, params, fold) for ml_class, params in settings for fold in folds]
+
+        cpus = cpus if cpus is not None else os.cpu_count()
+        processes = max(1, min(cpus, len(tasks)))
+        threads = max(1, cpus // processes)
+        print(f"\033[91mTraining {len(settings)} candidates on {len(folds)} folds in progress...\033[0m")
+        results = self.__timed('search', self.__fit_in_pool)(tasks, X, y, processes, threads)
+
+        leaderboard, models = [], []
+        for k, (ml_class, params) in enumerate(settings):
+            fold_results = results[k * len(folds):(k + 1) * len(folds)]
+            metrics = pd.DataFrame([fold_metrics for fold_metrics, _ in fold_results])
+            row = {'trainer': ml_class.__name__,
+                   'params': params,
+                   'score': metrics['score'].mean(),
+                   'score std': metrics['score'].std(ddof=0),
+                   'fit seconds': metrics['fit seconds'].sum(),
+                   'folds': len(folds)}
+            if 'mse' in metrics:
+                row['mse'] = metrics['mse'].mean()
+            leaderboard.append(row)
+            models.append(fold_results[-1][1])
+
+        leaderboard = pd.DataFrame(leaderboard).sort_values('score', ascending=False, kind='stable')
+        best_model = models[leaderboard.index[0]]
+        leaderboard = leaderboard.reset_index(drop=True)
+        leaderboard.index.name = 'rank'
+        return leaderboard, best_model
 
     def __train(self, X_train, X_test, y_train, y_test) -> None:
         print("\033[91mTraining in progress...\033[0m")
         if y_train is not None or X_train is not None:
-            self.__ml.train(x_train=X_train,
-                            y_train=y_train,
-                            x_test=X_test,
-                            y_test=y_test)
-            self.__ml.predict(x_train=X_train,
-                              y_train=y_train,
-                              x_test=X_test,
-                              y_test=y_test)
+            self.__timed('estimator.fit', self.__ml.train)(x_train=X_train,
+                                                           y_train=y_train,
+                                                           x_test=X_test,
+                                                           y_test=y_test)
+            self.__timed('estimator.evaluate', self.__ml.predict)(x_train=X_train,
+                                                                  y_train=y_train,
+                                                                  x_test=X_test,
+                                                                  y_test=y_test)
+
+    def get_fold_models(self) -> list:
+        """
+        Models trained on each fold by the last `run(cv=...)`, in fold order.
+        """
+        return self.__fold_models
+
+    def get_memory(self) -> Optional[dict]:
+        """
+        :return: Bytes of the last built training matrix, the bytes it takes as float64 and the
+            bytes saved by `compact`, None before a matrix was built.
+        """
+        return self.__memory
+
+    def get_profile(self) -> Optional[pd.DataFrame]:
+        """
+        :return: Timings and counters of `run()` when created with `profile`, otherwise None.
+        """
+        return self.__profiler.to_frame() if self.__profiler is not None else None
 
     def get_data(self) -> pd.DataFrame:
         return self.__df
@@ -63,6 +278,21 @@ class MachineLearning:
     def get_util(self):
         return self.__ml.get_model(), self.__ml.get_columns, self.__ml.get_rows
 
+    def register_model(self, name: str, registry: Optional[ModelRegistry] = None) -> str:
+        """
+        Store the trained model in a `ModelRegistry` with its columns, rows, whether it
+        uses candlestick features and a fingerprint of the data. The returned key can be
+        passed to `Backtest(model=...)` in place of the model, columns and rows.
+
+        :param name: Model name.
+        :param registry: Registry to store the model in, defaults to ~/.cache/ml_backtest/models.
+        :return: Key of the registered version.
+        """
+        registry = registry if registry is not None else ModelRegistry()
+        model, columns, rows = self.get_util()
+        return registry.register(name, model, columns=columns, rows=rows, cs_pattern=self.__dp_pattern is not None,
+                                 fingerprint=FeatureCache.fingerprint(self.__df))
+
     def dump_model(self, filename):
         cwd = os.getcwd()
         model_filename = os.path.join(cwd, filename + '.joblib')
@@ -1,8 +1,9 @@
 from ml_backtest.interfaces import MachineLearningInterface, TargetInterface
+from ml_backtest.machine_learning import SMA, EMA, RSI, MACD, Diff
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error
+import numpy as np
 import pandas as pd
-import talib
 from typing import Optional, List
 
 
@@ -19,22 +20,25 @@ class RandomForestRegressorTrainer(MachineLearningInterface):
         # that doesn't fit the pattern provided by MachineLearningInterface,
         # it can be performed here.
 
+    def indicators(self):
+        # the indicator features, declared once so they can be computed over the data for
+        # training and updated bar by bar when trading live
+        return {'SMA': SMA('close', period=10),
+                'EMA': EMA('close', period=10),
+                'RSI': RSI('close', period=14),
+                'MACD': MACD('close', fast_period=12, slow_period=26, signal_period=9),
+                'SMA_Diff': Diff('SMA'),
+                'EMA_Diff': Diff('EMA')}
+
     def feature_engineer(self):
         # here is where you can add addition columns of features you want to be used in training
         # just make sure you edit the 'self.data' with the features you want as that is the dataframe being
         # used in training
-        self.data['SMA'] = self.data['close'].rolling(window=10).mean()
-        self.data['EMA'] = talib.EMA(self.data['close'], timeperiod=10)
-        self.data['RSI'] = talib.RSI(self.data['close'], timeperiod=14)
-        self.data['MACD'], self.data['MACD_signal'], self.data['MACD_hist'] = talib.MACD(self.data['close'],
-                                                                                         fastperiod=12, slowperiod=26,
-                                                                                         signalperiod=9)
-        self.data['SMA_Diff'] = self.data['SMA'].diff()
-        self.data['EMA_Diff'] = self.data['EMA'].diff()
+        self.add_indicators()
 
     def train(self, x_train, y_train, x_test, y_test):
         # here is where you define the model you want for training
-        self.model = RandomForestRegressor(n_estimators=100, random_state=42)
+        self.model = RandomForestRegressor(**{'n_estimators': 100, 'random_state': 42, **self.params})
         self.model.fit(x_train, y_train)
 
     def predict(self, x_train, y_train, x_test, y_test):
@@ -48,7 +52,13 @@ class RandomForestRegressorTrainer(MachineLearningInterface):
 
 
 class BasicTarget(TargetInterface):
+    # the highest high after entry, capped at 7 points
+    target = 'target'
+    clip = (None, 7)
+
     def target_engineer(self):
+        # the capped targets are floored at the smallest raw target, when every raw target is
+        # above the cap they all become that minimum
         min_value = self.trades['target'].min()
-        self.trades['target'] = self.trades['target'].apply(lambda x: min(x, 7))
-        self.trades['target'] = self.trades['target'].apply(lambda x: max(x, min_value))
+        self.add_targets()
+        self.trades['target'] = np.maximum(self.trades['target'], min_value)
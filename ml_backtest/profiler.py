@@ -0,0 +1,74 @@
+import pandas as pd
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+class Profiler:
+    def __init__(self, sink: Optional[Callable[[dict], None]] = None):
+        """
+        Opt-in timers and counters for `Backtest` and `MachineLearning`. Timers add up
+        the seconds and calls of each phase, counters add up events such as bars or
+        trades. Timings are inclusive, e.g. 'strategy.on_bar' contains the time spent in
+        'strategy.predict' during the bar. A profiler may be shared by several runs, its
+        totals keep adding up.
+
+        :param sink: Optional callable given `to_dict()` each time a run finishes, to forward
+            the measurements to a metrics system.
+        """
+        self.__seconds = defaultdict(float)
+        self.__calls = defaultdict(int)
+        self.__counters = defaultdict(int)
+        self.__sink = sink
+
+    @contextmanager
+    def timer(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def timed(self, phase: str, function: Callable) -> Callable:
+        """
+        :return: `function` wrapped so every call is timed as `phase`.
+        """
+        seconds, calls, clock = self.__seconds, self.__calls, time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[phase] += clock() - start
+                calls[phase] += 1
+        return wrapper
+
+    def add_time(self, phase: str, seconds: float, calls: int = 1):
+        self.__seconds[phase] += seconds
+        self.__calls[phase] += calls
+
+    def count(self, name: str, amount: int = 1):
+        self.__counters[name] += amount
+
+    def to_dict(self) -> dict:
+        return {'timings': {phase: {'seconds': seconds, 'calls': self.__calls[phase]}
+                            for phase, seconds in self.__seconds.items()},
+                'counters': dict(self.__counters)}
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: One row per timed phase with 'seconds' and 'calls', then one row per counter with 'count'.
+        """
+        rows = [{'name': phase, 'seconds': seconds, 'calls': self.__calls[phase]}
+                for phase, seconds in self.__seconds.items()]
+        rows += [{'name': name, 'count': count} for name, count in self.__counters.items()]
+        return pd.DataFrame(rows, columns=['name', 'seconds', 'calls', 'count']).set_index('name')
+
+    def flush(self):
+        """
+        Hand the current measurements to the sink, if one was given.
+        """
+        if self.__sink is not None:
+            self.__sink(self.to_dict())
@@ -1,15 +1,20 @@
 from ml_backtest.interfaces import Strategy
-from ml_backtest.data import CandleStickPatterns
+from ml_backtest.data import CandleStickPatterns, VectorizedCandleStickPatterns
 from ml_backtest.machine_learning import CandleStickDataProcessing
 from datetime import time
 
 
 class MorningStar(Strategy):
+    take_profit_points = 50
+    stop_loss_points = 37
+    panel_signals = True
+
     def init(self):
         self.market_open_time = time(9, 30)
         self.market_close_time = time(16, 10)
 
-    def on_data(self, index, lows, highs, closes, opens, dates):
+    def on_bar(self, index):
+        lows, highs, closes, opens, dates = self.lows, self.highs, self.closes, self.opens, self.dates
         if index > 1:
             current_open = opens[index]
             current_close = closes[index]
@@ -26,7 +31,7 @@ class MorningStar(Strategy):
                                                                   current_close=current_close,
                                                                   current_open=current_open)
 
-            if is_morning_star and not self.in_position and self.trading_hours(current_date):
+            if is_morning_star and self.can_open() and self.in_trading_hours(index):
                 trade_metadata = {
                     'b_prev_open': b_prev_open,
                     'b_prev_close': b_prev_close,
@@ -39,17 +44,52 @@ class MorningStar(Strategy):
 
                 if self.model is not None:
                     if self.cs_patterns:
-                        np_l = CandleStickDataProcessing.calculate_morning_star_features(**trade_metadata)
-                        np_l_2d = np_l.reshape(1, -1)
+                        np_l_2d = CandleStickDataProcessing.batch_features(
+                            CandleStickDataProcessing.calculate_morning_star_features, [index],
+                            opens, highs, lows, closes)
                         prediction = self.predict(current_date, np_l_2d)
                         take_profit = entry_price + prediction
                     else:
                         prediction = self.predict(current_date)
                         take_profit = entry_price + prediction
                 else:
-                    take_profit = entry_price + 50
-                stop_loss = entry_price - 37
+                    take_profit = entry_price + self.take_profit_points
+                stop_loss = entry_price - self.stop_loss_points
                 entry_time = dates[index]
 
                 self.buy(price=entry_price, take_profit=take_profit, stop_loss=stop_loss,
                          entry_time=entry_time, metadata=trade_metadata)
+
+    def signals(self, lows, highs, closes, opens, dates):
+        is_morning_star = VectorizedCandleStickPatterns.is_morning_star(opens=opens, highs=highs,
+                                                                        lows=lows, closes=closes)
+
+        # trading hours are a lookup in the precomputed mask of every bar, the indices are flat
+        # when the columns are a symbols x bars panel
+        index = self.candidates(is_morning_star)
+        lows, highs, closes, opens, dates = self.flatten(lows, highs, closes, opens, dates)
+        trade_metadata = {
+            'b_prev_open': opens[index - 2],
+            'b_prev_close': closes[index - 2],
+            'prev_open': opens[index - 1],
+            'prev_close': closes[index - 1],
+            'current_open': opens[index],
+            'current_close': closes[index]
+        }
+        entry_price = closes[index]
+
+        if self.model is not None:
+            if self.cs_patterns:
+                np_l_2d = CandleStickDataProcessing.batch_features(
+                    CandleStickDataProcessing.calculate_morning_star_features, index,
+                    opens, highs, lows, closes)
+                prediction = self.predict_entries(dates[index], np_l_2d)
+            else:
+                prediction = self.predict_entries(dates[index])
+            take_profit = entry_price + prediction
+        else:
+            take_profit = entry_price + self.take_profit_points
+        stop_loss = entry_price - self.stop_loss_points
+
+        return self.entries(index, price=entry_price, take_profit=take_profit,
+                            stop_loss=stop_loss, metadata=trade_metadata)
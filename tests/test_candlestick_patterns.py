@@ -0,0 +1,46 @@
+import numpy as np
+from ml_backtest.data import CandleStickPatterns, VectorizedCandleStickPatterns, Data
+
+
+def scalar_masks(opens, highs, lows, closes):
+    n = len(opens)
+    masks = {name: np.zeros(n, dtype=bool) for name in ['is_inverted_hammer', 'is_bullish_engulfing',
+                                                         'is_bullish_harami', 'is_dragonfly_doji', 'is_hammer',
+                                                         'is_morning_star', 'is_morning_star_doji',
+                                                         'is_piercing_pattern']}
+    for i in range(n):
+        o, h, l, c = opens[i], highs[i], lows[i], closes[i]
+        masks['is_inverted_hammer'][i] = CandleStickPatterns.is_inverted_hammer(o, c, h, l)
+        masks['is_dragonfly_doji'][i] = CandleStickPatterns.is_dragonfly_doji(o, c, h, l)
+        masks['is_hammer'][i] = CandleStickPatterns.is_hammer(o, c, h, l)
+        if i > 0:
+            po, ph, pl, pc = opens[i - 1], highs[i - 1], lows[i - 1], closes[i - 1]
+            masks['is_bullish_engulfing'][i] = CandleStickPatterns.is_bullish_engulfing(o, c, po, pc)
+            masks['is_bullish_harami'][i] = CandleStickPatterns.is_bullish_harami(o, c, po, pc)
+            masks['is_piercing_pattern'][i] = CandleStickPatterns.is_piercing_pattern(po, pc, pl, o, c)
+        if i > 1:
+            po, ph, pl, pc = opens[i - 1], highs[i - 1], lows[i - 1], closes[i - 1]
+            bo, bh, bl, bc = opens[i - 2], highs[i - 2], lows[i - 2], closes[i - 2]
+            masks['is_morning_star'][i] = CandleStickPatterns.is_morning_star(bo, bc, po, pc, o, c)
+            masks['is_morning_star_doji'][i] = CandleStickPatterns.is_morning_star_doji(bo, bc, bh, bl,
+                                                                                       po, pc, ph, pl,
+                                                                                       o, c, h, l)
+    return masks
+
+
+def test_vectorized_patterns_match_scalar():
+    df = Data.data()
+    rng = np.random.default_rng(0)
+    # small random bars around a tick grid so that ties and dojis show up
+    base = np.round(rng.normal(0, 2, 5000).cumsum() * 4) / 4 + 100
+    body = np.round(rng.normal(0, 1, 5000) * 4) / 4
+    random_bars = (base, base + np.maximum(body, 0) + np.round(rng.exponential(1, 5000) * 4) / 4,
+                   base + np.minimum(body, 0) - np.round(rng.exponential(1, 5000) * 4) / 4, base + body)
+
+    for opens, highs, lows, closes in [(df['open'].values, df['high'].values, df['low'].values, df['close'].values),
+                                       random_bars]:
+        expected = scalar_masks(opens, highs, lows, closes)
+        for name, mask in expected.items():
+            result = getattr(VectorizedCandleStickPatterns, name)(opens, highs, lows, closes)
+            assert result.dtype == bool
+            np.testing.assert_array_equal(result, mask, err_msg=name)
@@ -0,0 +1,33 @@
+import numpy as np
+from ml_backtest import Backtest, MachineLearning
+from ml_backtest.strategies import Hammer
+from ml_backtest.models import RandomForestRegressorTrainer
+from ml_backtest.data import Data, BarClock
+
+
+def test_bar_clock_matches_trading_hours():
+    dates = Data.data()['date'].values
+    clock = BarClock(dates)
+
+    assert clock.epochs.dtype == np.int64
+    np.testing.assert_array_equal(clock.epochs, BarClock(clock.epochs).epochs)
+    assert clock.session_id[0] == 0 and np.all(np.diff(clock.session_id) >= 0)
+    np.testing.assert_array_equal(clock.minute_of_day, (clock.epochs % 86400) // 60)
+
+    strategy = Hammer()
+    strategy.init()
+    strategy.set_clock(clock)
+    expected = [strategy.trading_hours(date) for date in dates]
+    np.testing.assert_array_equal(strategy.in_trading_hours(np.arange(len(dates))), expected)
+    np.testing.assert_array_equal(strategy.trading_hours_mask(dates), expected)
+
+
+def test_machine_learning_leaves_dates_unchanged():
+    backtest = Backtest(Data.data(), Hammer())
+    trades = backtest.get_trades()
+    assert trades['entry time'].dtype == np.int64
+
+    df = Data.data()
+    dates = df['date'].copy()
+    MachineLearning(ml_class=RandomForestRegressorTrainer, df=df, results=trades).run()
+    assert df['date'].equals(dates)
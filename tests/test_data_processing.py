@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ml_backtest.machine_learning import DataProcessing, CandleStickDataProcessing
+
+
+def row_by_row(all_data, entry_times, rows, columns_indices, candlestick_features=None):
+    output_data = []
+    for i, entry_time in enumerate(entry_times):
+        indices = np.where(all_data[:, 0] <= entry_time)[0]
+        if indices.size == 0:
+            continue
+        matching_index = indices[-1]
+        single_row = all_data[max(0, matching_index - rows + 1):matching_index + 1, columns_indices].flatten()
+        if candlestick_features is not None:
+            single_row = np.concatenate([single_row, candlestick_features[i]])
+        output_data.append(single_row)
+    return np.array(output_data)
+
+
+def test_process_entries_matches_row_by_row():
+    rng = np.random.default_rng(0)
+    all_data = np.column_stack([np.arange(1000) * 60 + 10_000, rng.normal(size=(1000, 3))])
+    # includes times between bars and times before the first bar
+    entry_times = np.sort(rng.integers(10_000 - 600, 10_000 + 60 * 1000, 200))
+    entry_times = entry_times[(entry_times < 10_000) | (entry_times >= 10_000 + 60 * 9)]
+    candlestick_features = rng.normal(size=(len(entry_times), 2))
+
+    for features in [None, candlestick_features]:
+        expected = row_by_row(all_data, entry_times, 10, [1, 3], features)
+        result = DataProcessing.process_entries(all_data, entry_times, 10, [1, 3], candlestick_features=features)
+        np.testing.assert_array_equal(result, expected)
+
+
+def test_process_entries_short_window():
+    all_data = np.column_stack([np.arange(20), np.arange(20) * 2.0])
+    result = DataProcessing.process_entries(all_data, np.array([3]), 10, [1])
+    np.testing.assert_array_equal(result, [[0.0, 2.0, 4.0, 6.0]])
+
+
+def test_batch_features_match_scalar_calls():
+    rng = np.random.default_rng(1)
+    closes = 100 + rng.normal(size=300).cumsum()
+    opens = closes + rng.normal(size=300)
+    highs = np.maximum(opens, closes) + rng.random(300)
+    lows = np.minimum(opens, closes) - rng.random(300)
+    columns = {'open': opens, 'high': highs, 'low': lows, 'close': closes}
+    index = np.arange(2, 300)
+
+    for name in dir(CandleStickDataProcessing):
+        if not name.startswith('calculate_'):
+            continue
+        dp_pattern = getattr(CandleStickDataProcessing, name)
+        result = CandleStickDataProcessing.batch_features(dp_pattern, index, opens, highs, lows, closes)
+        expected = []
+        for i in index:
+            arguments = {}
+            for parameter in dp_pattern.__code__.co_varnames[:dp_pattern.__code__.co_argcount]:
+                prefix, _, column = parameter.rpartition('_')
+                arguments[parameter] = columns[column][i - CandleStickDataProcessing.BAR_OFFSETS[prefix]]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                expected.append(np.asarray(dp_pattern(**arguments), dtype=np.float64))
+        np.testing.assert_allclose(result, np.vstack(expected), err_msg=name)
+        assert CandleStickDataProcessing.batch_features(dp_pattern, [], opens, highs, lows, closes).shape[0] == 0
+
+
+def test_compact_matches_float64():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({'date': np.arange(2000) * 60 + 1_700_000_000, 'a': rng.normal(size=2000),
+                       'b': rng.normal(size=2000) * 100})
+    entry_times = df['date'].values[20::7]
+    trades = pd.DataFrame({'entry time': entry_times, 'exit time': entry_times + 180, 'target': 1.0})
+
+    full = DataProcessing(df, trades, 10, ['a', 'b'])
+    compact = DataProcessing(df, trades, 10, ['a', 'b'], compact=True)
+    X, X_compact = full.get_before(), compact.get_before()
+    assert X_compact.dtype == np.float32
+    np.testing.assert_allclose(X_compact, X, rtol=1e-6)
+    for bars, compact_bars in zip(full.get_trade_bars(), compact.get_trade_bars()):
+        np.testing.assert_array_equal(bars, compact_bars)
+
+
+def test_pattern_features_prefer_metadata():
+    rng = np.random.default_rng(3)
+    closes = 100 + rng.normal(size=100).cumsum()
+    df = pd.DataFrame({'date': np.arange(100) * 60, 'open': closes + 1, 'high': closes + 2, 'low': closes - 2,
+                       'close': closes})
+    index = np.array([10, 40, 70])
+    trades = pd.DataFrame({'entry time': df['date'].values[index], 'entry index': index, 'target': 1.0})
+    features = CandleStickDataProcessing.calculate_hammer_features
+    from_bars = CandleStickDataProcessing.batch_features(features, index, df['open'], df['high'], df['low'],
+                                                        df['close'])
+
+    # without metadata the features are read from the entry bars
+    dp = DataProcessing(df, trades, 2, ['close'])
+    dp.add_pattern_features(features)
+    np.testing.assert_allclose(dp.get_before()[:, 2:], from_bars)
+
+    # metadata other than the entry bar's prices is what the model is trained on
+    for key, column in [('current_open', 'open'), ('current_close', 'close'), ('current_high', 'high'),
+                        ('current_low', 'low')]:
+        trades['metadata.' + key] = df[column].values[index - 1]
+    dp = DataProcessing(df, trades, 2, ['close'])
+    dp.add_pattern_features(features)
+    from_metadata = CandleStickDataProcessing.batch_features(features, index - 1, df['open'], df['high'],
+                                                             df['low'], df['close'])
+    np.testing.assert_allclose(dp.get_before()[:, 2:], from_metadata)
+
+
+def test_process_entries_rows_of_different_lengths():
+    all_data = np.column_stack([np.arange(100), np.arange(100) * 2.0])
+    features = np.arange(6.0).reshape(3, 2)
+    # the last entry has no features row, its row is shorter than the others'
+    with pytest.raises(ValueError):
+        DataProcessing.process_entries(all_data, np.array([50, 60, 70, 80]), 3, [1], candlestick_features=features)
+    with pytest.raises(ValueError):
+        DataProcessing.process_entries(all_data, np.array([1, 50]), 3, [1])
+
+    # short rows still form a matrix when all of them are as short
+    result = DataProcessing.process_entries(all_data, np.array([-1, 1, 1]), 3, [1])
+    np.testing.assert_array_equal(result, [[0.0, 2.0], [0.0, 2.0]])
@@ -0,0 +1,38 @@
+import numpy as np
+from ml_backtest import Backtest
+from ml_backtest.strategies import Hammer, BullishHarami
+from ml_backtest.data import Data
+
+
+def test_equity_curve_marks_open_trades_to_market():
+    data = Data.data()
+    backtest = Backtest(data, Hammer())
+    curve = backtest.get_equity_curve()
+    trades = backtest.get_trades()
+    close = data['close'].values
+
+    expected = np.full(len(data), 100000.0)
+    for entry_bar, exit_bar, entry_price, pnl in trades[['entry index', 'exit index', 'entry price', 'pnl']].values:
+        entry_bar, exit_bar = int(entry_bar), int(exit_bar)
+        expected[exit_bar:] += pnl
+        expected[entry_bar:exit_bar] += close[entry_bar:exit_bar] - entry_price
+
+    assert len(curve) == len(data)
+    np.testing.assert_allclose(curve['equity'], expected)
+    np.testing.assert_allclose(curve['equity'].iloc[-1] - 100000, backtest.get_results()[0]['net profit'])
+    assert curve['drawdown'].max() >= float(backtest.get_results()[0]['max drawdown'].lstrip('-'))
+
+
+def test_equity_curve_includes_position_left_open():
+    data = Data.data()
+    closes = data['close'].values
+    strategy = BullishHarami()
+    # a win and a loss that close on their entry bars, then a trade whose exits are never reached
+    index = [1, 2, len(data) - 10]
+    signals = strategy.entries(index, price=closes[index], take_profit=[1e9, closes[2] - 1, 1e9],
+                               stop_loss=[closes[1] + 1, 0, 0])
+    curve = Backtest(data, strategy, signals=signals).get_equity_curve()
+
+    np.testing.assert_allclose(curve['open pnl'].values[-10:], closes[-10:] - closes[-10])
+    assert (curve['open pnl'].values[:-10] == 0).all()
+    assert (curve['cash'].values[2:] == 100000).all() and curve['cash'].values[1] == 100001
@@ -0,0 +1,41 @@
+import numpy as np
+from ml_backtest import Backtest, MachineLearning, Profiler
+from ml_backtest.strategies import InvertedHammer
+from ml_backtest.models import RandomForestRegressorTrainer
+from ml_backtest.machine_learning import CandleStickDataProcessing, FeatureCache
+from ml_backtest.data import Data
+
+
+def test_repeat_run_loads_features_and_matrices_from_cache(tmp_path):
+    cache = FeatureCache(directory=str(tmp_path))
+    trades = Backtest(Data.data(), InvertedHammer()).get_trades()
+    runs = []
+    for _ in range(2):
+        profiler = Profiler()
+        ml = MachineLearning(ml_class=RandomForestRegressorTrainer, df=Data.data(), results=trades,
+                             profile=profiler, cache=cache)
+        ml.run(dp_pattern=CandleStickDataProcessing.calculate_inverted_hammer_features)
+        runs.append((ml, profiler.to_dict()))
+
+    (first, first_profile), (second, second_profile) = runs
+    assert first_profile['counters']['feature cache misses'] == 1
+    assert second_profile['counters']['feature cache hits'] == 1
+    assert second_profile['counters']['matrix cache hits'] == 1
+    assert 'feature_engineer' not in second_profile['timings']
+    assert first.get_data().equals(second.get_data())
+
+    # same training matrix, so the same seeded model
+    np.testing.assert_array_equal(first.get_util()[0].feature_importances_,
+                                  second.get_util()[0].feature_importances_)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = FeatureCache(directory=str(tmp_path), max_bytes=2500)
+    cache.store('a', {'x': np.zeros(100)})
+    cache.store('b', {'x': np.ones(100)})
+    assert cache.load('a') is not None
+    cache.store('c', {'x': np.zeros(100)})
+
+    assert cache.load('b') is None
+    assert cache.load('a') is not None and cache.load('c') is not None
+    assert cache.size <= 2500
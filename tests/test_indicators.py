@@ -0,0 +1,45 @@
+import copy
+import numpy as np
+import talib
+from ml_backtest.machine_learning import IndicatorSet, SMA, EMA, RSI, MACD, Diff
+from ml_backtest.models import RandomForestRegressorTrainer
+from ml_backtest.data import Data
+
+
+def test_streaming_and_batch_match_talib():
+    data = Data.synthetic(2000, seed=4)
+    close = data['close'].to_numpy()
+    # periods other than the defaults, the batch indicators have to be built with them too
+    declared = {'SMA': SMA('close', 7), 'EMA': EMA('close', 12), 'RSI': RSI('close', 9),
+                'MACD': MACD('close', 5, 13, 4), 'SMA_Diff': Diff('SMA')}
+    macd, signal, hist = talib.MACD(close, fastperiod=5, slowperiod=13, signalperiod=4)
+    sma = talib.SMA(close, 7)
+    expected = {'SMA': sma, 'EMA': talib.EMA(close, 12), 'RSI': talib.RSI(close, 9), 'MACD': macd,
+                'MACD_signal': signal, 'MACD_hist': hist, 'SMA_Diff': np.append(np.nan, np.diff(sma))}
+
+    stream = IndicatorSet(copy.deepcopy(declared))
+    rows = [stream.update({'close': value}) for value in close]
+    batch = data.copy()
+    IndicatorSet(declared).add_to(batch)
+
+    assert stream.columns == list(expected)
+    for column, values in expected.items():
+        streamed = np.array([row[column] for row in rows])
+        np.testing.assert_allclose(streamed, values, rtol=1e-9, atol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(batch[column], values, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_trainer_declares_its_features():
+    trainer = RandomForestRegressorTrainer(Data.synthetic(500))
+    trainer.feature_engineer()
+    stream = trainer.indicator_stream()
+    last = [stream.update({'close': value}) for value in trainer.data['close']][-1]
+    for column, value in last.items():
+        np.testing.assert_allclose(value, trainer.data[column].iloc[-1], rtol=1e-9)
+
+
+def test_sma_sum_does_not_drift():
+    # 1 is lost when added to 1e16, a running sum alone would stay 2 short for the rest of the stream
+    sma = SMA('close', 3)
+    values = [sma.update(value) for value in [1e16, 1.0, 1.0] + [1.0] * 20]
+    assert values[-1] == 1.0
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from ml_backtest.backtest.ledger import TradeLedger
+
+
+def test_ledger_grows_and_wraps_without_copy():
+    ledger = TradeLedger(capacity=2)
+    for i in range(5):
+        position = {'type': 'long' if i % 2 == 0 else 'short', 'entry price': 100.0 + i, 'take profit': 110.0,
+                    'stop loss': 90.0, 'entry time': f'bar {i}', 'exit price': 110.0, 'exit time': f'bar {i + 1}',
+                    'size': 1, 'pnl': 10.0 - i, 'entry index': i, 'exit index': i + 1}
+        if i >= 3:
+            position['metadata'] = {'current_open': 99.0 + i}
+        ledger.append(position)
+
+    trades = ledger.to_frame(copy=False)
+    assert len(ledger) == len(trades) == 5
+    assert list(trades['type']) == ['long', 'short', 'long', 'short', 'long']
+    np.testing.assert_array_equal(trades['metadata.current_open'], [np.nan, np.nan, np.nan, 102.0, 103.0])
+    assert np.isnan(trades['highest high']).all()
+
+    assert np.shares_memory(trades['pnl'].to_numpy(), ledger.column('pnl'))
+    with pytest.raises(ValueError):
+        trades['pnl'].to_numpy()[0] = 0.0
+
+    # by default the frame is a copy that can be edited like any other
+    trades = ledger.to_frame()
+    trades.loc[0, 'target'] = 1.0
+    trades.loc[1, 'type'] = 'long'
+    assert trades.loc[0, 'target'] == 1.0 and np.isnan(ledger.column('target')[0])
+    assert ledger.column('type')[1] == 1
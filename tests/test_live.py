@@ -0,0 +1,80 @@
+import asyncio
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+from ml_backtest import Backtest
+from ml_backtest.live import LiveRunner, ReplayFeed, RingBuffer
+from ml_backtest.strategies import Hammer
+from ml_backtest.data import Data
+
+
+def test_live_runner_trades_like_the_backtest():
+    data = Data.synthetic(6000, seed=5)
+    closed = []
+    runner = LiveRunner(Hammer(), history=64, on_trade=closed.append)
+    asyncio.run(runner.run(ReplayFeed(data)))
+
+    trades = Backtest(data, Hammer()).get_trades()
+    assert runner.get_results()['# of trades'] == len(trades) == len(closed)
+    assert [(p['entry index'], p['exit index'], p['exit price']) for p in closed] == \
+        list(zip(trades['entry index'], trades['exit index'], trades['exit price']))
+    assert len(runner.get_trades()) == min(64, len(trades))
+
+    latency = runner.get_latency()
+    assert latency['bars'] == len(data) and 0 < latency['p50'] <= latency['p99'] <= latency['max']
+
+
+def test_live_runner_predicts_like_the_backtest():
+    data = Data.synthetic(3000, seed=6)
+    rows, columns = 5, ['close', 'high']
+    rng = np.random.default_rng(0)
+    model = LinearRegression().fit(rng.normal(size=(50, rows * len(columns))), rng.uniform(10, 60, 50))
+    closed = []
+    runner = LiveRunner(Hammer(), history=64, model=model, columns=columns, rows=rows, on_trade=closed.append)
+    asyncio.run(runner.run(ReplayFeed(data)))
+
+    trades = Backtest(data, Hammer(), model=model, columns=columns, rows=rows).get_trades()
+    assert len(closed) == len(trades) > 0
+    np.testing.assert_allclose([p['take profit'] for p in closed], trades['take profit'])
+
+
+def test_live_runner_raises_the_feed_error():
+    data = Data.synthetic(100, seed=5)
+
+    async def feed():
+        async for bar in ReplayFeed(data.iloc[:50]):
+            yield bar
+        raise ConnectionError('feed disconnected')
+
+    runner = LiveRunner(Hammer(), history=64)
+    with pytest.raises(ConnectionError):
+        asyncio.run(runner.run(feed()))
+    assert runner.get_results()['bars'] == 50
+
+
+def test_ring_buffer_keeps_the_latest_bars():
+    buffer = RingBuffer(4, ['date', 'close'])
+    for i in range(10):
+        buffer.append({'date': i, 'close': i * 1.5})
+        window = buffer.view()
+        expected = np.arange(max(0, i - 3), i + 1)
+        np.testing.assert_array_equal(window['date'], expected)
+        np.testing.assert_array_equal(window['close'], expected * 1.5)
+
+    tables = RingBuffer(4, ['date'], dtypes={'date': np.int32}, tables={'rows': ['date', 'close']})
+    for i in range(6):
+        tables.append({'date': i, 'close': i * 1.5})
+    window = tables.view()
+    assert window['date'].dtype == np.int32
+    np.testing.assert_array_equal(window['rows'], np.column_stack([np.arange(2, 6), np.arange(2, 6) * 1.5]))
+
+
+def test_replay_feed_paces_and_repeats():
+    data = Data.synthetic(20)
+
+    async def collect():
+        return [bar async for bar in ReplayFeed(data, rate=1000, repeat=2)]
+
+    bars = asyncio.run(collect())
+    assert len(bars) == 40
+    assert np.all(np.diff([bar['date'] for bar in bars]) == 300)
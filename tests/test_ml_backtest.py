@@ -26,3 +26,20 @@ def test_backtesting_with_machine_learning():
     ml_backtest = Backtest(data, strategy, model=model, columns=columns, rows=rows, cs_pattern=True)
     ml_backtest_results = ml_backtest.get_results()
     assert ml_backtest_results is not None
+
+
+def test_batched_predictions_match_per_signal():
+    backtest = Backtest(Data.data(), InvertedHammer())
+
+    ml = MachineLearning(ml_class=RandomForestRegressorTrainer,
+                         df=Data.data(),
+                         results=backtest.get_trades())
+    ml.run(dp_pattern=CandleStickDataProcessing.calculate_inverted_hammer_features)
+    model, columns, rows = ml.get_util()
+    data = ml.get_data()
+
+    per_signal = Backtest(data, InvertedHammer(), model=model, columns=columns, rows=rows, cs_pattern=True)
+    for kwargs in [{'batch_predict': True}, {'vectorized': True}]:
+        batched = Backtest(data, InvertedHammer(), model=model, columns=columns, rows=rows, cs_pattern=True, **kwargs)
+        assert per_signal.get_trades().equals(batched.get_trades())
+        assert per_signal.get_results().equals(batched.get_results())
@@ -0,0 +1,32 @@
+import numpy as np
+from ml_backtest import Backtest, MonteCarlo
+from ml_backtest.data import Data
+from ml_backtest.strategies import Hammer
+
+
+def test_monte_carlo_matches_backtest():
+    backtest = Backtest(Data.synthetic(50000, seed=5), Hammer(), vectorized=True)
+    results = backtest.get_results()[0]
+    trades = backtest.get_trades()
+
+    mc = MonteCarlo(trades, resamples=1000, chunk_size=300, seed=0)
+    summary = mc.get_results(confidence=0.9)
+    assert summary.loc[('bootstrap', 'net profit'), 'actual'] == results['net profit']
+    assert f"-{np.around(summary.loc[('bootstrap', 'max drawdown'), 'actual'], 2)}" == results['max drawdown']
+    assert np.around(summary.loc[('bootstrap', 'profit factor'), 'actual'], 2) == results['profit factor']
+
+    # reordering trades changes the drawdown only
+    permutation = mc.get_distribution('permutation')
+    assert len(permutation) == 1000
+    np.testing.assert_allclose(permutation['net profit'], results['net profit'])
+    assert (summary['lower'] <= summary['median']).all() and (summary['median'] <= summary['upper']).all()
+
+
+def test_monte_carlo_metrics_loop():
+    pnl = np.random.default_rng(1).normal(size=(20, 50))
+    metrics = MonteCarlo.metrics(pnl)
+    for row, values in enumerate(pnl):
+        equity = np.cumsum(values)
+        peaks = np.maximum(np.maximum.accumulate(equity), 0)
+        assert np.isclose(metrics['max drawdown'][row], (peaks - equity).max())
+        assert np.isclose(metrics['profit factor'][row], values[values > 0].sum() / -values[values < 0].sum())
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ml_backtest import Backtest, PortfolioBacktest
+from ml_backtest.strategies import DragonFlyDoji, Hammer, MorningStar
+from ml_backtest.data import Data
+
+
+def frames():
+    return {symbol: Data.synthetic(5000, seed=seed) for seed, symbol in enumerate(['NQ', 'ES', 'YM'])}
+
+
+def test_portfolio_matches_backtesting_each_symbol():
+    data = frames()
+    portfolio = PortfolioBacktest(data, Hammer())
+    columns = ['entry index', 'exit index', 'entry price', 'exit price', 'highest high', 'pnl']
+
+    for symbol, df in data.items():
+        single = Backtest(df, Hammer(), vectorized=True).get_trades()
+        trades = portfolio.get_trades(symbol)
+        assert len(trades) > 0
+        pd.testing.assert_frame_equal(trades[columns], single[columns], check_dtype=False)
+
+        curve = portfolio.get_equity_curve(symbol)
+        expected = Backtest(df, Hammer(), vectorized=True).get_equity_curve()['equity'] - 100000
+        np.testing.assert_allclose(curve['equity'], expected, atol=1e-6)
+
+    results = portfolio.get_results()
+    assert list(results.index) == ['NQ', 'ES', 'YM', 'portfolio']
+    assert results.loc['portfolio', '# of trades'] == len(portfolio.get_trades())
+    np.testing.assert_allclose(portfolio.get_equity_curve()['equity'].iloc[-1] - 100000,
+                               portfolio.get_trades()['pnl'].sum()
+                               + sum(portfolio.get_equity_curve(s)['open pnl'].iloc[-1] for s in data))
+
+
+def test_portfolio_rejects_unaligned_dates():
+    data = frames()
+    data['ES'] = data['ES'].iloc[1:].reset_index(drop=True)
+    with pytest.raises(ValueError):
+        PortfolioBacktest(data, Hammer())
+
+
+@pytest.mark.parametrize('strategy', [Hammer, MorningStar, DragonFlyDoji])
+def test_panel_signals_match_per_symbol_signals(strategy):
+    data = frames()
+    panel = PortfolioBacktest(data, strategy()).get_trades()
+    per_symbol = PortfolioBacktest(data, strategy(panel_signals=False)).get_trades()
+    assert len(panel) > 0
+    pd.testing.assert_frame_equal(panel, per_symbol)
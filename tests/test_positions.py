@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ml_backtest import Backtest
+from ml_backtest.interfaces import Strategy
+from ml_backtest.backtest.positions import PositionBook
+from ml_backtest.data import Data
+
+
+class Grid(Strategy):
+    max_positions = 500
+    max_short_positions = 100
+
+    def init(self):
+        self.rng = np.random.default_rng(0)
+
+    def on_bar(self, index):
+        close = self.closes[index]
+        width, side = self.rng.uniform(2, 60, size=2), self.rng.random()
+        if side < 0.5:
+            self.buy(price=close, take_profit=close + width[0], stop_loss=close - width[1])
+        else:
+            self.sell(price=close, take_profit=close - width[0], stop_loss=close + width[1])
+
+
+class Positions(list):
+    def count(self, side):
+        return sum(position['type'] == side for position in self)
+
+
+def reference(data, strategy):
+    # every open position checked on every bar, the stop first
+    strategy.set_data(data['low'].values, data['high'].values, data['close'].values, data['open'].values,
+                      data['date'].values)
+    strategy.init()
+    strategy.positions = Positions()
+    lows, highs = data['low'].values, data['high'].values
+    trades = []
+    for index in range(len(data)):
+        count = len(strategy.positions)
+        strategy.on_bar(index)
+        for position in strategy.positions[count:]:
+            position['entry index'] = index
+
+        still_open = Positions()
+        for position in strategy.positions:
+            long = position['type'] == 'long'
+            stop_hit = lows[index] <= position['stop loss'] if long else highs[index] >= position['stop loss']
+            target_hit = highs[index] >= position['take profit'] if long else lows[index] <= position['take profit']
+            if stop_hit or target_hit:
+                trades.append((position['entry index'], index,
+                               position['stop loss'] if stop_hit else position['take profit']))
+            else:
+                still_open.append(position)
+        strategy.positions = still_open
+    return trades
+
+
+def test_concurrent_positions_match_checking_every_position():
+    data = Data.synthetic(3000, seed=3)
+    trades = Backtest(data, Grid()).get_trades()
+    assert len(trades) > 1000
+    assert trades['type'].value_counts().min() > 0
+
+    expected = reference(data, Grid())
+    assert list(zip(trades['entry index'], trades['exit index'], trades['exit price'])) == expected
+
+
+def test_position_limits():
+    strategy = Grid(max_positions=3, max_short_positions=1)
+    strategy.buy(price=1, take_profit=2, stop_loss=0)
+    strategy.sell(price=1, take_profit=0, stop_loss=2)
+    strategy.sell(price=1, take_profit=0, stop_loss=2)
+    strategy.buy(price=1, take_profit=2, stop_loss=0)
+    strategy.buy(price=1, take_profit=2, stop_loss=0)
+    assert len(strategy.positions) == 3
+    assert strategy.positions.count('short') == 1
+
+    book = strategy.positions
+    book.open_new(0)
+    assert book.exits(low=0.5, high=1.5) == []
+    # every level is reached, the stops win and the positions leave in entry order
+    exits = book.exits(low=0, high=2)
+    assert [(position['type'], price) for position, price in exits] == [('long', 0), ('short', 2), ('long', 0)]
+    assert not book
+
+
+class TrailingStop(Strategy):
+    def init(self):
+        pass
+
+    def on_bar(self, index):
+        if index == 0:
+            self.buy(price=100, take_profit=200, stop_loss=90)
+        elif index == 3:
+            # trail the stop, the bar after reaches it
+            self.positions[0]['stop loss'] = 104
+        elif index == 5:
+            # a losing trade so the results have a profit factor
+            self.buy(price=90, take_profit=200, stop_loss=86)
+
+
+def test_trailing_stop_takes_effect():
+    data = pd.DataFrame({'date': np.arange(7) * 60 + 1_700_000_000,
+                         'open': [100.0, 101, 103, 106, 105, 95, 95],
+                         'high': [101.0, 103, 106, 107, 106, 96, 96],
+                         'low': [99.0, 100, 102, 105, 103, 85, 85],
+                         'close': [100.0, 102, 105, 106, 104, 90, 90]})
+    trades = Backtest(data, TrailingStop()).get_trades()
+    assert list(zip(trades['exit index'], trades['exit price'])) == [(4, 104.0), (5, 86.0)]
+
+    # loosening a level re-files it too
+    book = PositionBook()
+    book.append({'type': 'short', 'entry price': 10, 'take profit': 5, 'stop loss': 12})
+    book.open_new(0)
+    book[0]['stop loss'] = 15
+    assert book.exits(low=9, high=13) == []
+    assert [price for _, price in book.exits(low=9, high=15)] == [15]
+
+
+def test_nan_levels_are_rejected():
+    book = PositionBook()
+    with pytest.raises(ValueError):
+        book.append({'type': 'long', 'entry price': 100.0, 'take profit': np.nan, 'stop loss': 90.0})
+
+    book.append({'type': 'long', 'entry price': 100.0, 'take profit': 110.0, 'stop loss': 90.0})
+    book.open_new(0)
+    with pytest.raises(ValueError):
+        book[0]['stop loss'] = np.nan
+    assert book[0]['stop loss'] == 90.0
+    assert [(position['entry index'], price) for position, price in book.exits(89.0, 95.0)] == [(0, 90.0)]
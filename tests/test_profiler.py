@@ -0,0 +1,57 @@
+import time
+from ml_backtest import Backtest, MachineLearning, Profiler
+from ml_backtest.strategies import InvertedHammer
+from ml_backtest.models import RandomForestRegressorTrainer
+from ml_backtest.machine_learning import CandleStickDataProcessing
+from ml_backtest.data import Data
+
+
+def test_profiled_backtest_and_machine_learning():
+    received = []
+    profiler = Profiler(sink=received.append)
+    progress = []
+
+    backtest = Backtest(Data.data(), InvertedHammer(), profile=profiler,
+                        progress=lambda done, total: progress.append(done))
+    profile = backtest.get_profile()
+    trades = backtest.get_trades()
+    assert profile.loc['bars', 'count'] == len(Data.data())
+    assert profile.loc['trades closed', 'count'] == len(trades)
+    assert profile.loc['strategy.on_bar', 'calls'] == len(Data.data())
+    assert profile.loc['backtest.exits', 'seconds'] >= 0
+    assert progress == [len(Data.data())]
+    assert received[-1]['counters']['bars'] == len(Data.data())
+
+    ml = MachineLearning(ml_class=RandomForestRegressorTrainer, df=Data.data(), results=trades, profile=True)
+    ml.run(dp_pattern=CandleStickDataProcessing.calculate_inverted_hammer_features)
+    assert {'feature_engineer', 'data_processing.get_before', 'estimator.fit'} <= set(ml.get_profile().index)
+
+    model, columns, rows = ml.get_util()
+    ml_backtest = Backtest(ml.get_data(), InvertedHammer(), model=model, columns=columns, rows=rows,
+                           cs_pattern=True, profile=True)
+    profile = ml_backtest.get_profile()
+    assert profile.loc['predictions', 'count'] == profile.loc['trades opened', 'count'] > 0
+    assert 'signals' not in profile.index
+
+    # batched predictions are timed once per call, never longer than the whole backtest
+    for options in [{'batch_predict': True}, {'vectorized': True}]:
+        start = time.perf_counter()
+        batched = Backtest(ml.get_data(), InvertedHammer(), model=model, columns=columns, rows=rows,
+                           cs_pattern=True, profile=True, **options)
+        elapsed = time.perf_counter() - start
+        assert 0 < batched.get_profile().loc['strategy.predict', 'seconds'] <= elapsed
+        # both paths count the same trades opened, only the vectorized one has candidate signals
+        counts = batched.get_profile()['count']
+        assert counts['trades opened'] == profile.loc['trades opened', 'count']
+        assert ('signals' in counts.index) == ('vectorized' in options)
+    assert Backtest(Data.data(), InvertedHammer()).get_profile() is None
+
+
+def test_shared_profiler_across_runs():
+    profiler = Profiler()
+    for _ in range(2):
+        Backtest(Data.data(), InvertedHammer(), profile=profiler)
+        timings = profiler.to_dict()['timings']
+        assert timings['backtest.exits']['seconds'] >= 0
+    assert timings['strategy.on_bar']['calls'] == 2 * len(Data.data())
+    assert timings['backtest.exits']['calls'] == 2
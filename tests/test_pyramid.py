@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from ml_backtest import Backtest
+from ml_backtest.strategies import Hammer
+from ml_backtest.data import Data, BarPyramid
+
+
+def test_levels_match_pandas_resample():
+    base = Data.synthetic(5000, interval=60)
+    pyramid = BarPyramid(base, intervals=[300, 3600])
+    assert pyramid.intervals == [60, 300, 3600]
+
+    hourly = pyramid.frame(3600)
+    expected = base.groupby(base['date'] // 3600).agg({'open': 'first', 'high': 'max', 'low': 'min',
+                                                       'close': 'last'})
+    np.testing.assert_array_equal(hourly[['open', 'high', 'low', 'close']].values, expected.values)
+    np.testing.assert_array_equal(hourly['date'], expected.index * 3600)
+
+    children = pyramid.children(3600, 2)
+    assert children == slice(24, 36)
+    assert pyramid.parent(3600, 35) == 2 and pyramid.parent(3600, 36) == 3
+
+
+def test_ambiguous_exit_resolved_on_finer_bars():
+    # two 5 minute bars of 1 minute bars, the second reaches the take profit a minute before the stop
+    low = [99, 99, 99, 99, 99, 100, 94, 99, 99, 99]
+    high = [101, 101, 101, 101, 101, 106, 100, 101, 101, 101]
+    base = pd.DataFrame({'date': 1577836800 + 60 * np.arange(10), 'open': 100.0, 'high': high,
+                         'low': low, 'close': 100.0})
+    pyramid = BarPyramid(base, intervals=[300])
+    strategy = Hammer()
+    signals = strategy.entries([0], price=100.0, take_profit=105.0, stop_loss=95.0)
+    ambiguous = pd.DataFrame({'date': pyramid.frame()['date'], 'open': 100.0, 'high': [101, 106],
+                              'low': [99, 94], 'close': 100.0})
+
+    coarse = Backtest(ambiguous, strategy, signals=signals)
+    drilled = Backtest(pyramid, Hammer(), signals=signals, profile=True)
+    assert coarse.get_trades()['exit price'].tolist() == [95.0]
+    assert drilled.get_trades()['exit price'].tolist() == [105.0]
+    assert drilled.get_trades()['exit index'].tolist() == [1]
+    assert drilled.get_profile().loc['intrabar drill downs', 'count'] == 1
+
+
+def test_event_loop_and_vectorized_resolve_alike():
+    pyramid = BarPyramid(Data.synthetic(60000, interval=60), intervals=[300, 900])
+    event = Backtest(pyramid, Hammer(stop_loss_points=10, take_profit_points=12), profile=True)
+    vectorized = Backtest(pyramid, Hammer(stop_loss_points=10, take_profit_points=12), vectorized=True)
+    assert event.get_profile().loc['intrabar drill downs', 'count'] > 0
+    pd.testing.assert_frame_equal(event.get_trades(), vectorized.get_trades())
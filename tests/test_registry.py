@@ -0,0 +1,37 @@
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from ml_backtest import Backtest, MachineLearning
+from ml_backtest.strategies import InvertedHammer
+from ml_backtest.models import RandomForestRegressorTrainer
+from ml_backtest.machine_learning import CandleStickDataProcessing, ModelRegistry
+from ml_backtest.data import Data
+
+
+def test_registered_model_backtests_like_the_trained_model(tmp_path):
+    registry = ModelRegistry(directory=str(tmp_path))
+    ml = MachineLearning(ml_class=RandomForestRegressorTrainer, df=Data.data(),
+                         results=Backtest(Data.data(), InvertedHammer()).get_trades())
+    ml.run(dp_pattern=CandleStickDataProcessing.calculate_inverted_hammer_features)
+    key = ml.register_model('inverted-hammer', registry=registry)
+    assert key == 'inverted-hammer:1'
+
+    model, columns, rows = ml.get_util()
+    data = ml.get_data()
+    expected = Backtest(data, InvertedHammer(), model=model, columns=columns, rows=rows, cs_pattern=True)
+    registered = Backtest(data, InvertedHammer(), model='inverted-hammer', registry=registry)
+    assert expected.get_trades().equals(registered.get_trades())
+
+    entry = registry.load(key)
+    assert entry['columns'] == columns and entry['rows'] == rows and entry['cs_pattern']
+    assert registry.load('inverted-hammer') is entry
+
+
+def test_registry_versions_and_memory_maps_arrays(tmp_path):
+    registry = ModelRegistry(directory=str(tmp_path))
+    X = np.arange(20.0).reshape(10, 2)
+    for _ in range(2):
+        key = registry.register('linear', LinearRegression().fit(X, X.sum(axis=1)), columns=['close'], rows=1)
+
+    assert key == 'linear:2'
+    assert list(registry.models()['key']) == ['linear:1', 'linear:2']
+    assert isinstance(registry.load('linear')['model'].coef_, np.memmap)
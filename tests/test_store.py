@@ -0,0 +1,36 @@
+import os
+import numpy as np
+import pandas as pd
+from ml_backtest import Backtest, MachineLearning
+from ml_backtest.strategies import Hammer
+from ml_backtest.models import RandomForestRegressorTrainer
+from ml_backtest.data import Data, ColumnStore
+
+
+def test_column_store_round_trip(tmp_path):
+    csv_path = os.path.join(tmp_path, 'bars.csv')
+    Data.data().to_csv(csv_path, index=False)
+
+    store = ColumnStore.from_csv(csv_path, os.path.join(tmp_path, 'bars.mlbt'), chunksize=1000)
+    df = Data.data()
+    assert len(store) == len(df)
+    assert store.columns == ['date', 'open', 'high', 'low', 'close']
+    assert store['date'].dtype == np.int64 and store['close'].dtype == np.float64
+    assert isinstance(store['close'], np.memmap)
+
+    dates = pd.to_datetime(df['date'], format='%m/%d/%Y %I:%M:%S %p').astype('int64') // 10 ** 9
+    np.testing.assert_array_equal(store['date'], dates)
+    np.testing.assert_array_equal(store['close'], df['close'])
+
+
+def test_backtest_and_machine_learning_accept_store(tmp_path):
+    store = ColumnStore.from_frame(Data.data(), os.path.join(tmp_path, 'bars.mlbt'))
+
+    backtest = Backtest(store, Hammer())
+    expected = Backtest(Data.data(), Hammer())
+    np.testing.assert_array_equal(backtest.get_trades()['pnl'], expected.get_trades()['pnl'])
+
+    ml = MachineLearning(ml_class=RandomForestRegressorTrainer, df=store, results=backtest.get_trades())
+    ml.run()
+    model, columns, rows = ml.get_util()
+    assert model is not None
@@ -0,0 +1,29 @@
+import numpy as np
+from ml_backtest import Backtest, ParameterSweep
+from ml_backtest.strategies import BullishHarami
+from ml_backtest.data import Data
+
+
+def test_parameter_sweep_matches_backtest():
+    data = Data.data()
+    grid = {'take_profit_points': [20, 50], 'stop_loss_points': [15, 37]}
+
+    sweep = ParameterSweep(BullishHarami, grid, data, processes=2).run()
+    assert len(sweep) == 4
+    assert list(sweep.columns[:2]) == ['take_profit_points', 'stop_loss_points']
+
+    row = sweep[(sweep['take_profit_points'] == 20) & (sweep['stop_loss_points'] == 15)].iloc[0]
+    results = Backtest(data, BullishHarami(take_profit_points=20, stop_loss_points=15)).get_results()[0]
+    assert row['net profit'] == results['net profit']
+    assert row['# of trades'] == results['# of trades']
+
+
+def test_parameter_sweep_keeps_sets_without_losing_trades():
+    # a stop loss no bar reaches leaves only winning trades
+    grid = {'take_profit_points': [1], 'stop_loss_points': [15, 1_000_000]}
+    sweep = ParameterSweep(BullishHarami, grid, Data.data(), processes=2).run().set_index('stop_loss_points')
+
+    assert sweep.loc[1_000_000, '# of loses'] == 0 < sweep.loc[1_000_000, '# of wins']
+    assert sweep.loc[1_000_000, 'profit factor'] == np.inf
+    assert sweep.loc[1_000_000, 'win rate'] == 100
+    assert np.isfinite(sweep.loc[15, 'profit factor'])
@@ -0,0 +1,15 @@
+import numpy as np
+from ml_backtest import Backtest
+from ml_backtest.strategies import Hammer
+from ml_backtest.data import Data
+
+
+def test_synthetic_data_is_seeded_ohlc():
+    data = Data.synthetic(10_000, seed=3)
+    assert data.equals(Data.synthetic(10_000, seed=3))
+    assert not data.equals(Data.synthetic(10_000, seed=4))
+
+    assert data['date'].dtype == np.int64 and (np.diff(data['date']) == 300).all()
+    assert (data['high'] >= data[['open', 'close']].max(axis=1)).all()
+    assert (data['low'] <= data[['open', 'close']].min(axis=1)).all()
+    assert len(Backtest(data, Hammer(), vectorized=True).get_trades()) > 0
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from ml_backtest import Backtest
+from ml_backtest.data import Data
+from ml_backtest.machine_learning import TradeTargets
+from ml_backtest.models import BasicTarget
+from ml_backtest.strategies import Hammer
+
+
+def test_labels_match_loop():
+    df = Data.synthetic(20000, seed=3)
+    trades = Backtest(df, Hammer(max_positions=5)).get_trades()
+    targets = TradeTargets(trades, df)
+    highs, lows = df['high'].to_numpy(), df['low'].to_numpy()
+
+    for i, trade in enumerate(trades.to_dict('records')):
+        entry, exit, entry_price = trade['entry index'], trade['exit index'], trade['entry price']
+        highest, lowest = highs[entry:exit + 1].max(), lows[entry:exit + 1].min()
+        long = trade['type'] == 'long'
+        assert targets.label('highest high')[i] == highest == trade['highest high']
+        assert targets.label('mfe')[i] == (highest - entry_price if long else entry_price - lowest)
+        assert targets.label('mae')[i] == (entry_price - lowest if long else highest - entry_price)
+        assert targets.label('bars')[i] == exit - entry
+        assert targets.label('r multiple')[i] == trade['pnl'] / abs(entry_price - trade['stop loss'])
+
+    clipped = targets.label('mfe', clip=(None, 7))
+    np.testing.assert_array_equal(clipped, np.minimum(targets.label('mfe'), 7))
+
+
+def test_labels_from_times_and_declared_target():
+    df = Data.synthetic(5000, seed=4)
+    trades = Backtest(df, Hammer()).get_trades()
+    # trades without bar indices are placed on the bars by time
+    by_time = TradeTargets(trades.drop(columns=['entry index', 'exit index']), df)
+    np.testing.assert_array_equal(by_time.label('target'), trades['target'])
+
+    target = BasicTarget(trades=trades, data=df)
+    target.labels = ('mae',)
+    target.target_engineer()
+    expected = np.maximum(np.minimum(trades['target'], 7), trades['target'].min())
+    np.testing.assert_array_equal(target.trades['target'], expected)
+    assert isinstance(target.trades, pd.DataFrame) and 'mae' in target.trades
+
+
+def test_basic_target_floors_at_the_smallest_raw_target():
+    df = Data.synthetic(5000, seed=4)
+    trades = Backtest(df, Hammer()).get_trades()
+    # entries 20 points lower put every raw target above the cap of 7
+    trades = trades.assign(**{'entry price': trades['entry price'] - 20, 'target': trades['target'] + 20})
+    assert (trades['target'] > 7).all()
+
+    target = BasicTarget(trades=trades, data=df)
+    target.target_engineer()
+    np.testing.assert_array_equal(target.trades['target'], np.full(len(trades), trades['target'].min()))
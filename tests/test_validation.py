@@ -0,0 +1,53 @@
+import numpy as np
+from ml_backtest import Backtest, MachineLearning
+from ml_backtest.strategies import BullishHarami
+from ml_backtest.models import RandomForestRegressorTrainer
+from ml_backtest.machine_learning import WalkForward, PurgedKFold
+from ml_backtest.data import Data
+
+
+def test_splits_purge_and_embargo():
+    entry_bars = np.arange(0, 1000, 10)
+    exit_bars = entry_bars + 15
+
+    for fold in WalkForward(n_splits=3, purge=20).split(entry_bars, exit_bars, n_bars=1000):
+        assert exit_bars[fold['train']].max() < fold['test start'] - 20
+        assert entry_bars[fold['test']].min() >= fold['test start']
+
+    for fold in PurgedKFold(n_splits=4, purge=20, embargo=30).split(entry_bars, exit_bars, n_bars=1000):
+        train_entries, train_exits = entry_bars[fold['train']], exit_bars[fold['train']]
+        overlaps = (train_exits >= fold['test start'] - 20) & (train_entries < fold['test end'] + 30)
+        assert not overlaps.any()
+        assert len(np.intersect1d(fold['train'], fold['test'])) == 0
+
+
+def test_machine_learning_walk_forward():
+    backtest = Backtest(Data.data(), BullishHarami())
+    ml = MachineLearning(ml_class=RandomForestRegressorTrainer, df=Data.data(), results=backtest.get_trades())
+
+    metrics = ml.run(cv=WalkForward(n_splits=3, purge=10), processes=2)
+    assert len(metrics) == len(ml.get_fold_models()) > 0
+    assert {'train size', 'test size', 'score', 'mse'} <= set(metrics.columns)
+
+
+def test_machine_learning_search():
+    backtest = Backtest(Data.data(), BullishHarami())
+    ml = MachineLearning(ml_class=RandomForestRegressorTrainer, df=Data.data(), results=backtest.get_trades())
+
+    grid = {'n_estimators': [5, 10], 'max_depth': [2]}
+    leaderboard, model = ml.search([(RandomForestRegressorTrainer, grid)], cv=WalkForward(n_splits=2), cpus=2)
+    assert len(leaderboard) == 2 and (leaderboard['folds'] == 2).all()
+    assert leaderboard['score'].is_monotonic_decreasing
+    assert model.get_params()['n_estimators'] == leaderboard['params'][0]['n_estimators']
+    assert model.get_params()['max_depth'] == 2
+
+
+def test_search_holds_n_jobs_to_the_cpu_budget():
+    backtest = Backtest(Data.data(), BullishHarami())
+    ml = MachineLearning(ml_class=RandomForestRegressorTrainer, df=Data.data(), results=backtest.get_trades())
+
+    # 2 candidates on 2 cpus run in 2 processes of 1 thread each
+    grid = {'n_estimators': [5, 10], 'n_jobs': [-1]}
+    leaderboard, model = ml.search([(RandomForestRegressorTrainer, grid)], cpus=2)
+    assert len(leaderboard) == 2
+    assert model.get_params()['n_jobs'] == 1
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from ml_backtest import Backtest, PortfolioBacktest
+from ml_backtest.strategies import BullishEngulfing, BullishHarami, DragonFlyDoji, Hammer, InvertedHammer
+from ml_backtest.data import Data, VectorizedCandleStickPatterns
+from ml_backtest.interfaces import Strategy
+
+
+def test_vectorized_backtest_matches_event_loop():
+    data = Data.data()
+
+    for strategy_class in [BullishEngulfing, BullishHarami, DragonFlyDoji, Hammer, InvertedHammer]:
+        backtest = Backtest(data, strategy_class())
+        vectorized_backtest = Backtest(data, strategy_class(), vectorized=True)
+
+        assert len(backtest.get_trades()) > 0
+        assert backtest.get_trades().equals(vectorized_backtest.get_trades())
+        assert backtest.get_results().equals(vectorized_backtest.get_results())
+
+
+def test_backtest_with_precomputed_signals():
+    data = Data.data()
+    opens, highs, lows, closes = (data[c].values for c in ['open', 'high', 'low', 'close'])
+    strategy = BullishHarami()
+
+    mask = VectorizedCandleStickPatterns.is_bullish_harami(opens, highs, lows, closes)
+    signals = strategy.entries(mask, price=closes[mask], take_profit=closes[mask] + 20, stop_loss=closes[mask] - 20)
+    backtest = Backtest(data, strategy, signals=signals)
+
+    trades = backtest.get_trades()
+    assert len(trades) > 0
+    np.testing.assert_allclose(np.abs(trades['pnl']), 20)
+
+
+def test_on_data_adapter_matches_on_bar():
+    class SlicedHammer(Hammer):
+        on_bar = Strategy.on_bar
+
+        def on_data(self, index, lows, highs, closes, opens, dates):
+            assert len(closes) == index + 1
+            Hammer.on_bar(self, index)
+
+    data = Data.data()
+    strategy = Hammer()
+    backtest = Backtest(data, strategy)
+    assert not strategy.closes.flags.writeable
+    assert backtest.get_trades().equals(Backtest(data, SlicedHammer()).get_trades())
+
+
+def test_vectorized_backtest_rejects_position_limits():
+    data = Data.synthetic(20000, seed=2)
+    # limits that still mean one position at a time give the same trades on both paths
+    one = Hammer(max_long_positions=1)
+    assert Backtest(data, one).get_trades().equals(Backtest(data, Hammer(), vectorized=True).get_trades())
+
+    event_trades = Backtest(data, Hammer(max_positions=5)).get_trades()
+    assert len(event_trades) > len(Backtest(data, Hammer()).get_trades())
+    for strategy in [Hammer(max_positions=5), Hammer(max_positions=None, max_long_positions=2)]:
+        with pytest.raises(ValueError):
+            Backtest(data, strategy, vectorized=True)
+        with pytest.raises(ValueError):
+            PortfolioBacktest({'NQ': data}, strategy)